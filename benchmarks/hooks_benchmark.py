@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Benchmarks of the hook pipeline, run against synthetic git repositories.
+#
+#   python benchmarks/hooks_benchmark.py end-to-end --file-count 400 --checker-count 5
+#   python benchmarks/hooks_benchmark.py micro --file-count 2000
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from taskr import task, console
+
+source_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, source_root)
+
+hook_runner_template = '''#!{python}
+import sys
+sys.path.insert(0, {source_root!r})
+from submarine_githooks.entry import main
+main()
+'''
+
+git_shim_template = '''#!/bin/sh
+echo "$@" >> "$SUBMARINE_BENCHMARK_GIT_LOG"
+exec "{git}" "$@"
+'''
+
+checker_module_template = '''import json
+from submarine_githooks.checker import checker
+
+
+@checker
+@checker.active_hooks('pre-commit', 'post-checkout', 'post-merge')
+@checker.file_extension('.json')
+def check_json_{index}(git_repo, hook_name, file_path, *args):
+    json.loads(git_repo.file_content(file_path))
+
+
+@checker
+@checker.active_hooks('pre-push')
+def check_push_{index}(git_repo, hook_name, *args):
+    pass
+'''
+
+benchmark_hook_names = ('pre-commit', 'post-checkout', 'post-merge', 'pre-push')
+
+
+def percentile(values, percent):
+    """
+    :type values: list[float]
+    :type percent: float
+    :rtype: float
+    """
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(percent / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def find_git():
+    for path in os.environ.get('PATH', '').split(os.pathsep):
+        git_path = os.path.join(path, 'git')
+        if os.path.isfile(git_path) and os.access(git_path, os.X_OK):
+            return git_path
+    raise IOError('Cannot find git in PATH')
+
+
+class SyntheticRepo(object):
+    """
+    A git repo with `file_count` JSON files on `master`, a `feature` branch modifying all of them,
+    and the same files modified and staged on `master`.
+    """
+
+    def __init__(self, path, file_count, file_size, checker_count):
+        """
+        :type path: str
+        :type file_count: int
+        :type file_size: int
+        :type checker_count: int
+        """
+        self.path = path
+        self.file_count = file_count
+        self.file_size = file_size
+        self.checker_count = checker_count
+        self.commits = {}
+        """:type: dict[str, str]"""
+
+    def git(self, *args):
+        return subprocess.check_output(('git',) + args, cwd=self.path).decode('utf-8').strip()
+
+    def write_files(self, revision):
+        for index in range(self.file_count):
+            directory = os.path.join(self.path, 'data', '{:03d}'.format(index // 100))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            padding = 'x' * max(0, self.file_size - 40)
+            with io.open(os.path.join(directory, 'file{}.json'.format(index)), 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'index': index, 'revision': revision, 'padding': padding}))
+
+    def build(self):
+        os.makedirs(self.path)
+        self.git('init', '-q', '.')
+        self.git('config', 'user.email', 'benchmark@example.com')
+        self.git('config', 'user.name', 'benchmark')
+
+        hooks_home = os.path.join(self.path, '.githooks')
+        os.makedirs(hooks_home)
+        io.open(os.path.join(hooks_home, '__init__.py'), 'w').close()
+        for index in range(self.checker_count):
+            with io.open(os.path.join(hooks_home, 'synthetic_checker_{}.py'.format(index)), 'w') as f:
+                f.write(checker_module_template.format(index=index))
+
+        runner_path = os.path.join(self.path, '.git', 'submarine-benchmark-entry')
+        with io.open(runner_path, 'w') as f:
+            f.write(hook_runner_template.format(python=sys.executable, source_root=source_root))
+        os.chmod(runner_path, 0o755)
+        for hook_name in benchmark_hook_names:
+            os.symlink(runner_path, os.path.join(self.path, '.git', 'hooks', hook_name))
+
+        # post-merge compares with HEAD^, which needs a parent commit
+        self.git('commit', '-q', '--no-verify', '--allow-empty', '-m', 'initial')
+        self.write_files('master')
+        self.git('add', '-A')
+        self.git('commit', '-q', '--no-verify', '-m', 'master')
+        self.commits['master'] = self.git('rev-parse', 'HEAD')
+
+        self.git('checkout', '-q', '-b', 'feature')
+        self.write_files('feature')
+        self.git('commit', '-q', '--no-verify', '-am', 'feature')
+        self.commits['feature'] = self.git('rev-parse', 'HEAD')
+
+        self.git('checkout', '-q', 'master')
+        self.write_files('staged')
+        self.git('add', '-A')
+
+    def hook_invocation(self, hook_name):
+        """
+        :type hook_name: str
+        :return: (arguments, extra environment variables, stdin)
+        :rtype: (list[str], dict[str, str], bytes)
+        """
+        master, feature = self.commits['master'], self.commits['feature']
+        if hook_name == 'post-checkout':
+            return [master, feature, '1'], {}, b''
+        elif hook_name == 'post-merge':
+            return ['0'], {'GITHEAD_' + feature: 'feature'}, b''
+        elif hook_name == 'pre-push':
+            push_info = 'refs/heads/feature {} refs/heads/feature {}\n'.format(feature, master)
+            return ['origin', 'file:///dev/null'], {}, push_info.encode('utf-8')
+        return [], {}, b''
+
+
+def run_end_to_end(repo, hook_name, repeat, environ, git_log_path):
+    """
+    :type repo: SyntheticRepo
+    :type hook_name: str
+    :type repeat: int
+    :type environ: dict[str, str]
+    :type git_log_path: str
+    :rtype: OrderedDict
+    """
+    arguments, extra_environ, stdin = repo.hook_invocation(hook_name)
+    environ = dict(environ, **extra_environ)
+    latencies = []
+    git_calls = []
+    for _ in range(repeat):
+        io.open(git_log_path, 'w').close()
+        started_at = time.time()
+        process = subprocess.Popen([os.path.join('.git', 'hooks', hook_name)] + arguments, cwd=repo.path,
+                                   env=environ, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output, _ = process.communicate(stdin)
+        latencies.append(time.time() - started_at)
+        if process.returncode != 0:
+            raise RuntimeError('{} exits with {}:\n{}'.format(hook_name, process.returncode, output.decode('utf-8')))
+        with io.open(git_log_path, 'r') as f:
+            git_calls.append(len(f.read().splitlines()))
+
+    return OrderedDict((
+        ('hook', hook_name),
+        ('runs', repeat),
+        ('min', min(latencies)),
+        ('p50', percentile(latencies, 50)),
+        ('p90', percentile(latencies, 90)),
+        ('p99', percentile(latencies, 99)),
+        ('max', max(latencies)),
+        ('git_calls', max(git_calls)),
+    ))
+
+
+def print_results(results, columns):
+    """
+    :type results: list[OrderedDict]
+    :type columns: list[str]
+    """
+    def format_row(values):
+        return '{:<26}'.format(values[0]) + ' '.join('{:>10.4f}'.format(value) if isinstance(value, float)
+                                                    else '{:>10}'.format(value) for value in values[1:])
+
+    console.show(format_row(columns))
+    for result in results:
+        console.show(format_row([result[column] for column in columns]))
+
+
+def write_output(output, configuration, results):
+    if output:
+        with io.open(output, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(OrderedDict((('configuration', configuration), ('results', results))), indent=2))
+        console.info('Results written to {}'.format(output))
+
+
+@task
+@task.auto_create_short_arguments(False)
+def end_to_end(file_count=200, file_size=1024, checker_count=5, repeat=5, hooks=','.join(benchmark_hook_names),
+               cache=False, jobs=1, output='', keep=False):
+    """
+    Run hooks end to end against a synthetic repo, and report latency percentiles and number of git processes.
+    """
+    work_dir = tempfile.mkdtemp(prefix='submarine-benchmark-')
+    try:
+        repo = SyntheticRepo(os.path.join(work_dir, 'repo'), file_count, file_size, checker_count)
+        console.info('Building synthetic repo at {}'.format(repo.path))
+        repo.build()
+
+        # Count git processes by a shim in front of the real git
+        shim_dir = os.path.join(work_dir, 'bin')
+        os.makedirs(shim_dir)
+        with io.open(os.path.join(shim_dir, 'git'), 'w') as f:
+            f.write(git_shim_template.format(git=find_git()))
+        os.chmod(os.path.join(shim_dir, 'git'), 0o755)
+        git_log_path = os.path.join(work_dir, 'git.log')
+
+        environ = dict(os.environ)
+        environ.update({
+            'PATH': shim_dir + os.pathsep + environ.get('PATH', ''),
+            'SUBMARINE_BENCHMARK_GIT_LOG': git_log_path,
+            'SUBMARINE_GITHOOK_CACHE': '1' if cache else '0',
+            'SUBMARINE_GITHOOK_JOBS': str(jobs),
+        })
+        environ.pop('SUBMARINE_GITHOOK_DEBUG', None)
+
+        results = [run_end_to_end(repo, hook_name, repeat, environ, git_log_path)
+                   for hook_name in hooks.split(',')]
+        print_results(results, ['hook', 'runs', 'min', 'p50', 'p90', 'p99', 'max', 'git_calls'])
+        write_output(output, OrderedDict((('file_count', file_count), ('file_size', file_size),
+                                          ('checker_count', checker_count), ('cache', cache), ('jobs', jobs))),
+                     results)
+    finally:
+        if keep:
+            console.info('Kept {}'.format(work_dir))
+        else:
+            shutil.rmtree(work_dir)
+
+
+def evict_modules(directory):
+    """
+    Remove modules loaded from the folder from `sys.modules`, so they are imported again like in a new hook process.
+
+    :type directory: str
+    """
+    for module_name, module in list(sys.modules.items()):
+        module_path = getattr(module, '__file__', None)
+        if module_path and os.path.abspath(module_path).startswith(directory + os.sep):
+            del sys.modules[module_name]
+
+
+def measure(name, func, repeat, setup=None):
+    """
+    :type name: str
+    :param func: the benchmark, called with the result of `setup` if it's given
+    :type func: (() -> object) | ((object) -> object)
+    :type repeat: int
+    :param setup: prepares a cold state before each run, which is not timed
+    :type setup: (() -> object) | None
+    :rtype: OrderedDict
+    """
+    durations = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        started_at = time.time()
+        if setup is not None:
+            func(state)
+        else:
+            func()
+        durations.append(time.time() - started_at)
+    return OrderedDict((('benchmark', name), ('runs', repeat), ('min', min(durations)),
+                        ('p50', percentile(durations, 50)), ('p90', percentile(durations, 90)),
+                        ('max', max(durations))))
+
+
+@task
+@task.auto_create_short_arguments(False)
+def micro(file_count=2000, file_size=256, checker_count=5, repeat=20, output='', keep=False):
+    """
+    Benchmark checker discovery, content enumeration and checker dispatch separately, in process.
+    """
+    from submarine_githooks.checker import checker
+    from submarine_githooks.engine import SerialExecutor, run_checkers
+    from submarine_githooks.hooks import find_contents
+    from submarine_githooks.matcher import FileMatcher
+    from submarine_githooks.registry import CheckerRegistry
+    from submarine_githooks.repository import Repository
+
+    work_dir = tempfile.mkdtemp(prefix='submarine-benchmark-')
+    try:
+        repo = SyntheticRepo(os.path.join(work_dir, 'repo'), file_count, file_size, checker_count)
+        console.info('Building synthetic repo at {}'.format(repo.path))
+        repo.build()
+        hooks_home = os.path.join(repo.path, '.githooks')
+        sys.path.append(hooks_home)
+        manifest_path = os.path.join(work_dir, 'registry.json')
+        git_repo = Repository(repo.path)
+        fresh_repos = []
+
+        def fresh_repo():
+            # Without cached diffs and blobs of earlier runs
+            while fresh_repos:
+                fresh_repos.pop().close()
+            fresh_repos.append(Repository(repo.path))
+            return fresh_repos[-1]
+
+        def evict_checker_modules():
+            evict_modules(hooks_home)
+
+        def discover_without_manifest():
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            CheckerRegistry(hooks_home, manifest_path).checkers('pre-commit')
+
+        def discover_with_manifest():
+            CheckerRegistry(hooks_home, manifest_path).checkers('pre-commit')
+
+        def fast_path_check():
+            CheckerRegistry(hooks_home, manifest_path).may_have_checkers('post-commit')
+
+        def preload():
+            preloading_repo = Repository(repo.path)
+            preloading_repo.preload(content.file_path for content in pre_commit_contents)
+            preloading_repo.close()
+
+        def match_files():
+            matcher = FileMatcher(dummy_checkers)
+            for content in pre_commit_contents:
+                matcher.match(content.file_path)
+
+        arguments, _, _ = repo.hook_invocation('post-checkout')
+        pre_commit_contents = find_contents(git_repo, 'pre-commit', ['pre-commit'], None)
+        # No-op checkers, so only the cost of dispatching is measured
+        dummy_checkers = [checker.file_extension('.json')(checker(lambda *args: None)) for _ in range(checker_count)]
+
+        results = [
+            measure('discovery (scan)', lambda _: discover_without_manifest(), repeat, evict_checker_modules),
+            measure('discovery (manifest)', lambda _: discover_with_manifest(), repeat, evict_checker_modules),
+            measure('discovery (fast path)', fast_path_check, repeat),
+            measure('contents (pre-commit)',
+                    lambda fresh: find_contents(fresh, 'pre-commit', ['pre-commit'], None), repeat, fresh_repo),
+            measure('contents (post-checkout)',
+                    lambda fresh: find_contents(fresh, 'post-checkout', ['post-checkout'] + arguments, None), repeat,
+                    fresh_repo),
+            measure('preload blobs', preload, repeat),
+            measure('matcher index', match_files, repeat),
+            measure('dispatch', lambda: run_checkers(SerialExecutor(), git_repo, 'pre-commit', dummy_checkers,
+                                                     pre_commit_contents), repeat),
+        ]
+        git_repo.close()
+        while fresh_repos:
+            fresh_repos.pop().close()
+        print_results(results, ['benchmark', 'runs', 'min', 'p50', 'p90', 'max'])
+        write_output(output, OrderedDict((('file_count', file_count), ('file_size', file_size),
+                                          ('checker_count', checker_count))), results)
+    finally:
+        if keep:
+            console.info('Kept {}'.format(work_dir))
+        else:
+            shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    task.dispatch()
@@ -18,7 +18,22 @@
 
 from __future__ import unicode_literals, division, absolute_import, print_function
 import os
+import sys
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
+
+# Modules using syntax of Python 3.5+, which can't be byte-compiled on Python 2
+python3_modules = ('submarine_githooks.aio',)
+
+
+class BuildPy(build_py):
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info[0] < 3:
+            modules = [(package_, module, path) for package_, module, path in modules
+                       if '{}.{}'.format(package_, module) not in python3_modules]
+        return modules
 
 with open(os.path.join(os.path.dirname(__file__), 'README.md'), 'r') as f:
     long_description = f.read()
@@ -33,6 +48,7 @@ setup(name='submarine-githooks',
       long_description=long_description,
 
       packages=find_packages(),
+      cmdclass={'build_py': BuildPy},
       include_package_data=True,
       install_requires=[
           'taskr>=0.2.28',
@@ -43,7 +59,7 @@ setup(name='submarine-githooks',
       entry_points={
           'console_scripts': [
               'submarine-githooks = submarine_githooks.main:task.dispatch',
-              'submarine-githooks-entry = submarine_githooks.hooks:main',
+              'submarine-githooks-entry = submarine_githooks.entry:main',
           ],
       },
 
@@ -0,0 +1,277 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Support of `async def` checkers, which run on one event loop of the hook process.
+# Python 3.5+ only. It's imported by the engine only when there're async checkers, and not installed on Python 2.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import asyncio
+import subprocess
+import time
+import weakref
+from submarine_githooks.engine import LimitExceeded
+from submarine_githooks.repository import Blob, object_types
+
+_blob_readers = weakref.WeakKeyDictionary()
+""":type: weakref.WeakKeyDictionary[submarine_githooks.repository.Repository, AsyncBlobReader]"""
+
+
+class AsyncBlobReader(object):
+    """
+    Like `submarine_githooks.repository.BlobReader`, but the `git cat-file --batch` process is driven by the event
+    loop, so checkers waiting for blobs don't block each other.
+    """
+
+    def __init__(self, source_root):
+        """
+        :type source_root: str
+        """
+        self.source_root = source_root
+        self._processes = {}
+        """:type: dict[str, asyncio.subprocess.Process]"""
+        self._lock = None
+        """:type: asyncio.Lock"""
+
+    async def _process(self, mode):
+        """
+        :param mode: `--batch` or `--batch-check`
+        :type mode: str
+        :rtype: asyncio.subprocess.Process
+        """
+        process = self._processes.get(mode)
+        if process is None or process.returncode is not None:
+            process = self._processes[mode] = await asyncio.create_subprocess_exec(
+                'git', 'cat-file', mode, cwd=self.source_root, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return process
+
+    async def read(self, object_names):
+        """
+        :param object_names: names understood by git, like `<sha>`, `:<path>` (the index) or `<commit>:<path>`
+        :type object_names: collections.Iterable[str]
+        :return: blobs in the order of given names. None for objects which don't exist.
+        :rtype: list[Blob | None]
+        """
+        return await self._request('--batch', object_names)
+
+    async def info(self, object_names):
+        """
+        :type object_names: collections.Iterable[str]
+        :rtype: list[Blob | None]
+        """
+        return await self._request('--batch-check', object_names)
+
+    async def _request(self, mode, object_names):
+        """
+        :type mode: str
+        :type object_names: collections.Iterable[str]
+        :rtype: list[Blob | None]
+        """
+        object_names = list(object_names)
+        requests = [object_name for object_name in object_names if '\n' not in object_name]
+        if not requests:
+            return [None] * len(object_names)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            process = await self._process(mode)
+            try:
+                process.stdin.write(''.join('{}\n'.format(request) for request in requests).encode('utf-8'))
+                # Drain while reading, or both sides may block on full pipes.
+                _, responses = await asyncio.gather(process.stdin.drain(),
+                                                    self._read_responses(process.stdout, len(requests),
+                                                                         mode == '--batch'))
+            except BaseException:
+                # Like being cancelled by a timeout. The rest of responses would be read by the next request.
+                process.kill()
+                self._processes.pop(mode, None)
+                raise
+        responses = dict(zip(requests, responses))
+        return [responses.get(object_name) for object_name in object_names]
+
+    @staticmethod
+    async def _read_responses(stdout, count, with_data):
+        """
+        :type stdout: asyncio.StreamReader
+        :type count: int
+        :type with_data: bool
+        :rtype: list[Blob | None]
+        """
+        responses = []
+        for _ in range(count):
+            header = await stdout.readline()
+            if not header:
+                raise IOError('git cat-file exits unexpectedly.')
+            fields = header.decode('utf-8').rstrip('\n').split(' ')
+            if len(fields) != 3 or fields[1] not in object_types:
+                responses.append(None)
+                continue
+            sha, object_type, size = fields
+            size = int(size)
+            data = None
+            if with_data:
+                data = await stdout.readexactly(size)
+                await stdout.readexactly(1)  # trailing line feed
+            responses.append(Blob(sha, object_type, size, data))
+        return responses
+
+    async def close(self):
+        for process in self._processes.values():
+            if process.returncode is None:
+                process.stdin.close()
+                await process.wait()
+        self._processes.clear()
+
+
+def blob_reader(git_repo):
+    """
+    The async blob reader of the repo, which lives as long as the event loop running checkers.
+
+    :type git_repo: submarine_githooks.repository.Repository
+    :rtype: AsyncBlobReader
+    """
+    reader = _blob_readers.get(git_repo)
+    if reader is None:
+        reader = _blob_readers[git_repo] = AsyncBlobReader(git_repo.source_root)
+    return reader
+
+
+async def read_blobs(git_repo, paths, commit=''):
+    """
+    Read blobs of paths in one round trip. Blobs preloaded by the hook are returned without reading them again.
+
+    :type git_repo: submarine_githooks.repository.Repository
+    :type paths: collections.Iterable[str]
+    :param commit: the commit to read from. Empty string means the index.
+    :type commit: str
+    :rtype: list[Blob | None]
+    """
+    paths = list(paths)
+    blobs = [git_repo.cached_blob(path, commit) for path in paths]
+    unread_indexes = [index for index, blob in enumerate(blobs) if blob is None or blob.data is None]
+    if unread_indexes:
+        read = await blob_reader(git_repo).read(git_repo.object_name(paths[index], commit) for index in unread_indexes)
+        for index, blob in zip(unread_indexes, read):
+            blobs[index] = blob
+    return blobs
+
+
+async def file_content(git_repo, path, commit=''):
+    """
+    :type git_repo: submarine_githooks.repository.Repository
+    :type path: str
+    :type commit: str
+    :return: content of the file, or None if it doesn't exist in the commit
+    :rtype: bytes | None
+    """
+    blob = (await read_blobs(git_repo, [path], commit))[0]
+    return blob.data if blob is not None else None
+
+
+async def check_output(args, cwd=None, input=None):
+    """
+    Run a command, like an external linter, without blocking other checkers.
+    The command is killed if the checker is cancelled, like when it times out.
+
+    :type args: list[str]
+    :type cwd: str | None
+    :type input: bytes | None
+    :return: stdout of the command
+    :rtype: bytes
+    :raise subprocess.CalledProcessError: if the command exits with non-zero code, with stdout and stderr of it
+    """
+    process = await asyncio.create_subprocess_exec(*args, cwd=cwd,
+                                                   stdin=subprocess.PIPE if input is not None else None,
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate(input)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+    return stdout
+
+
+async def _invoke(checker, args, limits=None):
+    """
+    :type checker: submarine_githooks.checker.Checker
+    :type args: tuple
+    :type limits: submarine_githooks.engine.ResourceLimits | None
+    :rtype: (Exception | None, float, float)
+    """
+    timeout = limits.timeout if limits is not None else None
+    exception = None
+    started_at = time.time()
+    try:
+        if timeout is None:
+            await checker(*args)
+        else:
+            await asyncio.wait_for(checker(*args), timeout)
+    except asyncio.TimeoutError as e:
+        exception = LimitExceeded('Timed out after {:g}s'.format(timeout)) if timeout is not None else e
+    except Exception as e:
+        exception = e
+    # CPU time is not measured, since it's shared by all checkers on the loop.
+    return exception, time.time() - started_at, 0.0
+
+
+async def _map(calls, jobs, fail_fast, limits):
+    """
+    :rtype: list[(Exception | None, float, float) | None]
+    """
+    semaphore = asyncio.Semaphore(jobs)
+    outcomes = [None] * len(calls)
+    stopped = False
+
+    async def invoke(index, checker, args):
+        nonlocal stopped
+        # The semaphore is acquired in order, so checkers start in the order they're scheduled.
+        async with semaphore:
+            if stopped:
+                return
+            outcomes[index] = await _invoke(checker, args, limits.get(checker))
+            if fail_fast and outcomes[index][0] is not None:
+                stopped = True
+
+    await asyncio.gather(*(invoke(index, checker, args) for index, (checker, args) in enumerate(calls)))
+    return outcomes
+
+
+def map_async(calls, jobs=16, fail_fast=False, limits=None):
+    """
+    Invoke async checkers on a new event loop, at most `jobs` of them at a time.
+    Memory limits are not enforced, since checkers share the process.
+
+    :type calls: list[(submarine_githooks.checker.Checker, tuple)]
+    :type jobs: int
+    :param fail_fast: start no more checkers once one fails
+    :type fail_fast: bool
+    :type limits: dict[submarine_githooks.checker.Checker, submarine_githooks.engine.ResourceLimits] | None
+    :return: outcome of each call, in the same order. None for calls not invoked because of `fail_fast`.
+    :rtype: list[(Exception | None, float, float) | None]
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_map(calls, max(jobs, 1), fail_fast, limits or {}))
+    finally:
+        readers = list(_blob_readers.values())
+        _blob_readers.clear()
+        for reader in readers:
+            loop.run_until_complete(reader.close())
+        loop.close()
@@ -0,0 +1,367 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Run pre-commit checkers over all tracked files, or files changed by a range of commits, outside of git hooks.
+# Files are split into shards by hashes of their paths, so CI nodes could audit a shard each and merge their reports.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+import io
+import json
+import os
+import sys
+import zlib
+from submarine_githooks.config import HookConfig
+from submarine_githooks.constants import state_dir_name
+from submarine_githooks.content import Content, LineRanges
+from submarine_githooks.engine import ResourceLimits, create_executor, run_checkers
+from submarine_githooks.hooks import preload_contents
+from submarine_githooks.matcher import FileMatcher
+from submarine_githooks.registry import CheckerRegistry
+from submarine_githooks.repository import Repository, null_sha
+from submarine_githooks.scheduler import CheckerCosts
+
+# Checkers are invoked with contents like those of this hook
+audit_hook_name = 'pre-commit'
+# Contents checked in one round, which bounds blobs held in memory
+audit_chunk_size = 2000
+submodule_mode = '160000'
+
+
+def parse_shard(shard):
+    """
+    :param shard: like `2/8`, the 2nd of 8 shards
+    :type shard: str
+    :return: (index, count), where index is 1-based
+    :rtype: (int, int)
+    """
+    try:
+        index, count = (int(value) for value in shard.split('/'))
+    except ValueError:
+        raise ValueError('Invalid shard. got "{}", `i/n` is expected, like `1/4`.'.format(shard))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError('Invalid shard. got "{}", `i/n` with 1 <= i <= n is expected.'.format(shard))
+    return index, count
+
+
+def in_shard(path, index, count):
+    """
+    Which shard a file belongs to depends on its path only, so shards don't overlap on any node.
+
+    :type path: str
+    :type index: int
+    :type count: int
+    :rtype: bool
+    """
+    return (zlib.crc32(path.encode('utf-8')) & 0xffffffff) % count == index - 1
+
+
+def parse_commit_range(git_repo, commits):
+    """
+    :type git_repo: Repository
+    :param commits: `A..B` for changes made by commits reachable from B but not from A, like `git log A..B`, or a
+        commit for changes made by it
+    :type commits: str
+    :return: (base commit, head commit)
+    :rtype: (str, str)
+    """
+    if '...' in commits:
+        raise ValueError('Invalid commit range. got "{}", `A..B` or a commit is expected.'.format(commits))
+    if '..' in commits:
+        base, head = commits.split('..', 1)
+        base, head = _resolve_commit(git_repo, base or 'HEAD'), _resolve_commit(git_repo, head or 'HEAD')
+        # Changes made only on A since they diverged are not part of the range
+        try:
+            merge_base = next(git_repo.iter_git_output(['merge-base', base, head], separator=b'\n'))
+        except (ValueError, StopIteration):
+            # Unrelated histories, where all files of B are changed
+            merge_base = null_sha
+        return merge_base, head
+    head = _resolve_commit(git_repo, commits)
+    parents = list(git_repo.iter_git_output(['rev-list', '--parents', '-n', '1', head], separator=b'\n'))
+    parents = parents[0].split(' ')[1:] if parents and parents[0] else []
+    return parents[0] if parents else null_sha, head
+
+
+def _resolve_commit(git_repo, rev):
+    """
+    :type git_repo: Repository
+    :type rev: str
+    :rtype: str
+    """
+    try:
+        return next(git_repo.iter_git_output(['rev-parse', '--verify', '{}^{{commit}}'.format(rev)],
+                                             separator=b'\n'))
+    except (ValueError, StopIteration):
+        raise ValueError('Unknown commit "{}"'.format(rev))
+
+
+@contextmanager
+def temporary_index(git_repo, commit):
+    """
+    Point the index of git commands to a temporary one holding the tree of the commit, so checkers reading staged
+    files (like `git_repo.file_content(file_path)`) read files of the commit.
+
+    :type git_repo: Repository
+    :type commit: str
+    """
+    index_path = os.path.join(git_repo.source_root, '.git', state_dir_name, 'audit-{}.index'.format(os.getpid()))
+    if not os.path.exists(os.path.dirname(index_path)):
+        os.makedirs(os.path.dirname(index_path))
+    original_index_path = os.environ.get('GIT_INDEX_FILE')
+    os.environ['GIT_INDEX_FILE'] = index_path
+    try:
+        list(git_repo.iter_git_output(['read-tree', commit]))
+        yield
+    finally:
+        if original_index_path is None:
+            os.environ.pop('GIT_INDEX_FILE', None)
+        else:
+            os.environ['GIT_INDEX_FILE'] = original_index_path
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+
+def iter_audit_contents(git_repo, base_commit=None, head_commit=None, shard=(1, 1)):
+    """
+    :type git_repo: Repository
+    :param base_commit: files changed since this commit are audited. All tracked files if None.
+    :type base_commit: str | None
+    :type head_commit: str | None
+    :param shard: (index, count) of the shard to audit
+    :type shard: (int, int)
+    :rtype: collections.Iterator[Content]
+    """
+    if base_commit is None:
+        # `<mode> <sha> <stage>\t<path>`
+        entries = (entry.split('\t', 1) for entry in git_repo.iter_git_output(['ls-files', '--stage', '-z']) if entry)
+        # Unmerged files are not readable from the index
+        files = ((path, info.split(' ')[0]) for info, path in entries if info.endswith(' 0'))
+    else:
+        files = ((change.path, change.mode) for change in git_repo.diff(base_commit, head_commit)
+                 if not change.deleted)
+    for path, mode in files:
+        if mode != submodule_mode and in_shard(path, *shard):
+            content = Content.create_with_hook(audit_hook_name, path)
+            content.mode = mode
+            yield content
+
+
+class AuditReport(object):
+    """
+    Failures found by an audit, which could be written as JSON and merged with reports of other shards.
+    """
+
+    report_version = 1
+
+    def __init__(self, commits='', shards=None):
+        """
+        :param commits: the audited commit range. Empty for all tracked files.
+        :type commits: str
+        :param shards: audited shards, like [(1, 4), (2, 4)]
+        :type shards: list[(int, int)] | None
+        """
+        self.commits = commits
+        self.shards = shards or []
+        """:type: list[(int, int)]"""
+        self.files = 0
+        self.checks = 0
+        self.failures = []
+        """:type: list[OrderedDict]"""
+
+    def add_results(self, results):
+        """
+        :type results: list[submarine_githooks.engine.CheckResult]
+        """
+        for result in results:
+            # Invocations of batch checkers are counted by their files
+            if result.active and not result.skipped and (result.content is not None or result.checker.once):
+                self.checks += 1
+            if result.failed:
+                self.failures.append(OrderedDict((
+                    ('checker', result.checker.name),
+                    ('file', result.content.file_path if result.content is not None else ''),
+                    ('message', str(result.exception)),
+                )))
+
+    @property
+    def complete(self):
+        """
+        :return: whether all shards are audited
+        :rtype: bool
+        """
+        if not self.shards:
+            return False
+        count = self.shards[0][1]
+        return sorted(set(self.shards)) == [(index, count) for index in range(1, count + 1)]
+
+    def as_dict(self):
+        """
+        :rtype: OrderedDict
+        """
+        return OrderedDict((
+            ('version', self.report_version),
+            ('commits', self.commits),
+            ('shards', ['{}/{}'.format(index, count) for index, count in sorted(self.shards)]),
+            ('complete', self.complete),
+            ('files', self.files),
+            ('checks', self.checks),
+            ('failures', sorted(self.failures, key=lambda failure: (failure['file'], failure['checker']))),
+        ))
+
+    def write(self, path):
+        """
+        :type path: str
+        """
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.as_dict(), indent=2, ensure_ascii=False))
+
+    @classmethod
+    def merge(cls, paths):
+        """
+        :param paths: paths of reports of shards
+        :type paths: list[str]
+        :rtype: AuditReport
+        """
+        merged = None
+        for path in paths:
+            with io.open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            if report.get('version') != cls.report_version:
+                raise ValueError('Unsupported audit report: {}'.format(path))
+            if merged is None:
+                merged = cls(report['commits'])
+            elif report['commits'] != merged.commits:
+                raise ValueError('Reports audit different commits. got "{}" and "{}"'.format(merged.commits,
+                                                                                           report['commits']))
+            merged.shards.extend(parse_shard(shard) for shard in report['shards'])
+            merged.files += report['files']
+            merged.checks += report['checks']
+            merged.failures.extend(OrderedDict(failure) for failure in report['failures'])
+        if merged is None:
+            raise ValueError('No audit report to merge')
+        return merged
+
+
+def run_audit(source_root, commits='', shard='1/1', jobs=0, executor_mode='process', fail_fast=False,
+              on_results=None):
+    """
+    :type source_root: str
+    :param commits: the commit range to audit, see `parse_commit_range`. All tracked files if empty.
+    :type commits: str
+    :param shard: like `2/8`
+    :type shard: str
+    :param jobs: number of workers. 0 means the number of CPUs.
+    :type jobs: int
+    :type executor_mode: str
+    :type fail_fast: bool
+    :param on_results: called with results of each round, like to print failures. Checkers invoked once with all
+        files run in a round of their own, after rounds of files.
+    :type on_results: callable | None
+    :rtype: AuditReport
+    """
+    shard_index, shard_count = parse_shard(shard)
+    git_repo = Repository(source_root)
+    git_hooks_home = os.path.join(source_root, '.githooks')
+    if git_hooks_home not in sys.path:
+        sys.path.append(git_hooks_home)
+
+    hook_config = HookConfig.for_source_root(source_root)
+    config, _ = hook_config.values(audit_hook_name)
+    git_repo.max_blob_cache_size = config['max_blob_cache_size']
+    checkers = [checker for checker in CheckerRegistry.for_source_root(source_root).checkers(audit_hook_name)
+                if hook_config.is_checker_enabled(checker.name, audit_hook_name)]
+    limits = {}
+    for checker in checkers:
+        checker_settings = hook_config.checker_settings(checker.name, audit_hook_name)
+        limits[checker] = ResourceLimits(checker_settings.get('timeout', checker.timeout or config['timeout']),
+                                         checker_settings.get('memory_limit',
+                                                              checker.memory_limit or config['memory_limit']))
+    # Checkers invoked once with all files don't run for each round, but once with files of all rounds
+    once_checkers = [checker for checker in checkers if checker.once]
+    checkers = [checker for checker in checkers if not checker.once]
+    once_contents = []
+    matcher = FileMatcher(checkers)
+    report = AuditReport(commits, [(shard_index, shard_count)])
+    costs = CheckerCosts(os.path.join(source_root, '.git', state_dir_name, 'costs.json'))
+
+    base_commit = head_commit = None
+    if commits:
+        base_commit, head_commit = parse_commit_range(git_repo, commits)
+    try:
+        with (temporary_index(git_repo, head_commit) if head_commit else _nothing()):
+            content_iterator = iter_audit_contents(git_repo, base_commit, head_commit, (shard_index, shard_count))
+            while True:
+                contents = list(islice(content_iterator, audit_chunk_size))
+                if not contents:
+                    break
+                report.files += len(contents)
+                # Workers are started again for each round, so blobs they have read are dropped.
+                executor = create_executor(executor_mode, jobs)
+                if executor.jobs == 1 or executor_mode == 'thread':
+                    # Worker processes read blobs by themselves
+                    preload_contents(git_repo, matcher, contents)
+                for content in contents:
+                    # The whole file is subject to the audit
+                    content.changed_lines = LineRanges([(1, sys.maxsize)])
+                if once_checkers:
+                    once_contents.extend(contents)
+                try:
+                    results = run_checkers(executor, git_repo, audit_hook_name, checkers, contents, matcher=matcher,
+                                           fail_fast=fail_fast, schedule_mode=config['schedule'], costs=costs,
+                                           limits=limits, async_jobs=config['async_jobs'])
+                finally:
+                    executor.close()
+                    git_repo.close()
+                _add_results(report, costs, on_results, results)
+                if fail_fast and report.failures:
+                    break
+            if once_checkers and not (fail_fast and report.failures):
+                executor = create_executor(executor_mode, jobs)
+                try:
+                    results = run_checkers(executor, git_repo, audit_hook_name, once_checkers, once_contents,
+                                           fail_fast=fail_fast, schedule_mode=config['schedule'], costs=costs,
+                                           limits=limits, async_jobs=config['async_jobs'])
+                finally:
+                    executor.close()
+                _add_results(report, costs, on_results, results)
+    finally:
+        git_repo.close()
+    try:
+        costs.save()
+    except (IOError, OSError):
+        pass
+    return report
+
+
+def _add_results(report, costs, on_results, results):
+    """
+    :type report: AuditReport
+    :type costs: CheckerCosts
+    :type on_results: callable | None
+    :type results: list[submarine_githooks.engine.CheckResult]
+    """
+    report.add_results(results)
+    costs.update(results)
+    if on_results:
+        on_results(results)
+
+
+@contextmanager
+def _nothing():
+    yield
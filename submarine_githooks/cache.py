@@ -0,0 +1,156 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import hashlib
+import json
+import os
+import sys
+import time
+import six
+
+# Hooks which validate files, whose passed results could be reused. Checkers of other hooks, like `post-checkout`, are
+# usually run for side effects (like installing dependencies), which should happen every time.
+cached_hook_names = ('pre-commit', 'pre-push')
+# Used times of entries are refreshed at most once in this period, so runs which only hit the cache don't save it.
+refresh_interval = 24 * 60 * 60
+
+
+class ResultCache(object):
+    """
+    Remember (checker, blob) pairs which have passed, so unchanged blobs are not checked again.
+    Entries are evicted by least recent use once there are more than `max_size` of them.
+
+    A checker is checked again once the module defining it or its settings in the config are modified, but not when
+    other modules it imports are modified.
+    """
+
+    def __init__(self, path, max_size=10000, checker_settings=None):
+        """
+        :type path: str
+        :type max_size: int
+        :param checker_settings: returns settings of a checker in the config, which are part of keys
+        :type checker_settings: ((submarine_githooks.checker.Checker) -> dict) | None
+        """
+        self.path = path
+        self.max_size = max_size
+        self.checker_settings = checker_settings
+        self._entries = None
+        """:type: dict[str, float]"""
+        self._checker_digests = {}
+        self._checker_settings_keys = {}
+        self._now = time.time()
+        self._dirty = False
+
+    @property
+    def entries(self):
+        """
+        :rtype: dict[str, float]
+        """
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                # noinspection PyBroadException
+                try:
+                    with open(self.path, 'r') as f:
+                        self._entries = dict(json.load(f))
+                except Exception:
+                    # A broken cache is just an empty cache.
+                    self._entries = {}
+        return self._entries
+
+    def checker_digest(self, checker):
+        """
+        Digest of the module source defining the checker. A checker is re-run after its module is modified.
+
+        :type checker: submarine_githooks.checker.Checker
+        :rtype: str | None
+        """
+        module_name = checker.module_name
+        if module_name not in self._checker_digests:
+            digest = None
+            module_path = getattr(sys.modules.get(module_name), '__file__', None)
+            if module_path and os.path.splitext(module_path)[-1] in ('.pyc', '.pyo'):
+                module_path = module_path[:-1]
+            if module_path and os.path.exists(module_path):
+                with open(module_path, 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+            self._checker_digests[module_name] = digest
+        return self._checker_digests[module_name]
+
+    def checker_settings_key(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :rtype: str
+        """
+        if checker not in self._checker_settings_keys:
+            settings = self.checker_settings(checker) if self.checker_settings else {}
+            self._checker_settings_keys[checker] = json.dumps(settings, sort_keys=True)
+        return self._checker_settings_keys[checker]
+
+    def key(self, checker, hook_name, content):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :type hook_name: str
+        :type content: submarine_githooks.content.Content
+        :return: None if the pair is not cacheable
+        :rtype: str | None
+        """
+        if hook_name not in cached_hook_names or not content.file_path:
+            # Only files are cached, like pushed files but not push actions.
+            return None
+        checker_digest = self.checker_digest(checker)
+        if not checker_digest or not content.blob_sha:
+            return None
+        # Arguments (like the file path) are part of the key since checkers could depend on them.
+        components = ((checker.name, checker_digest, self.checker_settings_key(checker), content.blob_sha, hook_name) +
+                      content.arguments_for(checker))
+        return hashlib.sha1('\0'.join(map(six.text_type, components)).encode('utf-8')).hexdigest()
+
+    def __contains__(self, key):
+        if key is not None and key in self.entries:
+            if self._now - self.entries[key] > refresh_interval:
+                self.entries[key] = self._now
+                self._dirty = True
+            return True
+        return False
+
+    def add(self, key):
+        if key is not None:
+            self.entries[key] = self._now
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        entries = self.entries
+        if len(entries) > self.max_size:
+            entries = dict(sorted(six.iteritems(entries), key=lambda item: item[1])[-self.max_size:])
+
+        cache_dir = os.path.dirname(self.path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary file and then rename, so hooks running at the same time never read a partial file.
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f)
+        os.rename(temp_path, self.path)
+        self._dirty = False
+
+    def clear(self):
+        self._entries = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -15,11 +15,58 @@
 #
 
 from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
 import functools
+import inspect
 import os
 import re
 import six
 
+file_filter_kinds = ('extension', 'name', 'path', 'pattern', 'validate')
+
+# `async def` checkers are only possible on Python 3.5+
+iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', lambda obj: False)
+
+
+def file_filter_matches(kind, values, path):
+    """
+    :type kind: str
+    :type values: list
+    :type path: str
+    :rtype: bool
+    """
+    if kind == 'extension':
+        return os.path.splitext(path)[-1] in values
+    elif kind == 'name':
+        return os.path.split(path)[-1] in values
+    elif kind == 'path':
+        return path in values
+    elif kind == 'pattern':
+        return any(regex.search(path) is not None for regex in values)
+    elif kind == 'validate':
+        return any(validate(path) for validate in values)
+    raise ValueError('Invalid file filter kind. got "{}" Choices={{{}}}'.format(kind, ','.join(file_filter_kinds)))
+
+
+class FileFailures(Exception):
+    """
+    Raised by a batch checker to fail some of files. Each failure is reported like one of a per-file checker.
+    """
+
+    def __init__(self, failures):
+        """
+        :param failures: file path => exception or error message
+        :type failures: dict[str, Exception | str]
+        """
+        failures = dict((file_path, failure if isinstance(failure, Exception) else Exception(failure))
+                        for file_path, failure in failures.items())
+        super(FileFailures, self).__init__(failures)
+        self.failures = failures
+        """:type: dict[str, Exception]"""
+
+    def __str__(self):
+        return '\n'.join('{}: {}'.format(file_path, failure) for file_path, failure in sorted(self.failures.items()))
+
 
 class Checker(object):
 
@@ -27,21 +74,79 @@ class Checker(object):
         self._callable = callable_obj
         functools.update_wrapper(self, self.callable)
 
-        self.is_active_for_file = lambda x: True
-        """:type: (str) -> bool"""
+        self.file_filters = OrderedDict()
+        """:type: OrderedDict[str, list]"""
         self.active_hooks = []
         """:type: list[str]"""
         self.once = False
+        self.batch = False
+        self.changed_lines = False
+        self.pushed_files = False
+        self.priority = 0
+        self.cost = None
+        """:type: float | None"""
+        self.timeout = None
+        """:type: float | None"""
+        self.memory_limit = None
+        """:type: int | None"""
 
     def __call__(self, *args, **kwargs):
-        self.callable(*args, **kwargs)
+        # A coroutine for async checkers, which is awaited by `submarine_githooks.aio`
+        return self.callable(*args, **kwargs)
+
+    @property
+    def is_async(self):
+        """
+        :return: whether the checker is defined by `async def`
+        :rtype: bool
+        """
+        return iscoroutinefunction(self.callable)
+
+    def add_file_filter(self, kind, *values):
+        """
+        Filters of the same kind are OR-ed, and filters of different kinds are AND-ed.
+        i.e. `file_extension('.json')` with `file_pattern('^locales/')` matches JSON files under `locales`,
+        while `file_extension('.json')` with `file_extension('.yaml')` matches both JSON and YAML files.
+
+        :type kind: str
+        """
+        if kind not in file_filter_kinds:
+            raise ValueError('Invalid file filter kind. got "{}" Choices={{{}}}'.format(kind,
+                                                                                     ','.join(file_filter_kinds)))
+        self.file_filters.setdefault(kind, []).extend(values)
+
+    @property
+    def file_filter_items(self):
+        """
+        :rtype: list[(str, list)]
+        """
+        file_filters = OrderedDict((kind, list(values)) for kind, values in self.file_filters.items())
+        if 'is_active_for_file' in self.__dict__:
+            # Assigned directly, like older versions did
+            file_filters.setdefault('validate', []).append(self.__dict__['is_active_for_file'])
+        return list(file_filters.items())
+
+    def is_active_for_file(self, path):
+        """
+        :type path: str
+        :rtype: bool
+        """
+        return all(file_filter_matches(kind, values, path) for kind, values in self.file_filter_items)
 
     def is_active_for_hook(self, hook_name):
         return not self.active_hooks or hook_name in self.active_hooks
 
     @property
     def name(self):
-        return '{}.{}'.format(self.callable.__module__, self.callable.__name__)
+        return '{}.{}'.format(self.module_name, self.attr_name)
+
+    @property
+    def module_name(self):
+        return self.callable.__module__
+
+    @property
+    def attr_name(self):
+        return self.callable.__name__
 
     @property
     def callable(self):
@@ -60,52 +165,112 @@ class CheckerManager(object):
         """
         return self._get_or_create_checker(callable_obj)
 
-    def file_pattern(self, regex):
-        if isinstance(regex, six.string_types):
-            regex = re.compile(regex)
+    def file_pattern(self, *regexes):
+        regexes = [re.compile(regex) if isinstance(regex, six.string_types) else regex for regex in regexes]
+        return self._file_filter('pattern', *regexes)
+
+    def file_extension(self, *file_exts):
+        return self._file_filter('extension', *file_exts)
+
+    def file_name(self, *file_names):
+        return self._file_filter('name', *file_names)
+
+    def file_path(self, *file_paths):
+        return self._file_filter('path', *file_paths)
+
+    def file_validate(self, *callable_objs):
+        """
+        :type callable_objs: list[(str) -> bool]
+        """
+        return self._file_filter('validate', *callable_objs)
 
+    def _file_filter(self, kind, *values):
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-            checker_obj.is_active_for_file = lambda path: regex.search(path) is not None
+            checker_obj.add_file_filter(kind, *values)
             return checker_obj
         return wrapper
 
-    def file_extension(self, file_ext):
+    def once(self, callable_or_checker_obj):
+        checker_obj = self._get_or_create_checker(callable_or_checker_obj)
+        checker_obj.once = True
+        return checker_obj
+
+    def batch(self, callable_or_checker_obj):
+        """
+        The checker is invoked once with all contents it's active for, as a
+        `submarine_githooks.content.ContentCollection`. Raise `FileFailures` to fail some of them.
+        """
+        checker_obj = self._get_or_create_checker(callable_or_checker_obj)
+        checker_obj.batch = True
+        return checker_obj
+
+    def changed_lines(self, callable_or_checker_obj):
+        """
+        Lines changed in the file are passed to the checker as an additional argument,
+        a `submarine_githooks.content.LineRanges`, or None if the hook doesn't stage changes.
+        """
+        checker_obj = self._get_or_create_checker(callable_or_checker_obj)
+        checker_obj.changed_lines = True
+        return checker_obj
+
+    def pushed_files(self, callable_or_checker_obj):
+        """
+        For `pre-push`, the checker is invoked with each file changed by pushed commits, instead of each pushed ref.
+        """
+        checker_obj = self._get_or_create_checker(callable_or_checker_obj)
+        checker_obj.pushed_files = True
+        return checker_obj
+
+    def priority(self, priority):
+        """
+        Checkers with higher priority are invoked earlier. 0 by default.
+
+        :type priority: int
+        """
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-            checker_obj.is_active_for_file = lambda path: os.path.splitext(path)[-1] == file_ext
+            checker_obj.priority = priority
             return checker_obj
         return wrapper
 
-    def file_name(self, *file_names):
+    def cost(self, seconds):
+        """
+        Declare the cost of an invocation, which is measured from previous runs otherwise.
+        Cheaper checkers are invoked earlier among checkers with the same priority.
+
+        :type seconds: float
+        """
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-            checker_obj.is_active_for_file = lambda path: os.path.split(path)[-1] in file_names
+            checker_obj.cost = seconds
             return checker_obj
         return wrapper
 
-    def file_path(self, *file_paths):
+    def timeout(self, seconds):
+        """
+        Kill the checker and fail if an invocation runs longer than this.
+
+        :type seconds: float
+        """
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-            checker_obj.is_active_for_file = lambda path: path in file_paths
+            checker_obj.timeout = seconds
             return checker_obj
         return wrapper
 
-    def file_validate(self, callable_obj):
+    def memory_limit(self, megabytes):
         """
-        :type callable_obj: (str) -> bool
+        Fail the checker if an invocation allocates more memory than this.
+
+        :type megabytes: int
         """
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-            checker_obj.is_active_for_file = callable_obj
+            checker_obj.memory_limit = megabytes
             return checker_obj
         return wrapper
 
-    def once(self, callable_or_checker_obj):
-        checker_obj = self._get_or_create_checker(callable_or_checker_obj)
-        checker_obj.once = True
-        return checker_obj
-
     def active_hooks(self, *active_hook_names):
         def wrapper(callable_or_checker_obj):
             checker_obj = self._get_or_create_checker(callable_or_checker_obj)
@@ -0,0 +1,380 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import namedtuple, OrderedDict
+from fnmatch import fnmatchcase
+import io
+import json
+import os
+import six
+from six.moves import cPickle as pickle
+from submarine_githooks.constants import executor_modes, hook_names, report_formats, schedule_modes, state_dir_name
+
+env_option_prefix = 'SUBMARINE_GITHOOK_'
+# Comma separated patterns of checkers to disable, in addition to ones disabled by the config file
+skip_env_option = env_option_prefix + 'SKIP'
+
+
+class Option(namedtuple('Option', ('type', 'default', 'choices'))):
+    __slots__ = ()
+
+    def __new__(cls, option_type, default, choices=None):
+        return super(Option, cls).__new__(cls, option_type, default, choices)
+
+    def validate(self, name, value):
+        """
+        :type name: str
+        :return: the value converted to the type of the option
+        :raise ConfigError: if the value is not of the type or not one of choices
+        """
+        if self.type is bool:
+            valid = isinstance(value, bool)
+        elif self.type is int:
+            valid = isinstance(value, six.integer_types) and not isinstance(value, bool)
+        elif self.type is float:
+            valid = isinstance(value, six.integer_types + (float,)) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, six.string_types)
+        if not valid:
+            raise ConfigError('Invalid value of "{}". got {!r}, {} is expected.'.format(name, value,
+                                                                                     self.type.__name__))
+        value = self.type(value)
+        if self.choices and value not in self.choices:
+            raise ConfigError('Invalid value of "{}". got "{}" Choices={{{}}}'.format(name, value,
+                                                                                     ','.join(self.choices)))
+        return value
+
+    def parse(self, name, value):
+        """
+        Parse the value of an environment variable.
+
+        :type name: str
+        :type value: str
+        :raise ConfigError: if the value is not of the type or not one of choices
+        """
+        if self.type is bool:
+            try:
+                return int(value) != 0
+            except ValueError:
+                return bool(value)
+        try:
+            converted = self.type(value)
+        except ValueError:
+            raise ConfigError('Invalid value of "{}". got "{}", {} is expected.'.format(name, value,
+                                                                                     self.type.__name__))
+        return self.validate(name, converted)
+
+
+options = OrderedDict((
+    ('debug', Option(bool, False)),
+    ('jobs', Option(int, 1)),
+    ('executor', Option(six.text_type, 'thread', executor_modes)),
+    ('async_jobs', Option(int, 16)),
+    ('fail_fast', Option(bool, False)),
+    ('schedule', Option(six.text_type, 'cost', schedule_modes)),
+    ('cache', Option(bool, True)),
+    ('cache_size', Option(int, 10000)),
+    ('max_blob_cache_size', Option(int, 1024 * 1024)),
+    ('timing_report', Option(six.text_type, '')),
+    ('timing_threshold', Option(float, 0.0)),
+    ('timing_top', Option(int, 10)),
+    ('timeout', Option(float, 0.0)),
+    ('memory_limit', Option(int, 0)),
+    ('report_format', Option(six.text_type, 'human', report_formats)),
+    ('report_output', Option(six.text_type, '')),
+    ('max_failures', Option(int, 20)),
+))
+""":type: OrderedDict[str, Option]"""
+
+# Settings of a checker under `checkers`. `false` is short for `{enabled: false}`.
+checker_options = OrderedDict((
+    ('enabled', Option(bool, True)),
+    ('timeout', Option(float, 0.0)),
+    ('memory_limit', Option(int, 0)),
+))
+""":type: OrderedDict[str, Option]"""
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _validate_checkers(checkers, where, ignored):
+    """
+    :param checkers: checker name pattern => enabled or not, or settings of checkers
+    :type where: str
+    :param ignored: messages of unknown settings, which are ignored, are appended to it
+    :type ignored: list[str]
+    :rtype: list[(str, dict)]
+    """
+    if not isinstance(checkers, dict):
+        raise ConfigError('Invalid value of "{}". A mapping of checker names to their settings is '
+                          'expected.'.format(where))
+    validated = []
+    for pattern, settings in checkers.items():
+        name = '{}.{}'.format(where, pattern)
+        if isinstance(settings, bool):
+            settings = {'enabled': settings}
+        elif not isinstance(settings, dict):
+            raise ConfigError('Invalid value of "{}". got {!r}, bool or a mapping is expected.'.format(name, settings))
+        validated_settings = {}
+        for key, value in settings.items():
+            if key not in checker_options:
+                ignored.append('Unknown option "{}.{}". Choices={{{}}} It is ignored.'.format(
+                    name, key, ','.join(checker_options)))
+                continue
+            validated_settings[key] = checker_options[key].validate('{}.{}'.format(name, key), value)
+        validated.append((six.text_type(pattern), validated_settings))
+    # Exact names win over patterns, and longer patterns win over shorter ones.
+    return sorted(validated, key=lambda item: (item[0] in ('*', '') or any(c in item[0] for c in '*?['),
+                                               -len(item[0])))
+
+
+def _validate_section(section, where, allow_hooks, ignored):
+    """
+    Unknown keys are ignored with a message, so a config written for a newer version still works.
+    Values of wrong types are errors.
+
+    :type section: dict
+    :type where: str
+    :type allow_hooks: bool
+    :param ignored: messages of unknown keys, which are ignored, are appended to it
+    :type ignored: list[str]
+    :return: {'options': dict, 'checkers': list[(str, bool)], 'hooks': dict}
+    :rtype: dict
+    """
+    if not isinstance(section, dict):
+        raise ConfigError('Invalid config{}. A mapping is expected.'.format(' of "{}"'.format(where) if where else ''))
+    validated = {'options': {}, 'checkers': [], 'hooks': {}}
+    for key, value in section.items():
+        name = '{}.{}'.format(where, key) if where else key
+        if key in options:
+            validated['options'][key] = options[key].validate(name, value)
+        elif key == 'checkers':
+            validated['checkers'] = _validate_checkers(value or {}, name, ignored)
+        elif key == 'hooks' and allow_hooks:
+            if not isinstance(value or {}, dict):
+                raise ConfigError('Invalid value of "hooks". A mapping of hook names is expected.')
+            for hook_name, hook_section in (value or {}).items():
+                if hook_name not in hook_names:
+                    ignored.append('Unknown hook name in "hooks". got "{}" Choices={{{}}} It is ignored.'.format(
+                        hook_name, ','.join(hook_names)))
+                    continue
+                validated['hooks'][hook_name] = _validate_section(hook_section or {}, 'hooks.{}'.format(hook_name),
+                                                                  False, ignored)
+        else:
+            ignored.append('Unknown option "{}". Choices={{{}}} It is ignored.'.format(
+                name, ','.join(list(options) + ['checkers'] + (['hooks'] if allow_hooks else []))))
+    return validated
+
+
+def _parse_config(data):
+    """
+    :param data: the loaded config file
+    :type data: dict
+    :rtype: dict
+    """
+    ignored = []
+    file_config = _validate_section(data, '', True, ignored)
+    file_config['ignored'] = ignored
+    return file_config
+
+
+class HookConfig(object):
+    """
+    Options of hooks, read from `.githooks/config.yaml` (or `.githooks/config.json`), and overridden by settings of
+    the hook in the same file and then by environment variables.
+
+    The file is validated once and the result is pickled under `.git`, so it's parsed again only when it's modified.
+    """
+
+    cache_version = 4
+    file_names = ('config.yaml', 'config.json')
+
+    def __init__(self, git_hooks_home, cache_path=None):
+        """
+        :param git_hooks_home: the folder holding the config file
+        :type git_hooks_home: str
+        :param cache_path: where to pickle the validated config. Not cached if None.
+        :type cache_path: str | None
+        """
+        self.git_hooks_home = git_hooks_home
+        self.cache_path = cache_path
+        self._file_config = None
+        """:type: dict"""
+
+    @classmethod
+    def for_source_root(cls, source_root):
+        """
+        :type source_root: str
+        :rtype: HookConfig
+        """
+        git_dir = os.path.join(source_root, '.git')
+        return cls(os.path.join(source_root, '.githooks'),
+                   os.path.join(git_dir, state_dir_name, 'config.pickle') if os.path.isdir(git_dir) else None)
+
+    @property
+    def path(self):
+        """
+        :return: path of the config file, or None if there's none
+        :rtype: str | None
+        """
+        for file_name in self.file_names:
+            path = os.path.join(self.git_hooks_home, file_name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @property
+    def file_config(self):
+        """
+        :return: the validated config file, like {'options': dict, 'checkers': list, 'hooks': dict, 'ignored': list}
+        :rtype: dict
+        :raise ConfigError: if the file is invalid
+        """
+        if self._file_config is None:
+            path = self.path
+            if path is None:
+                self._file_config = _parse_config({})
+                return self._file_config
+            stat = os.stat(path)
+            key = (self.cache_version, path, stat.st_mtime, stat.st_size)
+            self._file_config = self._load_cache(key)
+            if self._file_config is None:
+                self._file_config = self._parse(path)
+                self._save_cache(key, self._file_config)
+        return self._file_config
+
+    @staticmethod
+    def _parse(path):
+        """
+        :type path: str
+        :rtype: dict
+        """
+        with io.open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                try:
+                    data = json.load(f)
+                except ValueError as e:
+                    raise ConfigError('Failed to parse {}: {}'.format(path, e))
+            else:
+                # Imported here, since most runs read the pickled config only
+                import yaml
+                try:
+                    data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+                except yaml.YAMLError as e:
+                    raise ConfigError('Failed to parse {}: {}'.format(path, e))
+        return _parse_config(data or {})
+
+    def _load_cache(self, key):
+        """
+        :rtype: dict | None
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        # noinspection PyBroadException
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached_key, file_config = pickle.load(f)
+        except Exception:
+            return None
+        return file_config if cached_key == key else None
+
+    def _save_cache(self, key, file_config):
+        if not self.cache_path:
+            return
+        # noinspection PyBroadException
+        try:
+            cache_dir = os.path.dirname(self.cache_path)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            temp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+            with open(temp_path, 'wb') as f:
+                pickle.dump((key, file_config), f, 2)
+            os.rename(temp_path, self.cache_path)
+        except Exception:
+            # The config is parsed again next time
+            pass
+
+    def values(self, hook_name, environ=None):
+        """
+        :type hook_name: str
+        :param environ: environment variables. `os.environ` if None.
+        :type environ: dict[str, str] | None
+        :return: option name => value, and messages of unknown keys in the file and invalid environment variables,
+            which are ignored
+        :rtype: (dict, list[str])
+        """
+        environ = os.environ if environ is None else environ
+        file_config = self.file_config
+        values = dict((name, option.default) for name, option in options.items())
+        values.update(file_config['options'])
+        values.update(file_config['hooks'].get(hook_name, {}).get('options', {}))
+        ignored = list(file_config['ignored'])
+        for name, option in options.items():
+            env_name = env_option_prefix + name.upper()
+            if env_name in environ:
+                try:
+                    values[name] = option.parse(env_name, environ[env_name])
+                except ConfigError as e:
+                    ignored.append('{} It is ignored.'.format(e))
+        return values, ignored
+
+    def checker_settings(self, checker_name, hook_name):
+        """
+        Settings of a checker under `checkers` of the hook, and then under top-level `checkers`.
+        Each setting comes from the first pattern matching the checker which has it.
+
+        :type checker_name: str
+        :type hook_name: str
+        :return: setting name => value, for settings in `checker_options` which are set
+        :rtype: dict
+        """
+        file_config = self.file_config
+        settings = {}
+        for checkers in (file_config['hooks'].get(hook_name, {}).get('checkers', ()), file_config['checkers']):
+            for pattern, pattern_settings in checkers:
+                if _match_checker(checker_name, pattern):
+                    for key, value in pattern_settings.items():
+                        settings.setdefault(key, value)
+        return settings
+
+    def is_checker_enabled(self, checker_name, hook_name, environ=None):
+        """
+        Checkers are enabled unless disabled by `checkers` of the hook, then `checkers` of the file, or `SKIP`.
+
+        :type checker_name: str
+        :type hook_name: str
+        :type environ: dict[str, str] | None
+        :rtype: bool
+        """
+        environ = os.environ if environ is None else environ
+        skipped_patterns = [pattern.strip() for pattern in environ.get(skip_env_option, '').split(',')]
+        if any(pattern and _match_checker(checker_name, pattern) for pattern in skipped_patterns):
+            return False
+        return self.checker_settings(checker_name, hook_name).get('enabled', True)
+
+
+def _match_checker(checker_name, pattern):
+    """
+    A pattern matches the full name of a checker (`module.function`), or its function name.
+
+    :type checker_name: str
+    :type pattern: str
+    :rtype: bool
+    """
+    return fnmatchcase(checker_name, pattern) or fnmatchcase(checker_name.rsplit('.', 1)[-1], pattern)
@@ -29,3 +29,21 @@ hook_names = (
     'post-rewrite',
     'pre-push',
 )
+
+# Hooks which get input from stdin
+stdin_hook_names = ('pre-push', 'post-rewrite')
+
+# Hooks which are always linked, even without checkers, since they run after `git pull` or `git checkout` and sync
+# links of other hooks once checkers under `.githooks` are changed
+sync_hook_names = ('post-checkout', 'post-merge')
+
+# The command hooks are linked to
+entry_command_name = 'submarine-githooks-entry'
+
+# Folder under `.git` keeping caches of submarine-githooks
+state_dir_name = 'submarine-githooks'
+
+# Choices of options, kept here so the config is validated without importing modules running checkers
+executor_modes = ('thread', 'process')
+schedule_modes = ('cost', 'declared')
+report_formats = ('human', 'jsonl', 'sarif')
@@ -15,13 +15,102 @@
 #
 
 from __future__ import unicode_literals, division, absolute_import, print_function
+from bisect import bisect_right
+from contextlib import contextmanager
+import io
 import os
+import sys
+import six
+
+
+def intern_path(path):
+    """
+    Share one string among equal paths, like the same file changed by many pushed commits.
+    Only native strings could be interned, which paths are on Python 3.
+
+    :type path: str
+    :rtype: str
+    """
+    return sys.intern(path) if six.PY3 and isinstance(path, str) else path
+
+
+class LineRanges(object):
+    """
+    Lines (1-based) added or modified in a file, as sorted `(start, count)` ranges.
+    """
+
+    def __init__(self, ranges=()):
+        """
+        :type ranges: collections.Iterable[(int, int)]
+        """
+        self.ranges = sorted((start, count) for start, count in ranges if count > 0)
+        """:type: list[(int, int)]"""
+        self._starts = [start for start, _ in self.ranges]
+
+    def __contains__(self, line_number):
+        index = bisect_right(self._starts, line_number) - 1
+        return index >= 0 and line_number < self.ranges[index][0] + self.ranges[index][1]
+
+    def __iter__(self):
+        return iter(self.ranges)
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __eq__(self, other):
+        return isinstance(other, LineRanges) and self.ranges == other.ranges
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'LineRanges({!r})'.format(self.ranges)
+
+    def __str__(self):
+        # Part of result cache keys
+        return ','.join('{}+{}'.format(start, count) for start, count in self.ranges)
+
+    def select(self, lines):
+        """
+        Pick changed lines out of all lines of the file, and stop reading after the last changed one.
+
+        :param lines: lines of the file, like `data.splitlines()` or a file object
+        :type lines: collections.Iterable[str | bytes]
+        :return: (line number, line)
+        :rtype: collections.Iterator[(int, str | bytes)]
+        """
+        if not self.ranges:
+            return
+        last_line_number = self.ranges[-1][0] + self.ranges[-1][1] - 1
+        for line_number, line in enumerate(lines, 1):
+            if line_number > last_line_number:
+                break
+            if line_number in self:
+                yield line_number, line
 
 
 class Content(object):
 
+    # A checkout between distant commits could have 100k+ contents, so contents don't carry `__dict__`.
+    __slots__ = ('_arguments', '_invocation', '_invocation_with_lines', '_rel_file_path', 'blob', 'changed_lines',
+                 'mode', 'change', 'hook_name')
+
     def __init__(self, *args):
         self._arguments = args
+        # Arguments to invoke checkers with, shared by checkers
+        self._invocation = None
+        self._invocation_with_lines = None
+        self._rel_file_path = None
+        self.blob = None
+        """:type: submarine_githooks.repository.Blob | None"""
+        self.changed_lines = None
+        """:type: LineRanges | None"""
+        self.mode = None
+        """:type: str | None"""
+        self.change = None
+        """:type: submarine_githooks.repository.Change | None"""
+        self.hook_name = None
+        """:type: str | None"""
 
     @staticmethod
     def create_with_hook(hook_name, *args):
@@ -36,12 +125,57 @@ class Content(object):
             klass = PrePushContent
 
         # noinspection PyCallingNonCallable
-        return klass(*args) if klass else None
+        content = klass(*args) if klass else None
+        if content:
+            content.hook_name = hook_name
+        return content
 
     @property
     def arguments(self):
         return self._arguments
 
+    def accepts(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :return: whether the checker could take this kind of content
+        :rtype: bool
+        """
+        return True
+
+    def arguments_for(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :return: arguments to invoke the checker with, besides `git_repo` and `hook_name`
+        :rtype: tuple
+        """
+        if checker.changed_lines:
+            return self._arguments + (self.changed_lines,)
+        return self._arguments
+
+    def invocation_arguments(self, git_repo, hook_name, checker):
+        """
+        Like `arguments_for` with `git_repo` and `hook_name` ahead. The tuple is built once for all checkers taking the
+        same arguments, instead of once for every checker and content.
+
+        :type git_repo: submarine_githooks.repository.Repository
+        :type hook_name: str
+        :type checker: submarine_githooks.checker.Checker
+        :rtype: tuple
+        """
+        if checker.changed_lines:
+            arguments = self._invocation_with_lines
+            if arguments is None or arguments[-1] is not self.changed_lines:
+                arguments = None
+        else:
+            arguments = self._invocation
+        if arguments is None or arguments[0] is not git_repo or arguments[1] != hook_name:
+            arguments = (git_repo, hook_name) + self.arguments_for(checker)
+            if checker.changed_lines:
+                self._invocation_with_lines = arguments
+            else:
+                self._invocation = arguments
+        return arguments
+
     @property
     def file_path(self):
         """
@@ -49,6 +183,41 @@ class Content(object):
         """
         return None
 
+    @property
+    def commit(self):
+        """
+        :return: where the blob of the content is in git. Empty string means the index, and None means not in git.
+        :rtype: str | None
+        """
+        return None
+
+    @property
+    def data(self):
+        """
+        :return: content of the blob if it has been loaded. Large blobs are not loaded, use `open` instead.
+        :rtype: bytes | None
+        """
+        return self.blob.data if self.blob else None
+
+    @property
+    def blob_sha(self):
+        """
+        :return: sha of the blob, which is known from the change without reading the blob
+        :rtype: str | None
+        """
+        if self.blob:
+            return self.blob.sha
+        elif self.change and not self.change.deleted:
+            return self.change.sha
+        return None
+
+    @property
+    def size(self):
+        """
+        :rtype: int | None
+        """
+        return self.blob.size if self.blob else None
+
     # Messages
 
     def discovered_message(self):
@@ -83,6 +252,11 @@ class Content(object):
 
 class FilePathContent(Content):
 
+    __slots__ = ()
+
+    def __init__(self, file_path, *args):
+        super(FilePathContent, self).__init__(intern_path(file_path), *args)
+
     @property
     def file_path(self):
         """
@@ -90,9 +264,94 @@ class FilePathContent(Content):
         """
         return self._arguments[0]
 
+    @property
+    def commit(self):
+        """
+        :rtype: str | None
+        """
+        if self.hook_name == 'pre-commit':
+            return ''
+        elif self.hook_name == 'post-checkout':
+            return self._arguments[2]
+        elif self.hook_name == 'post-merge':
+            # A squash merge doesn't commit, but stages changes
+            return '' if self._arguments[2] else 'HEAD'
+        elif self.hook_name == 'pre-push':
+            return self._arguments[2]
+        return None
+
+    def accepts(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :rtype: bool
+        """
+        return self.hook_name != 'pre-push' or checker.pushed_files
+
+    def _commit_to_read(self, commit):
+        """
+        :param commit: the commit given by the checker. The commit of the content if None.
+        :type commit: str | None
+        :return: the commit to read the blob from. Empty string means the index, and None means the file on disk, for
+            contents which aren't in git, like the message file of `commit-msg`.
+        :rtype: str | None
+        """
+        return self.commit if commit is None else commit
+
+    def _disk_file_path(self, git_repo):
+        """
+        :type git_repo: submarine_githooks.repository.Repository
+        :rtype: str
+        """
+        return os.path.join(git_repo.source_root, self.file_path)
+
+    def open(self, git_repo, commit=None):
+        """
+        Open the blob as a read-only file-like object, which doesn't load large blobs into memory.
+
+        :type git_repo: submarine_githooks.repository.Repository
+        :param commit: the commit to read from. The commit of the content if None.
+        :type commit: str | None
+        :rtype: io.BytesIO | io.BufferedReader | submarine_githooks.repository.BlobStream
+        """
+        commit = self._commit_to_read(commit)
+        if commit is None:
+            return io.open(self._disk_file_path(git_repo), 'rb')
+        return git_repo.open_file_content(self.file_path, commit)
+
+    def map(self, git_repo, commit=None):
+        """
+        Map the file as a read-only memoryview, see `Repository.map_file_content`. After `post-checkout` and
+        `post-merge`, files without local changes are mapped from the working tree, not read from git.
+
+        :type git_repo: submarine_githooks.repository.Repository
+        :param commit: the commit to read from. The commit of the content if None.
+        :type commit: str | None
+        :rtype: contextlib.GeneratorContextManager
+        """
+        commit = self._commit_to_read(commit)
+        if commit is None:
+            return _map_disk_file(self._disk_file_path(git_repo))
+        return git_repo.map_file_content(self.file_path, commit)
+
+    def iter_chunks(self, git_repo, commit=None, chunk_size=64 * 1024):
+        """
+        :type git_repo: submarine_githooks.repository.Repository
+        :param commit: the commit to read from. The commit of the content if None.
+        :type commit: str | None
+        :type chunk_size: int
+        :rtype: collections.Iterator[bytes]
+        """
+        commit = self._commit_to_read(commit)
+        if commit is None:
+            return _iter_disk_file(self._disk_file_path(git_repo), chunk_size)
+        return git_repo.iter_file_content(self.file_path, commit, chunk_size)
+
     @property
     def rel_file_path(self):
-        return os.path.relpath(self.file_path)
+        # Computed once, since it's in every message of the content
+        if self._rel_file_path is None:
+            self._rel_file_path = os.path.relpath(self.file_path)
+        return self._rel_file_path
 
     def discovered_message(self):
         """
@@ -127,8 +386,53 @@ class FilePathContent(Content):
         return 'Invoked "{}" with "{}" successfully'.format(checker.name, self.rel_file_path)
 
 
+@contextmanager
+def _map_disk_file(path):
+    """
+    Files not in git are small ones written by git for the hook, like the commit message, so they are just read.
+
+    :type path: str
+    :rtype: memoryview
+    """
+    with io.open(path, 'rb') as f:
+        view = memoryview(f.read())
+    try:
+        yield view
+    finally:
+        if six.PY3:
+            view.release()
+
+
+def _iter_disk_file(path, chunk_size):
+    """
+    :type path: str
+    :type chunk_size: int
+    :rtype: collections.Iterator[bytes]
+    """
+    with io.open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
 class PrePushContent(Content):
 
+    __slots__ = ('push_range',)
+
+    def __init__(self, *args):
+        super(PrePushContent, self).__init__(*args)
+        self.push_range = None
+        """:type: submarine_githooks.repository.PushRange | None"""
+
+    def accepts(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :rtype: bool
+        """
+        return not checker.pushed_files
+
     def discovered_message(self):
         """
         :rtype: str
@@ -149,3 +453,66 @@ class PrePushContent(Content):
         :rtype: str
         """
         return 'Invoked "{}" with push information'.format(checker.name)
+
+
+class ContentCollection(object):
+    """
+    Contents given to a batch checker. It could be iterated many times, and blob metadata (sha, size and mode) of all
+    contents are read in one round trip when first asked.
+    """
+
+    def __init__(self, git_repo, contents):
+        """
+        :type git_repo: submarine_githooks.repository.Repository
+        :type contents: list[Content]
+        """
+        self.git_repo = git_repo
+        self._contents = list(contents)
+        self._metadata_loaded = False
+        self._contents_by_path = None
+        """:type: dict[str, Content]"""
+
+    def __iter__(self):
+        return iter(self._contents)
+
+    def __len__(self):
+        return len(self._contents)
+
+    def __getitem__(self, index):
+        return self._contents[index]
+
+    @property
+    def file_paths(self):
+        """
+        :rtype: list[str]
+        """
+        return [content.file_path for content in self._contents if content.file_path]
+
+    def get(self, file_path):
+        """
+        :type file_path: str
+        :rtype: Content | None
+        """
+        # Indexed when first asked, since a checker may look up every file of a large collection
+        if self._contents_by_path is None:
+            self._contents_by_path = {}
+            for content in self._contents:
+                if content.file_path:
+                    self._contents_by_path.setdefault(content.file_path, content)
+        return self._contents_by_path.get(file_path)
+
+    def with_metadata(self):
+        """
+        Iterate contents whose `blob_sha` and `size` are ready. Contents not in git are skipped.
+
+        :rtype: collections.Iterator[Content]
+        """
+        if not self._metadata_loaded:
+            pending = [content for content in self._contents
+                       if content.blob is None and content.file_path and content.commit is not None]
+            blobs = self.git_repo.blob_reader.info(self.git_repo.object_name(content.file_path, content.commit)
+                                                   for content in pending)
+            for content, blob in zip(pending, blobs):
+                content.blob = blob
+            self._metadata_loaded = True
+        return (content for content in self._contents if content.blob is not None)
@@ -16,9 +16,204 @@
 
 from __future__ import unicode_literals, division, absolute_import, print_function
 
+import codecs
 import json
+import re
 from submarine_githooks.checker import checker
 
+large_file_size = 1024 * 1024
+"""Files larger than this (in bytes) are validated incrementally, without loading the whole file into memory."""
+
+
+class JSONValidator(object):
+    """
+    Validate JSON syntax incrementally with bounded memory. Feed it with chunks of bytes and then close it.
+    Raises `ValueError` with the same kind of messages as `json.loads`.
+    """
+
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _string_body = re.compile(r'[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*')
+    _partial_escape = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?\Z')
+    _number = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+    _number_characters = re.compile(r'[-+.eE0-9]*\Z')
+    _literals = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+    _expecting = {
+        'comma_or_end': "Expecting ',' delimiter",
+        'colon': "Expecting ':' delimiter",
+        'key': 'Expecting property name enclosed in double quotes',
+        'key_or_end': 'Expecting property name enclosed in double quotes',
+    }
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buffer = ''
+        self._stack = []
+        """:type: list[str]"""
+        # value | value_or_end | key | key_or_end | colon | comma_or_end | end
+        self._state = 'value'
+        self._in_string = False
+        self._string_is_key = False
+        # Where the string being parsed starts, as (line, column, char), since it may start in an earlier chunk
+        self._string_location = None
+        self._position = 0
+        self._line = 0
+        self._column = 0
+
+    def feed(self, data):
+        """
+        :type data: bytes
+        """
+        self._buffer += self._decoder.decode(data)
+        self._parse(final=False)
+
+    def close(self):
+        self._buffer += self._decoder.decode(b'', True)
+        self._parse(final=True)
+        if self._in_string:
+            raise ValueError('Unterminated string starting at: line {} column {} (char {})'.format(
+                *self._string_location))
+        if self._state != 'end':
+            self._error(self._expecting.get(self._state, 'Expecting value'), len(self._buffer))
+
+    def _location(self, index):
+        """
+        :type index: int
+        :return: (line, column, char) of the index in the buffer, which are 1-based, 1-based and 0-based
+        :rtype: (int, int, int)
+        """
+        line, column = self._line, self._column
+        newlines = self._buffer.count('\n', 0, index)
+        if newlines:
+            line += newlines
+            column = index - self._buffer.rfind('\n', 0, index) - 1
+        else:
+            column += index
+        return line + 1, column + 1, self._position + index
+
+    def _error(self, message, index):
+        """
+        :type message: str
+        :type index: int
+        """
+        raise ValueError('{}: line {} column {} (char {})'.format(message, *self._location(index)))
+
+    def _start_string(self, index, is_key):
+        """
+        :param index: index of the opening quote in the buffer
+        :type index: int
+        :type is_key: bool
+        """
+        self._in_string = True
+        self._string_is_key = is_key
+        self._string_location = self._location(index)
+
+    def _consume(self, index):
+        """
+        Drop parsed characters from the buffer.
+
+        :type index: int
+        """
+        newlines = self._buffer.count('\n', 0, index)
+        if newlines:
+            self._line += newlines
+            self._column = index - self._buffer.rfind('\n', 0, index) - 1
+        else:
+            self._column += index
+        self._position += index
+        self._buffer = self._buffer[index:]
+
+    def _end_value(self):
+        self._state = 'comma_or_end' if self._stack else 'end'
+
+    def _parse(self, final):
+        buf = self._buffer
+        index = 0
+        while True:
+            if self._in_string:
+                index = self._string_body.match(buf, index).end()
+                if index == len(buf):
+                    break
+                if buf[index] == '"':
+                    index += 1
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._state = 'colon'
+                    else:
+                        self._end_value()
+                    continue
+                if not final and self._partial_escape.match(buf, index):
+                    break
+                if buf[index] == '\\':
+                    self._error('Invalid \\escape', index)
+                self._error('Invalid control character at', index)
+
+            index = self._whitespace.match(buf, index).end()
+            if index == len(buf):
+                break
+            char = buf[index]
+            state = self._state
+
+            if state == 'end':
+                self._error('Extra data', index)
+            elif state in ('comma_or_end', 'value_or_end', 'key_or_end') and char in ']}':
+                if not self._stack or self._stack[-1] != ('[' if char == ']' else '{') or \
+                        (state == 'value_or_end' and char == '}') or (state == 'key_or_end' and char == ']'):
+                    self._error(self._expecting.get(state, 'Expecting value'), index)
+                self._stack.pop()
+                index += 1
+                self._end_value()
+            elif state == 'comma_or_end':
+                if char != ',':
+                    self._error("Expecting ',' delimiter", index)
+                index += 1
+                self._state = 'value' if self._stack[-1] == '[' else 'key'
+            elif state == 'colon':
+                if char != ':':
+                    self._error("Expecting ':' delimiter", index)
+                index += 1
+                self._state = 'value'
+            elif state in ('key', 'key_or_end'):
+                if char != '"':
+                    self._error('Expecting property name enclosed in double quotes', index)
+                self._start_string(index, True)
+                index += 1
+            elif char == '"':
+                self._start_string(index, False)
+                index += 1
+            elif char in '[{':
+                index += 1
+                self._stack.append(char)
+                self._state = 'value_or_end' if char == '[' else 'key_or_end'
+            else:
+                rest = buf[index:index + 10]
+                literal = next((literal for literal in self._literals if rest.startswith(literal)), None)
+                if literal:
+                    index += len(literal)
+                    self._end_value()
+                    continue
+                if not final and any(literal.startswith(rest) for literal in self._literals):
+                    break
+                if not final and self._number_characters.match(buf, index):
+                    # A number may continue in the next chunk
+                    break
+                match = self._number.match(buf, index)
+                if not match:
+                    self._error('Expecting value', index)
+                index = match.end()
+                self._end_value()
+
+        self._consume(index)
+
+
+def validate_json(chunks):
+    """
+    :type chunks: collections.Iterable[bytes]
+    """
+    validator = JSONValidator()
+    for chunk in chunks:
+        validator.feed(chunk)
+    validator.close()
+
 
 # noinspection PyUnusedLocal
 @checker
@@ -27,10 +222,14 @@ from submarine_githooks.checker import checker
 def pre_commit(git_repo, hook_name, file_path):
     """
     :param git_repo: a GitRepo instance representing current git repo
-    :type git_repo: taskr.contrib.git.GitRepo
+    :type git_repo: submarine_githooks.repository.Repository
     :param hook_name: the hook being executing
     :type hook_name: str
     :param file_path: the path to of a file to be committed
     :type file_path: str
     """
-    json.loads(git_repo.file_content(file_path))
+    blob = git_repo.blob(file_path)
+    if blob and blob.size > large_file_size:
+        validate_json(git_repo.iter_file_content(file_path))
+    else:
+        json.loads(git_repo.file_content(file_path))
@@ -0,0 +1,54 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# The batched variant of `json_content`, which validates all staged JSON files in one invocation.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+
+import json
+from submarine_githooks.checker import checker, FileFailures
+from submarine_githooks.contrib.checkers.json_content import validate_json
+
+
+# noinspection PyUnusedLocal
+@checker
+@checker.batch
+@checker.active_hooks('pre-commit')
+@checker.file_extension('.json')
+def pre_commit(git_repo, hook_name, contents):
+    """
+    :param git_repo: a GitRepo instance representing current git repo
+    :type git_repo: submarine_githooks.repository.Repository
+    :param hook_name: the hook being executing
+    :type hook_name: str
+    :param contents: files to be committed
+    :type contents: submarine_githooks.content.ContentCollection
+    """
+    failures = {}
+    file_paths = contents.file_paths
+    # Blobs which haven't been read are read in one round trip. Large ones are not loaded but streamed.
+    for file_path, blob in zip(file_paths, git_repo.preload(file_paths)):
+        try:
+            if blob is None:
+                json.loads(git_repo.file_content(file_path))
+            elif blob.data is None:
+                validate_json(git_repo.iter_file_content(file_path))
+            else:
+                json.loads(blob.data)
+        except ValueError as e:
+            failures[file_path] = e
+    if failures:
+        raise FileFailures(failures)
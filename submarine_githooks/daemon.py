@@ -0,0 +1,321 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# A long-lived process per repo which keeps `submarine_githooks.hooks` and checkers imported.
+# Each hook runs in a process forked from the daemon, which works on stdin/stdout/stderr of the hook script passed
+# through the Unix domain socket. Like `submarine_githooks.entry`, only the standard library is imported at module level.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import array
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from submarine_githooks.constants import state_dir_name
+
+disable_env_option = 'SUBMARINE_GITHOOK_DAEMON'
+default_idle_timeout = 3600
+
+
+def is_supported():
+    """
+    Passing file descriptors needs `socket.sendmsg`, which Python 2 doesn't have.
+
+    :rtype: bool
+    """
+    return hasattr(socket, 'AF_UNIX') and hasattr(socket.socket, 'sendmsg')
+
+
+def socket_path(source_root):
+    """
+    :type source_root: str
+    :rtype: str
+    """
+    return os.path.join(source_root, '.git', state_dir_name, 'daemon.sock')
+
+
+def _read_line(connection):
+    """
+    :type connection: socket.socket
+    :rtype: bytes
+    """
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def _connect(source_root):
+    """
+    :type source_root: str
+    :rtype: socket.socket | None
+    """
+    path = socket_path(source_root)
+    if not is_supported() or not os.path.exists(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except (socket.error, OSError, IOError):
+        # Not running, but the socket is left
+        connection.close()
+        return None
+    return connection
+
+
+def send_command(source_root, command):
+    """
+    Send `ping` or `stop` to the daemon of a repo.
+
+    :type source_root: str
+    :type command: str
+    :return: the response, or None if the daemon is not running
+    :rtype: str | None
+    """
+    connection = _connect(source_root)
+    if connection is None:
+        return None
+    try:
+        connection.sendall(json.dumps({'command': command}).encode('utf-8') + b'\n')
+        return _read_line(connection).decode('utf-8').strip() or None
+    except (socket.error, OSError, IOError):
+        return None
+    finally:
+        connection.close()
+
+
+def run_with_daemon(source_root, argv):
+    """
+    Run the hook in the daemon of the repo if it's running.
+
+    :type source_root: str
+    :type argv: list[str]
+    :return: the exit code of the hook, or None if the daemon is not reachable, so the hook should run in-process
+    :rtype: int | None
+    """
+    if os.environ.get(disable_env_option, '1') in ('', '0'):
+        return None
+    connection = _connect(source_root)
+    if connection is None:
+        return None
+    try:
+        try:
+            request = json.dumps({'command': 'run', 'argv': argv, 'cwd': os.getcwd(),
+                                  'env': dict(os.environ)}).encode('utf-8') + b'\n'
+            fds = array.array('i', [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+            sent = connection.sendmsg([request], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds.tobytes())])
+            connection.sendall(request[sent:])
+        except (socket.error, OSError, IOError, ValueError):
+            return None
+        # The hook has been handed over. Don't run it again even if the daemon fails.
+        try:
+            response = _read_line(connection)
+        except (socket.error, OSError, IOError):
+            response = b''
+    finally:
+        connection.close()
+    if not response.strip().lstrip(b'-').isdigit():
+        sys.stderr.write('submarine-githooks daemon exits unexpectedly.\n')
+        return 1
+    return int(response)
+
+
+class HookDaemon(object):
+    """
+    Serve hooks of a repo. Checker modules are imported once, and imported again when their files are modified.
+    """
+
+    def __init__(self, source_root, idle_timeout=default_idle_timeout):
+        """
+        :type source_root: str
+        :param idle_timeout: exit if no hook runs in this many seconds. 0 means never.
+        :type idle_timeout: int
+        """
+        self.source_root = os.path.abspath(source_root)
+        self.socket_path = socket_path(self.source_root)
+        self.idle_timeout = idle_timeout
+        self._module_files = {}
+        """:type: dict[str, (float, int)]"""
+        self._children = set()
+        """:type: set[int]"""
+
+    def load(self):
+        """
+        Import hooks and checkers, or import checkers again if their modules are modified, removed or added.
+        """
+        # noinspection PyUnresolvedReferences
+        import submarine_githooks.hooks
+        from submarine_githooks.registry import CheckerRegistry
+
+        checkers_dir = os.path.join(self.source_root, '.githooks')
+        if checkers_dir not in sys.path:
+            sys.path.append(checkers_dir)
+        registry = CheckerRegistry.for_source_root(self.source_root)
+        module_files = registry.module_files
+        for module_name in set(self._module_files) | set(module_files):
+            if self._module_files.get(module_name) != module_files.get(module_name):
+                sys.modules.pop(module_name, None)
+        # noinspection PyBroadException
+        try:
+            registry.checkers()
+        except Exception:
+            # Broken checkers are reported by the hook, which imports them again.
+            traceback.print_exc()
+        self._module_files = module_files
+
+    def serve(self):
+        self.load()
+        socket_dir = os.path.dirname(self.socket_path)
+        if not os.path.exists(socket_dir):
+            os.makedirs(socket_dir)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        try:
+            last_active_at = time.time()
+            while True:
+                self._reap_children()
+                readable, _, _ = select.select([server], [], [], 1.0)
+                if not readable:
+                    if (self.idle_timeout and not self._children and
+                            time.time() - last_active_at > self.idle_timeout):
+                        break
+                    continue
+                connection, _ = server.accept()
+                last_active_at = time.time()
+                try:
+                    if not self._handle(server, connection):
+                        break
+                finally:
+                    connection.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            while self._children:
+                self._reap_children(block=True)
+
+    def _reap_children(self, block=False):
+        """
+        :type block: bool
+        """
+        for pid in list(self._children):
+            try:
+                waited_pid, _ = os.waitpid(pid, 0 if block else os.WNOHANG)
+            except OSError:
+                waited_pid = pid
+            if waited_pid == pid:
+                self._children.discard(pid)
+
+    def _handle(self, server, connection):
+        """
+        :type server: socket.socket
+        :type connection: socket.socket
+        :return: False if the daemon should stop
+        :rtype: bool
+        """
+        fds = array.array('i')
+        data, ancillary_data, _, _ = connection.recvmsg(65536, socket.CMSG_SPACE(3 * fds.itemsize))
+        for level, message_type, message_data in ancillary_data:
+            if level == socket.SOL_SOCKET and message_type == socket.SCM_RIGHTS:
+                fds.frombytes(message_data[:len(message_data) - len(message_data) % fds.itemsize])
+        while not data.endswith(b'\n'):
+            chunk = connection.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+
+        try:
+            request = json.loads(data.decode('utf-8'))
+            command = request['command']
+            if command == 'ping':
+                connection.sendall('pong {}\n'.format(os.getpid()).encode('utf-8'))
+                return True
+            elif command == 'stop':
+                connection.sendall(b'stopped\n')
+                return False
+            elif command != 'run' or len(fds) != 3:
+                return True
+
+            self.load()
+            pid = os.fork()
+            if pid == 0:
+                exit_code = 1
+                try:
+                    server.close()
+                    exit_code = self._run_hook(request, list(fds))
+                finally:
+                    # noinspection PyBroadException
+                    try:
+                        connection.sendall('{}\n'.format(exit_code).encode('utf-8'))
+                    except Exception:
+                        pass
+                    os._exit(exit_code)
+            self._children.add(pid)
+            return True
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    @staticmethod
+    def _run_hook(request, fds):
+        """
+        Run in the forked process.
+
+        :type request: dict
+        :param fds: stdin, stdout and stderr of the client
+        :type fds: list[int]
+        :rtype: int
+        """
+        for target_fd, fd in enumerate(fds):
+            os.dup2(fd, target_fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        sys.argv = request['argv']
+
+        import submarine_githooks.hooks
+        exit_code = 0
+        try:
+            submarine_githooks.hooks.main()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        return exit_code
+
+
+if __name__ == '__main__':
+    HookDaemon(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else default_idle_timeout).serve()
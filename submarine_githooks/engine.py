@@ -0,0 +1,609 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import namedtuple
+from importlib import import_module
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool, ThreadPool
+import errno
+import os
+import pickle
+import select
+import signal
+import sys
+import time
+import six
+from six.moves import queue
+from submarine_githooks.checker import Checker, FileFailures
+from submarine_githooks.constants import executor_modes
+from submarine_githooks.content import ContentCollection
+from submarine_githooks.matcher import FileMatcher
+from submarine_githooks.repository import Repository
+from submarine_githooks.scheduler import schedule
+from submarine_githooks.timing import Timer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class ResourceLimits(namedtuple('ResourceLimits', ('timeout', 'memory_limit'))):
+    """
+    Limits of one invocation of a checker. A checker with limits runs in a forked process, which is killed once it
+    runs longer than `timeout` seconds, and cannot allocate more than `memory_limit` megabytes.
+    """
+    __slots__ = ()
+
+    def __new__(cls, timeout=None, memory_limit=None):
+        return super(ResourceLimits, cls).__new__(cls, timeout or None, memory_limit or None)
+
+    @property
+    def enforced(self):
+        return self.timeout is not None or self.memory_limit is not None
+
+
+class LimitExceeded(Exception):
+    """
+    The checker has been killed since it exceeds its resource limits.
+    """
+
+
+class CheckResult(object):
+
+    # One for every pair of checker and content
+    __slots__ = ('checker', 'content', 'active', 'cached', 'skipped', 'batched', 'exception', 'wall_time', 'cpu_time')
+
+    def __init__(self, checker, content=None, active=True):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :type content: submarine_githooks.content.Content | None
+        :type active: bool
+        """
+        self.checker = checker
+        self.content = content
+        """:type: submarine_githooks.content.Content | None"""
+        self.active = active
+        self.cached = False
+        # Not invoked since another checker has failed in fail-fast mode
+        self.skipped = False
+        # Checked along with other contents by a batch checker, whose time is kept by the result without content.
+        self.batched = False
+        self.exception = None
+        """:type: Exception | None"""
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    @property
+    def failed(self):
+        return self.exception is not None
+
+
+# Invocations ==========================================================================================================
+
+def _invoke(checker, args, limits=None):
+    """
+    :type checker: submarine_githooks.checker.Checker
+    :type args: tuple
+    :type limits: ResourceLimits | None
+    :return: (exception, wall time, cpu time)
+    :rtype: (Exception | None, float, float)
+    """
+    if limits is not None and limits.enforced and hasattr(os, 'fork'):
+        return _invoke_supervised(checker, args, limits)
+    exception = None
+    with Timer() as timer:
+        # noinspection PyBroadException
+        try:
+            checker(*args)
+        except Exception as e:
+            exception = e
+    return exception, timer.wall_time, timer.cpu_time
+
+
+def _invoke_supervised(checker, args, limits):
+    """
+    Invoke the checker in a forked process, which is killed with processes it starts if it exceeds the limits.
+
+    :type checker: submarine_githooks.checker.Checker
+    :type args: tuple
+    :type limits: ResourceLimits
+    :rtype: (Exception | None, float, float)
+    """
+    # Buffered output would be written by both processes otherwise
+    sys.stdout.flush()
+    sys.stderr.flush()
+    read_fd, write_fd = os.pipe()
+    started_at = time.time()
+    pid = os.fork()
+    if pid == 0:
+        exit_code = 1
+        try:
+            os.close(read_fd)
+            os.setpgid(0, 0)
+            for arg in args:
+                if isinstance(arg, Repository):
+                    arg.reset_after_fork()
+            if limits.memory_limit is not None and resource is not None:
+                memory_limit = limits.memory_limit * 1024 * 1024
+                resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+            exception, wall_time, cpu_time = _invoke(checker, args)
+            if isinstance(exception, MemoryError) and limits.memory_limit is not None:
+                exception = LimitExceeded('Exceeded the memory limit of {} MB'.format(limits.memory_limit))
+            sys.stdout.flush()
+            sys.stderr.flush()
+            data = pickle.dumps((_portable_exception(exception), wall_time, cpu_time), 2)
+            while data:
+                data = data[os.write(write_fd, data):]
+            exit_code = 0
+        finally:
+            os._exit(exit_code)
+
+    os.close(write_fd)
+    try:
+        # Whichever of both sets the process group first
+        os.setpgid(pid, pid)
+    except OSError:
+        pass
+    chunks = []
+    timed_out = False
+    try:
+        while True:
+            remaining = None
+            if limits.timeout is not None:
+                remaining = started_at + limits.timeout - time.time()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+            try:
+                readable, _, _ = select.select([read_fd], [], [], remaining)
+            except (select.error, OSError) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                timed_out = True
+                break
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+        if timed_out or not chunks:
+            _kill_process_group(pid)
+        _, status = os.waitpid(pid, 0)
+
+    wall_time = time.time() - started_at
+    if timed_out:
+        return LimitExceeded('Timed out after {:g}s'.format(limits.timeout)), wall_time, 0.0
+    elif not chunks:
+        if os.WIFSIGNALED(status):
+            reason = 'killed by signal {}'.format(os.WTERMSIG(status))
+        else:
+            reason = 'exited with code {}'.format(os.WEXITSTATUS(status))
+        if limits.memory_limit is not None:
+            reason += ', which may exceed the memory limit of {} MB'.format(limits.memory_limit)
+        return LimitExceeded('The checker process is {}'.format(reason)), wall_time, 0.0
+    return pickle.loads(b''.join(chunks))
+
+
+def _kill_process_group(pid):
+    """
+    :type pid: int
+    """
+    for kill in (os.killpg, os.kill):
+        try:
+            kill(pid, signal.SIGKILL)
+            return
+        except OSError:
+            pass
+
+
+def _portable_exception(exception):
+    """
+    Exceptions raised in a worker process are sent back through pickle, which not all of them survive.
+    :type exception: Exception | None
+    :rtype: Exception | None
+    """
+    if exception is None:
+        return None
+    elif isinstance(exception, FileFailures):
+        return FileFailures(dict((file_path, _portable_exception(failure))
+                                 for file_path, failure in exception.failures.items()))
+    # noinspection PyBroadException
+    try:
+        return pickle.loads(pickle.dumps(exception))
+    except Exception:
+        return Exception(str(exception))
+
+
+def _init_process_worker(python_path):
+    """
+    :type python_path: list[str]
+    """
+    # Workers may be spawned instead of forked, so `.githooks` should be put back into the python path.
+    for path in python_path:
+        if path not in sys.path:
+            sys.path.append(path)
+
+
+def _invoke_by_name(payload):
+    """
+    :param payload: (module name, attribute name, pickled arguments, limits)
+    :type payload: (str, str, bytes, ResourceLimits | None)
+    :rtype: (Exception | None, float, float)
+    """
+    module_name, attr_name, pickled_args, limits = payload
+    checker = getattr(import_module(module_name), attr_name, None)
+    if not isinstance(checker, Checker):
+        return ValueError('Cannot find checker {}.{} in worker process.'.format(module_name, attr_name)), 0.0, 0.0
+    try:
+        args = pickle.loads(pickled_args)
+    except Exception as e:
+        return _portable_exception(e), 0.0, 0.0
+    exception, wall_time, cpu_time = _invoke(checker, args, limits)
+    return _portable_exception(exception), wall_time, cpu_time
+
+
+# Executors ============================================================================================================
+
+class SerialExecutor(object):
+
+    jobs = 1
+
+    def map(self, calls, fail_fast=False, limits=None):
+        """
+        :type calls: list[(submarine_githooks.checker.Checker, tuple)]
+        :param fail_fast: invoke no more checkers once one fails
+        :type fail_fast: bool
+        :param limits: resource limits of checkers. Checkers not in it run without limits.
+        :type limits: dict[submarine_githooks.checker.Checker, ResourceLimits] | None
+        :return: outcome of each call, in the same order. None for calls not invoked because of `fail_fast`.
+        :rtype: list[(Exception | None, float, float) | None]
+        """
+        limits = limits or {}
+        outcomes = [None] * len(calls)
+        for index, (checker, args) in enumerate(calls):
+            outcomes[index] = _invoke(checker, args, limits.get(checker))
+            if fail_fast and outcomes[index][0] is not None:
+                break
+        return outcomes
+
+    def close(self):
+        pass
+
+
+class ThreadExecutor(SerialExecutor):
+
+    def __init__(self, jobs):
+        """
+        :type jobs: int
+        """
+        self.jobs = jobs
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.jobs)
+        return self._pool
+
+    @staticmethod
+    def _payload(call, limits):
+        """
+        :type call: (submarine_githooks.checker.Checker, tuple)
+        :type limits: ResourceLimits | None
+        """
+        checker, args = call
+        return checker, args, limits
+
+    @staticmethod
+    def _invoke_payload(payload):
+        """
+        :rtype: (Exception | None, float, float)
+        """
+        return _invoke(*payload)
+
+    def map(self, calls, fail_fast=False, limits=None):
+        """
+        :type calls: list[(submarine_githooks.checker.Checker, tuple)]
+        :type fail_fast: bool
+        :type limits: dict[submarine_githooks.checker.Checker, ResourceLimits] | None
+        :rtype: list[(Exception | None, float, float) | None]
+        """
+        if len(calls) < 2:
+            return SerialExecutor.map(self, calls, fail_fast, limits)
+        limits = limits or {}
+        outcomes = [None] * len(calls)
+        indexes = []
+        payloads = []
+        for index, call in enumerate(calls):
+            try:
+                payloads.append(self._payload(call, limits.get(call[0])))
+            except Exception as e:
+                # Like arguments which cannot be pickled. Only the call fails.
+                outcomes[index] = (e, 0.0, 0.0)
+                if fail_fast:
+                    return outcomes
+                continue
+            indexes.append(index)
+        if not fail_fast:
+            payload_outcomes = self.pool.map(self._invoke_payload, payloads, chunksize=1)
+        else:
+            payload_outcomes = self._map_until_failure(payloads)
+        for index, outcome in zip(indexes, payload_outcomes):
+            outcomes[index] = outcome
+        return outcomes
+
+    def _map_until_failure(self, payloads):
+        """
+        Keep at most `jobs` invocations running, and submit no more once one fails.
+
+        :type payloads: list
+        :rtype: list[(Exception | None, float, float) | None]
+        """
+        outcomes = [None] * len(payloads)
+        finished = queue.Queue()
+        async_results = {}
+        """:type: dict[int, multiprocessing.pool.ApplyResult]"""
+        submitted = 0
+        failed = False
+        while async_results or (not failed and submitted < len(payloads)):
+            while not failed and len(async_results) < self.jobs and submitted < len(payloads):
+                kwargs = {}
+                if six.PY3:
+                    # Like a worker failing to send the outcome back
+                    kwargs['error_callback'] = lambda e, index=submitted: finished.put((index, (e, 0.0, 0.0)))
+                async_results[submitted] = self.pool.apply_async(
+                    self._invoke_payload, (payloads[submitted],),
+                    callback=lambda outcome, index=submitted: finished.put((index, outcome)), **kwargs)
+                submitted += 1
+            if six.PY3:
+                index, outcome = finished.get()
+            else:
+                index, outcome = self._next_outcome(finished, async_results)
+            del async_results[index]
+            outcomes[index] = outcome
+            failed = failed or outcome[0] is not None
+        return outcomes
+
+    @staticmethod
+    def _next_outcome(finished, async_results, interval=0.1):
+        """
+        Python 2 has no error callback, so invocations which fail outside of `_invoke_payload` are found by polling.
+
+        :type finished: queue.Queue
+        :type async_results: dict[int, multiprocessing.pool.ApplyResult]
+        :type interval: float
+        :rtype: (int, (Exception | None, float, float))
+        """
+        while True:
+            try:
+                return finished.get(timeout=interval)
+            except queue.Empty:
+                pass
+            for index, async_result in async_results.items():
+                # The callback is only called on success, and before the result is ready.
+                if async_result.ready() and not async_result.successful():
+                    try:
+                        async_result.get()
+                    except Exception as e:
+                        return index, (e, 0.0, 0.0)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class ProcessExecutor(ThreadExecutor):
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = Pool(self.jobs, initializer=_init_process_worker, initargs=(list(sys.path),))
+        return self._pool
+
+    @staticmethod
+    def _payload(call, limits):
+        # Arguments are pickled here, so arguments which cannot be pickled fail their own call but not the pool.
+        checker, args = call
+        return checker.module_name, checker.attr_name, pickle.dumps(args, 2), limits
+
+    _invoke_payload = staticmethod(_invoke_by_name)
+
+
+def create_executor(mode='thread', jobs=1):
+    """
+    :param mode: one of `executor_modes`
+    :type mode: str
+    :param jobs: number of workers. 0 means the number of CPUs.
+    :type jobs: int
+    :rtype: SerialExecutor
+    """
+    if mode not in executor_modes:
+        raise ValueError('Invalid executor mode. got "{}" Choices={{{}}}'.format(mode, ','.join(executor_modes)))
+    if jobs <= 0:
+        jobs = cpu_count()
+    if jobs == 1:
+        return SerialExecutor()
+    return (ThreadExecutor if mode == 'thread' else ProcessExecutor)(jobs)
+
+
+# Engine ===============================================================================================================
+
+def run_checkers(executor, git_repo, hook_name, checkers, contents, cache=None, matcher=None,
+                 fail_fast=False, schedule_mode='cost', costs=None, limits=None, async_jobs=16):
+    """
+    Run every checker against every content with the executor.
+    Results are returned in the same order as checkers and contents are given, no matter how they are executed.
+    A batch checker has a result without content for its invocation, followed by results of contents.
+
+    :type executor: SerialExecutor
+    :type git_repo: taskr.contrib.git.GitRepo
+    :type hook_name: str
+    :type checkers: list[submarine_githooks.checker.Checker]
+    :type contents: list[submarine_githooks.content.Content]
+    :param cache: pairs which have passed in the cache are skipped, and passed pairs are added to it.
+    :type cache: submarine_githooks.cache.ResultCache | None
+    :param matcher: index of file filters of checkers. Built from checkers if not given.
+    :type matcher: submarine_githooks.matcher.FileMatcher | None
+    :param fail_fast: invoke no more checkers once one fails. Results not invoked are marked as skipped.
+    :type fail_fast: bool
+    :param schedule_mode: the order to invoke checkers with `fail_fast`, see `submarine_githooks.scheduler.schedule`.
+        Without `fail_fast` every check is invoked anyway, so checkers keep the given order.
+    :type schedule_mode: str
+    :param costs: measured costs of checkers for scheduling
+    :type costs: submarine_githooks.scheduler.CheckerCosts | None
+    :param limits: resource limits of checkers. Checkers exceeding them fail with `LimitExceeded`.
+    :type limits: dict[submarine_githooks.checker.Checker, ResourceLimits] | None
+    :param async_jobs: max number of async checkers running at a time
+    :type async_jobs: int
+    :rtype: list[CheckResult]
+    """
+    results = []
+    calls = []
+    invoked_results = []
+    cache_keys = {}
+    batched_results = {}
+    """:type: dict[CheckResult, list[CheckResult]]"""
+    matcher = matcher or FileMatcher(checkers)
+    active_checkers = [matcher.match(content.file_path) if content.file_path else None for content in contents]
+    for checker in checkers:
+        if checker.once:
+            result = CheckResult(checker)
+            calls.append((checker, (git_repo, hook_name, [content.arguments_for(checker) for content in contents
+                                                           if content.accepts(checker)])))
+            invoked_results.append(result)
+            results.append(result)
+        elif checker.batch:
+            checker_results = []
+            for content, content_active_checkers in zip(contents, active_checkers):
+                active = content.accepts(checker) and (content_active_checkers is None or
+                                                       checker in content_active_checkers)
+                checker_results.append(CheckResult(checker, content, active=active))
+            active_results = [result for result in checker_results if result.active]
+            if cache is not None:
+                # Blob shas are needed for cache keys
+                list(ContentCollection(git_repo, [result.content for result in active_results]).with_metadata())
+            pending_results = []
+            for result in active_results:
+                result.batched = True
+                if cache is not None:
+                    cache_key = cache_keys[result] = cache.key(checker, hook_name, result.content)
+                    if cache_key in cache:
+                        result.cached = True
+                        continue
+                pending_results.append(result)
+            if pending_results:
+                batch_result = CheckResult(checker)
+                calls.append((checker, (git_repo, hook_name,
+                                        ContentCollection(git_repo, [result.content for result in pending_results]))))
+                invoked_results.append(batch_result)
+                results.append(batch_result)
+                batched_results[batch_result] = pending_results
+            results.extend(checker_results)
+        else:
+            for content, content_active_checkers in zip(contents, active_checkers):
+                if not content.accepts(checker) or (content_active_checkers is not None and
+                                                    checker not in content_active_checkers):
+                    results.append(CheckResult(checker, content, active=False))
+                    continue
+                result = CheckResult(checker, content)
+                results.append(result)
+                if cache is not None:
+                    cache_key = cache_keys[result] = cache.key(checker, hook_name, content)
+                    if cache_key in cache:
+                        result.cached = True
+                        continue
+                calls.append((checker, content.invocation_arguments(git_repo, hook_name, checker)))
+                invoked_results.append(result)
+
+    # Reordering only pays off when the run stops at the first failure. Otherwise checkers with side effects, like
+    # ones of post-checkout, should run in the same order everywhere, not one depending on timings of the machine.
+    order = schedule([checker for checker, _ in calls], schedule_mode if fail_fast else 'declared', costs)
+    outcomes = _map_calls(executor, [calls[index] for index in order], fail_fast, limits, async_jobs)
+    for index, outcome in zip(order, outcomes):
+        result = invoked_results[index]
+        if outcome is None:
+            result.skipped = True
+            for batched_result in batched_results.get(result, ()):
+                batched_result.skipped = True
+            continue
+        exception, wall_time, cpu_time = outcome
+        result.exception = exception
+        result.wall_time = wall_time
+        result.cpu_time = cpu_time
+        if result in batched_results:
+            _attribute_file_failures(result, batched_results[result], cache, cache_keys)
+        elif cache is not None and exception is None and result in cache_keys:
+            cache.add(cache_keys[result])
+    return results
+
+
+def _map_calls(executor, calls, fail_fast, limits, async_jobs):
+    """
+    Invoke async checkers on an event loop, and then others with the executor.
+
+    :type executor: SerialExecutor
+    :type calls: list[(submarine_githooks.checker.Checker, tuple)]
+    :type fail_fast: bool
+    :type limits: dict[submarine_githooks.checker.Checker, ResourceLimits] | None
+    :type async_jobs: int
+    :rtype: list[(Exception | None, float, float) | None]
+    """
+    async_indexes = [index for index, (checker, _) in enumerate(calls) if checker.is_async]
+    if not async_indexes:
+        return executor.map(calls, fail_fast=fail_fast, limits=limits)
+
+    from submarine_githooks.aio import map_async
+    outcomes = [None] * len(calls)
+    async_outcomes = map_async([calls[index] for index in async_indexes], async_jobs, fail_fast, limits)
+    for index, outcome in zip(async_indexes, async_outcomes):
+        outcomes[index] = outcome
+    if fail_fast and any(outcome is not None and outcome[0] is not None for outcome in async_outcomes):
+        return outcomes
+    sync_indexes = [index for index, (checker, _) in enumerate(calls) if not checker.is_async]
+    for index, outcome in zip(sync_indexes, executor.map([calls[index] for index in sync_indexes],
+                                                         fail_fast=fail_fast, limits=limits)):
+        outcomes[index] = outcome
+    return outcomes
+
+
+def _attribute_file_failures(batch_result, file_results, cache, cache_keys):
+    """
+    Move failures of files raised by a batch checker to results of these files.
+
+    :type batch_result: CheckResult
+    :type file_results: list[CheckResult]
+    :type cache: submarine_githooks.cache.ResultCache | None
+    :type cache_keys: dict[CheckResult, str | None]
+    """
+    if batch_result.exception is not None and not isinstance(batch_result.exception, FileFailures):
+        # The checker itself fails. Results of files are unknown.
+        return
+    failures = dict(batch_result.exception.failures) if batch_result.exception is not None else {}
+    batch_result.exception = None
+    for result in file_results:
+        result.exception = failures.pop(result.content.file_path, None)
+        if cache is not None and result.exception is None and result in cache_keys:
+            cache.add(cache_keys[result])
+    if failures:
+        # Files which are not given to the checker
+        batch_result.exception = FileFailures(failures)
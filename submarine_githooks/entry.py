@@ -0,0 +1,189 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# The entry of `submarine-githooks-entry`, which runs on every git operation once hooks are installed.
+# Only the standard library could be imported at module level here. `taskr`, `yaml` and `six` are loaded by
+# `submarine_githooks.hooks`, which is imported only when there is something to check.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import os
+import sys
+import time
+
+try:
+    import builtins
+except ImportError:
+    # noinspection PyUnresolvedReferences
+    import __builtin__ as builtins
+
+profile_startup_option = '--profile-startup'
+
+
+def locate_hook(argv):
+    """
+    Find the repo and the hook to run from command line arguments.
+
+    :type argv: list[str]
+    :return: (source root, hook name). Source root is None if no `.git` could be found.
+    :rtype: (str | None, str)
+    """
+    callee = os.path.relpath(argv[0])
+    if callee.startswith('.git/hooks'):
+        # from `.git/hooks/pre-commit`
+        source_root = os.path.abspath(os.path.join(os.path.dirname(argv[0]), '..', '..'))
+        hook_name = os.path.split(argv[0])[-1]
+    else:
+        # Call directly
+        source_root = os.getcwd()
+        while not os.path.exists(os.path.join(source_root, '.git')):
+            if source_root == '/':
+                source_root = None
+                break
+
+            source_root = os.path.abspath(os.path.join(source_root, '..'))
+
+        hook_name = argv[1] if len(argv) > 1 else 'pre-commit'
+    return source_root, hook_name
+
+
+def is_installed_hook(source_root, argv):
+    """
+    :type source_root: str
+    :type argv: list[str]
+    :return: whether it runs as a hook linked under `.git/hooks`, rather than called directly
+    :rtype: bool
+    """
+    return os.path.dirname(os.path.abspath(argv[0])) == os.path.join(os.path.abspath(source_root), '.git', 'hooks')
+
+
+def may_have_backups(git_hooks_path, hook_name):
+    """
+    A quick look for backups of the hook, so the installer isn't imported for hooks which have none.
+
+    :type git_hooks_path: str
+    :type hook_name: str
+    :rtype: bool
+    """
+    try:
+        file_names = os.listdir(git_hooks_path)
+    except OSError:
+        return False
+    prefix = '{}-'.format(hook_name)
+    return any(file_name.startswith(prefix) for file_name in file_names)
+
+
+class ImportProfiler(object):
+    """
+    Measure how long importing each module takes, like `python -X importtime`.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self.started_at = time.time()
+        self.records = []
+        """:type: list[(str, float, float)]"""
+        self._stack = []
+        self._original_import = None
+
+    def install(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = name
+        if level and globals and globals.get('__package__'):
+            package_components = globals['__package__'].split('.')
+            package_components = package_components[:len(package_components) - level + 1]
+            module_name = '.'.join(package_components + [name] if name else package_components)
+        if module_name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._stack.append(0.0)
+        started_at = time.time()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.time() - started_at
+            nested = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += cumulative
+            self.records.append((module_name, cumulative - nested, cumulative))
+
+    def report(self, limit=30):
+        """
+        :type limit: int
+        """
+        self.stream.write('submarine-githooks startup: {:.1f} ms, {} modules imported\n'.format(
+            (time.time() - self.started_at) * 1000, len(self.records)))
+        self.stream.write('{:>10} {:>10}  {}\n'.format('self(ms)', 'cumul(ms)', 'module'))
+        for module_name, self_time, cumulative in sorted(self.records, key=lambda r: r[2], reverse=True)[:limit]:
+            self.stream.write('{:10.2f} {:10.2f}  {}\n'.format(self_time * 1000, cumulative * 1000, module_name))
+        self.stream.flush()
+
+
+def main():
+    profiler = None
+    if profile_startup_option in sys.argv:
+        sys.argv.remove(profile_startup_option)
+        profiler = ImportProfiler()
+        profiler.install()
+
+    # Imported here to be measured by the profiler
+    from submarine_githooks.constants import hook_names
+    from submarine_githooks.registry import CheckerRegistry
+
+    source_root, hook_name = locate_hook(sys.argv)
+    git_hooks_path = os.path.join(source_root, '.git', 'hooks') if source_root else None
+    if (source_root and hook_name in hook_names and may_have_backups(git_hooks_path, hook_name) and
+            is_installed_hook(source_root, sys.argv)):
+        # The hook which was there before being linked runs first
+        from submarine_githooks.installer import run_chained_hook
+        exit_code = run_chained_hook(git_hooks_path, hook_name, sys.argv[1:], os.path.abspath(sys.argv[0]))
+        if exit_code:
+            sys.exit(exit_code)
+
+    debug = os.environ.get('SUBMARINE_GITHOOK_DEBUG', '0') not in ('', '0')
+    if (source_root and hook_name in hook_names and not debug and
+            not CheckerRegistry.for_source_root(source_root).may_have_checkers(hook_name)):
+        # Nothing to check
+        if profiler:
+            profiler.uninstall()
+            profiler.report()
+        sys.exit(0)
+
+    if source_root and hook_name in hook_names:
+        from submarine_githooks.daemon import run_with_daemon
+        exit_code = run_with_daemon(source_root, sys.argv)
+        if exit_code is not None:
+            if profiler:
+                profiler.uninstall()
+                profiler.report()
+            sys.exit(exit_code)
+
+    import submarine_githooks.hooks
+    if profiler:
+        profiler.uninstall()
+        profiler.report()
+    submarine_githooks.hooks.main()
+
+
+if __name__ == '__main__':
+    main()
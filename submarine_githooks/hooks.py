@@ -14,199 +14,327 @@
 # limitations under the License.
 #
 from __future__ import unicode_literals, division, absolute_import, print_function
-from importlib import import_module
+from collections import OrderedDict
+from itertools import islice
 import os
 import sys
-import six
-from taskr import console
-from taskr.contrib.git import GitRepo
-import yaml
+from taskr import Console, console
+from submarine_githooks.cache import ResultCache, cached_hook_names
 from submarine_githooks.checker import Checker
-from submarine_githooks.constants import hook_names
-from submarine_githooks.content import Content
+from submarine_githooks.config import ConfigError, HookConfig
+from submarine_githooks.constants import hook_names, state_dir_name
+from submarine_githooks.content import Content, FilePathContent, LineRanges
+from submarine_githooks.engine import ResourceLimits, create_executor, run_checkers
+from submarine_githooks.entry import is_installed_hook, locate_hook
+from submarine_githooks.installer import sync_hooks
+from submarine_githooks.matcher import FileMatcher
+from submarine_githooks.registry import CheckerRegistry
+from submarine_githooks.report import HookReport, buffered_console
+from submarine_githooks.repository import Repository
+from submarine_githooks.scheduler import CheckerCosts
+from submarine_githooks.timing import Timings
 
 
-def main():
-    # Get options and constants ========================================================================================
+# Staged blobs are read batch by batch while `git diff` is still listing files.
+preload_batch_size = 512
 
-    # Find source root
-    callee = os.path.relpath(sys.argv[0])
-    if callee.startswith('.git/hooks'):
-        # from `.git/hooks/pre-commit`
-        source_root = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', '..'))
-        hook_name = os.path.split(sys.argv[0])[-1]
+
+def iter_contents(git_repo, hook_name, argv, stdin, pushed_files=False):
+    """
+    Find contents to be checked. Contents of pre-commit are yielded as soon as `git diff` reports them.
+
+    :type git_repo: submarine_githooks.repository.Repository
+    :type hook_name: str
+    :param argv: command line arguments of the hook
+    :type argv: list[str]
+    :param stdin: standard input of the hook
+    :type stdin: io.TextIOBase
+    :param pushed_files: for pre-push, also yield files changed by pushed commits
+    :type pushed_files: bool
+    :rtype: collections.Iterator[Content]
+    """
+    for content in _iter_contents(git_repo, hook_name, argv, stdin, pushed_files):
+        if content:
+            yield content
+
+
+def find_contents(git_repo, hook_name, argv, stdin, pushed_files=False):
+    """
+    :type git_repo: submarine_githooks.repository.Repository
+    :type hook_name: str
+    :type argv: list[str]
+    :type stdin: io.TextIOBase
+    :type pushed_files: bool
+    :rtype: list[Content]
+    """
+    return list(iter_contents(git_repo, hook_name, argv, stdin, pushed_files))
+
+
+def preload_contents(git_repo, matcher, contents):
+    """
+    Read blobs which per-file checkers would read, in one round trip per commit.
+
+    :type git_repo: submarine_githooks.repository.Repository
+    :type matcher: FileMatcher
+    :type contents: list[Content]
+    """
+    commit_contents = OrderedDict()
+    for content in contents:
+        if content.file_path and any(not checker.once and not checker.batch and content.accepts(checker)
+                                     for checker in matcher.match(content.file_path)):
+            commit_contents.setdefault(content.commit, []).append(content)
+    for commit, preloaded_contents in commit_contents.items():
+        for content, blob in zip(preloaded_contents,
+                                 git_repo.preload((content.file_path for content in preloaded_contents), commit)):
+            content.blob = blob
+
+
+def _content_with_change(hook_name, change, *args):
+    """
+    :type hook_name: str
+    :type change: submarine_githooks.repository.Change
+    :rtype: Content
+    """
+    if hook_name == 'pre-push':
+        # Files pushed, besides pushed refs
+        content = FilePathContent(change.path, *args)
+        content.hook_name = hook_name
     else:
-        # Call directly
-        source_root = os.getcwd()
-        while not os.path.exists(os.path.join(source_root, '.git')):
-            if source_root == '/':
-                console.error('Cannot find .git directory.')
-                exit(1)
+        content = Content.create_with_hook(hook_name, change.path, *args)
+    content.change = change
+    if not change.deleted:
+        content.mode = change.mode
+    return content
 
-            source_root = os.path.abspath(os.path.join(source_root, '..'))
 
-        hook_name = sys.argv[1] if len(sys.argv) > 1 else 'pre-commit'
+def _iter_contents(git_repo, hook_name, argv, stdin, pushed_files=False):
+    """
+    :rtype: collections.Iterator[Content | None]
+    """
+    if hook_name == 'pre-commit':
+        # Only the index is read. Untracked and modified files in the working tree don't matter.
+        for change in git_repo.staged_changes('ACMRT'):
+            yield _content_with_change(hook_name, change)
+    elif hook_name == 'commit-msg':
+        commit_message_file_path = argv[-1]
+        yield Content.create_with_hook(hook_name, commit_message_file_path)
+    elif hook_name == 'post-checkout':
+        orig_commit_id, dest_commit_id, branch_checkout = argv[1:]
+        branch_checkout = branch_checkout == '1'
+        if branch_checkout:
+            for change in git_repo.diff(orig_commit_id, dest_commit_id):
+                yield _content_with_change(hook_name, change, orig_commit_id, dest_commit_id)
+    elif hook_name == 'post-merge':
+        source_commit = None
+        source_branch = None
+        squash_merge = argv[-1] == '1'
+        for key, value in os.environ.items():
+            if key.startswith('GITHEAD_') and len(key) == 48:
+                source_commit = key[8:]
+                source_branch = value
+        if source_commit and source_branch:
+            # Changes brought by the merge. A squash merge stages them without moving HEAD.
+            if squash_merge:
+                changes = git_repo.staged_changes('ACDMRT')
+            elif os.path.exists(os.path.join(git_repo.source_root, '.git', 'ORIG_HEAD')):
+                changes = git_repo.diff('ORIG_HEAD', 'HEAD')
+            else:
+                changes = git_repo.diff('HEAD^', 'HEAD')
+            for change in changes:
+                yield _content_with_change(hook_name, change, source_commit, squash_merge)
+    elif hook_name == 'pre-push':
+        remote_name, remote_url = argv[1:]
+
+        for reference_info_str in stdin.read().splitlines():
+            local_ref, local_commit_id, remote_ref, remote_commit_id = reference_info_str.strip().split(' ')
+            branch_deleted_from_local = local_commit_id == '0'*40
+            new_branch_to_remote = remote_commit_id == '0'*40
+            content = Content.create_with_hook(hook_name,
+                                               remote_name, remote_url,
+                                               local_ref, local_commit_id,
+                                               remote_ref, remote_commit_id,
+                                               branch_deleted_from_local,
+                                               new_branch_to_remote)
+            # Commits are listed only when a checker asks for them, and once for all checkers.
+            # Remote-tracking branches are known only for a named remote, not for a URL.
+            content.push_range = git_repo.push_range(local_commit_id, remote_commit_id,
+                                                     remote_name if remote_name != remote_url else None)
+            yield content
+            if pushed_files and not branch_deleted_from_local:
+                for change in content.push_range.changes():
+                    if not change.deleted:
+                        yield _content_with_change(hook_name, change, local_ref, local_commit_id)
+
+
+def main():
+    # Get options and constants ========================================================================================
+
+    # Find source root
+    source_root, hook_name = locate_hook(sys.argv)
+    if not source_root:
+        console.error('Cannot find .git directory.')
+        exit(1)
 
     if hook_name not in hook_names:
         console.error('Invalid hook name. got "{}" Choices={{{}}}'.format(hook_name, ','.join(hook_names)))
         exit(1)
 
     # Define constants
+    git_repo = Repository(source_root)
     git_hooks_home = os.path.join(source_root, '.githooks')
-    git_repo = GitRepo(source_root)
     # setup python path
     sys.path.append(git_hooks_home)
     checkers_package_dir = git_hooks_home
 
-    config = {
-        'debug': False
-    }
-    # read options from file
-    local_config_path = os.path.join(git_hooks_home, 'config.yaml')
-    if not os.path.exists(local_config_path):
-        local_config_path = os.path.splitext(local_config_path)[0] + '.json'
-    if os.path.exists(local_config_path):
-        with open(local_config_path, 'r') as f:
-            config.update(yaml.load(f))
-    # read options from env
-    env_option_prefix = 'SUBMARINE_GITHOOK_'
-    bool_env_options = ('debug',)
-    for key, value in six.iteritems(os.environ):
-        if key.startswith(env_option_prefix):
-            key = key[len(env_option_prefix):].lower()
-            if key in bool_env_options:
-                try:
-                    value = int(value) != 0
-                except ValueError:
-                    value = bool(value)
-                finally:
-                    config[key] = value
+    hook_config = HookConfig.for_source_root(source_root)
+    try:
+        config, ignored_options = hook_config.values(hook_name)
+    except ConfigError as e:
+        console.error(str(e))
+        exit(1)
+    for ignored_option in ignored_options:
+        console.warn(ignored_option)
 
     debug = config['debug']
+    git_repo.max_blob_cache_size = config['max_blob_cache_size']
     if debug:
         console.info('Found .git at {}'.format(source_root))
-        if os.path.exists(local_config_path):
-            console.info('Loaded config from {}'.format(local_config_path))
+        if hook_config.path:
+            console.info('Loaded config from {}'.format(hook_config.path))
 
     # Find checkers ====================================================================================================
+    timings = Timings(hook_name)
+    timings.start_phase('discovery')
     if debug:
         console.show('')
         console.info('Load checkers for {}'.format(hook_name), bar_width=120)
+    registry = CheckerRegistry.for_source_root(source_root)
     checkers = []
     """:type: list[Checker]"""
-    for checker_path in os.listdir(checkers_package_dir):
-        if checker_path.endswith('.py') and checker_path != '__init__.py':
-            checker_module_str = os.path.splitext(checker_path)[0]
-            checker_module = import_module(checker_module_str)
-            for attr in dir(checker_module):
-                checker = getattr(checker_module, attr)
-                if isinstance(checker, Checker) and checker.is_active_for_hook(hook_name):
-                    checkers.append(checker)
+    for checker in registry.checkers(hook_name):
+        if hook_config.is_checker_enabled(checker.name, hook_name):
+            checkers.append(checker)
+        elif debug:
+            console.warn('Disabled checker: {}'.format(checker.name))
+    if registry.refreshed and is_installed_hook(source_root, sys.argv) and os.path.islink(sys.argv[0]):
+        # Checkers have been changed, which may be active for other hooks now. Link these hooks like `sync` does.
+        git_hooks_path = os.path.dirname(os.path.abspath(sys.argv[0]))
+        try:
+            sync_hooks(git_hooks_path, os.path.join(git_hooks_path, os.readlink(sys.argv[0])),
+                       registry.active_hooks(), log=console.info if debug else None)
+        except (IOError, OSError) as e:
+            console.warn('Failed to sync hooks: {}. Run `submarine-githooks sync` again.'.format(e))
 
     if not checkers:
         if debug:
             console.warn('No checkers for {}'.format(hook_name))
+        sys.exit(0)
     if debug:
         for checker in checkers:
             console.success('Found checker: {}'.format(checker.name))
 
     # Find content to be checked =======================================================================================
+    timings.start_phase('content loading')
     if debug:
         console.show('')
         console.info('Load contents for {}'.format(hook_name), bar_width=120)
+    matcher = FileMatcher(checkers)
     contents = []
     """:type: list[Content]"""
-    if hook_name == 'pre-commit':
-        for file_path, (status_staged, status_working) in git_repo.status.items():
-            if status_staged in 'TMARC':
-                content = Content.create_with_hook(hook_name, file_path)
-                if content:
-                    contents.append(content)
-    elif hook_name == 'commit-msg':
-        commit_message_file_path = sys.argv[-1]
-        content = Content.create_with_hook(hook_name, commit_message_file_path)
-        if content:
-            contents.append(content)
-    elif hook_name == 'post-checkout':
-        orig_commit_id, dest_commit_id, branch_checkout = sys.argv[1:]
-        branch_checkout = branch_checkout == '1'
-        if branch_checkout:
-            for changed_file in git_repo.changed_files(orig_commit_id, dest_commit_id):
-                file_path = os.path.relpath(os.path.join(git_repo.source_root, changed_file), git_repo.source_root)
-                content = Content.create_with_hook(hook_name, file_path, orig_commit_id, dest_commit_id)
-                if content:
-                    contents.append(content)
-    elif hook_name == 'post-merge':
-        source_commit = None
-        source_branch = None
-        squash_merge = sys.argv[-1] == '1'
-        for key, value in os.environ.items():
-            if key.startswith('GITHEAD_') and len(key) == 48:
-                source_commit = key[8:]
-                source_branch = value
-        if source_commit and source_branch:
-            for file_path in git_repo.changed_files(commit=source_commit):
-                content = Content.create_with_hook(hook_name, file_path, source_commit, squash_merge)
-                if content:
-                    contents.append(content)
-    elif hook_name == 'pre-push':
-        remote_name, remote_url = sys.argv[1:]
-
-        for reference_info_str in sys.stdin.read().splitlines():
-            local_ref, local_commit_id, remote_ref, remote_commit_id = reference_info_str.strip().split(' ')
-            branch_deleted_from_local = local_commit_id == '0'*40
-            new_branch_to_remote = remote_commit_id == '0'*40
-            content = Content.create_with_hook(hook_name,
-                                               remote_name, remote_url,
-                                               local_ref, local_commit_id,
-                                               remote_ref, remote_commit_id,
-                                               branch_deleted_from_local,
-                                               new_branch_to_remote)
-            if content:
-                contents.append(content)
+    content_iterator = iter_contents(git_repo, hook_name, sys.argv, sys.stdin,
+                                     pushed_files=any(checker.pushed_files for checker in checkers))
+    while True:
+        batch = list(islice(content_iterator, preload_batch_size))
+        if not batch:
+            break
+        if hook_name in ('pre-commit', 'pre-push'):
+            preload_contents(git_repo, matcher, batch)
+        contents.extend(batch)
+    if hook_name == 'pre-commit' and any(checker.changed_lines for checker in checkers):
+        # All hunks come from one `git diff`, which is cheaper than one per file.
+        staged_line_ranges = git_repo.staged_line_ranges()
+        for content in contents:
+            content.changed_lines = staged_line_ranges.get(content.file_path, LineRanges())
 
     if not contents:
         if debug:
             console.warn('No content to check for {}'.format(hook_name))
     if debug:
+        content_console, content_messages = buffered_console()
         for content in contents:
-            console.success(content.discovered_message())
+            content_console.success(content.discovered_message())
+        sys.stdout.write(content_messages.getvalue())
 
     # Go, start to check ===============================================================================================
+    timings.start_phase('checking')
     if debug:
         console.show('')
         console.info('Start check for {}'.format(hook_name), bar_width=120)
     exit_code = 0
+    try:
+        executor = create_executor(config['executor'], config['jobs'])
+    except ValueError as e:
+        console.error(str(e))
+        exit(1)
+    if debug and executor.jobs > 1:
+        console.info('Run checkers with {} {} workers'.format(executor.jobs, config['executor']))
+    cache = None
+    costs = None
+    git_dir = os.path.join(source_root, '.git')
+    if os.path.isdir(git_dir):
+        if config['cache'] and hook_name in cached_hook_names:
+            cache = ResultCache(os.path.join(git_dir, state_dir_name, 'results.json'), config['cache_size'],
+                                lambda checker: hook_config.checker_settings(checker.name, hook_name))
+        costs = CheckerCosts(os.path.join(git_dir, state_dir_name, 'costs.json'))
+    # Limits in the config file win over ones declared by checkers, which win over the default of all checkers.
+    limits = {}
     for checker in checkers:
-        if checker.once:
-            # noinspection PyBroadException
-            try:
-                checker(git_repo, hook_name, map(lambda _content: _content.arguments, contents))
-            except Exception as e:
-                console.error('{} hook fails\nchecker: {}\n{}'.format(hook_name, checker.name, str(e)))
-                exit_code |= 1
-            else:
-                if debug:
-                    console.success('{} checker success'.format(checker.name))
-        else:
-            for content in contents:
-                args = (git_repo, hook_name) + content.arguments
-                if content.file_path and not checker.is_active_for_file(content.file_path):
-                    if debug:
-                        console.success(content.inactive_message(checker))
-                    continue
-                # noinspection PyBroadException
-                try:
-                    checker(*args)
-                except Exception as e:
-                    console.show('')
-                    console.error('{} hook fails\nchecker: {}\n{}'.format(hook_name,
-                                                                  checker.name,
-                                                                  content.error_message(checker, e)))
-                    exit_code |= 1
-                else:
-                    if debug:
-                        console.success(content.success_message(checker))
+        checker_settings = hook_config.checker_settings(checker.name, hook_name)
+        limits[checker] = ResourceLimits(checker_settings.get('timeout', checker.timeout or config['timeout']),
+                                         checker_settings.get('memory_limit',
+                                                              checker.memory_limit or config['memory_limit']))
+    try:
+        results = run_checkers(executor, git_repo, hook_name, checkers, contents, cache=cache, matcher=matcher,
+                               fail_fast=config['fail_fast'], schedule_mode=config['schedule'], costs=costs,
+                               limits=limits, async_jobs=config['async_jobs'])
+    finally:
+        executor.close()
+        git_repo.close()
+    if cache is not None:
+        try:
+            cache.save()
+        except (IOError, OSError) as e:
+            console.warn('Failed to save result cache: {}'.format(e))
+    if costs is not None:
+        costs.update(results)
+        try:
+            costs.save()
+        except (IOError, OSError) as e:
+            console.warn('Failed to save costs of checkers: {}'.format(e))
+    timings.stop_phase()
+    timings.results = results
+
+    # Results are reported at once, after all checkers have finished.
+    report = HookReport(hook_name, results, debug, config['max_failures'])
+    # When the report goes to a file, messages are still printed for whoever runs git
+    if config['report_output']:
+        report.write('human')
+    try:
+        report.write(config['report_format'], config['report_output'])
+    except (IOError, OSError) as e:
+        console.warn('Failed to write report: {}'.format(e))
+    if report.failed:
+        exit_code |= 1
+
+    # Timing report
+    if config['timing_report']:
+        timings.write(config['timing_report'])
+        if debug:
+            console.info('Wrote timing report to {}'.format(config['timing_report']))
+    if config['timing_threshold'] and timings.wall_time > config['timing_threshold']:
+        stderr_console = Console(sys.stderr)
+        for line in timings.summary(config['timing_top']):
+            stderr_console.warn(line)
 
     sys.exit(exit_code)
 
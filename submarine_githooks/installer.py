@@ -0,0 +1,159 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Link hooks to the entry command, and chain hooks which were there before.
+# Like `submarine_githooks.entry`, only the standard library is used, since hooks sync their links themselves.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import datetime
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from submarine_githooks.constants import entry_command_name, hook_names, stdin_hook_names, sync_hook_names
+
+backup_timestamp_format = '%Y%m%d-%H%M%S'
+backup_suffix_regex = re.compile(r'^-\d{8}-\d{6}$')
+
+
+def hook_backups(git_hooks_path, hook_name):
+    """
+    Hooks which were there before being linked, like `.git/hooks/pre-commit-20150101-120000`.
+
+    :type git_hooks_path: str
+    :type hook_name: str
+    :return: paths of backups, oldest first
+    :rtype: list[str]
+    """
+    if not os.path.isdir(git_hooks_path):
+        return []
+    return [os.path.join(git_hooks_path, file_name) for file_name in sorted(os.listdir(git_hooks_path))
+            if file_name.startswith(hook_name) and backup_suffix_regex.match(file_name[len(hook_name):])]
+
+
+def is_linked(hook_path, entry_command_path):
+    """
+    :type hook_path: str
+    :type entry_command_path: str
+    :rtype: bool
+    """
+    return os.path.abspath(os.path.realpath(hook_path)) == os.path.abspath(os.path.realpath(entry_command_path))
+
+
+def is_entry_link(hook_path, entry_command_path=None):
+    """
+    Whether the hook runs an entry command, like the given one or one installed at another location before.
+    Such a hook is never chained or restored, since it would run checkers again under a name which isn't a hook.
+
+    :type hook_path: str
+    :type entry_command_path: str | None
+    :rtype: bool
+    """
+    if not os.path.islink(hook_path):
+        return False
+    if entry_command_path and is_linked(hook_path, entry_command_path):
+        return True
+    return os.path.basename(os.path.realpath(hook_path)) == entry_command_name
+
+
+def sync_hooks(git_hooks_path, entry_command_path, active_hooks=None, dry_run=False, log=None):
+    """
+    Link hooks which checkers are active for to the entry command, and unlink others, so git doesn't start Python for
+    hooks without checkers. Hooks in `sync_hook_names` are always linked, so checkers added later get their hooks linked
+    by the next pull or checkout.
+    A hook which is there is moved to a timestamped backup, which the entry runs before checkers. When the hook is not
+    needed any more, the latest backup is moved back.
+
+    :type git_hooks_path: str
+    :type entry_command_path: str
+    :param active_hooks: hooks to link, in addition to `sync_hook_names`. All hooks if None.
+    :type active_hooks: collections.Iterable[str] | None
+    :param dry_run: only log what would be done
+    :type dry_run: bool
+    :param log: called with the shell command equivalent to each change
+    :type log: callable | None
+    :return: equivalent shell commands of changes
+    :rtype: list[str]
+    """
+    active_hooks = set(hook_names if active_hooks is None else active_hooks).union(sync_hook_names)
+    changes = []
+
+    def change(command, operation, *args):
+        changes.append(command)
+        if log:
+            log(command)
+        if not dry_run:
+            operation(*args)
+
+    if not os.path.isdir(git_hooks_path):
+        if not active_hooks:
+            return changes
+        change('mkdir -p {}'.format(git_hooks_path), os.makedirs, git_hooks_path)
+    for hook_name in hook_names:
+        hook_path = os.path.join(git_hooks_path, hook_name)
+        linked = os.path.islink(hook_path) and is_linked(hook_path, entry_command_path)
+        if hook_name in active_hooks and not linked:
+            if is_entry_link(hook_path):
+                # Linked to an entry installed at another location, which is replaced but not kept
+                change('rm {}'.format(hook_path), os.remove, hook_path)
+            elif os.path.lexists(hook_path):
+                backup_path = '{}-{}'.format(hook_path, datetime.datetime.now().strftime(backup_timestamp_format))
+                change('mv {} {}'.format(hook_path, backup_path), os.rename, hook_path, backup_path)
+            change('ln -s {} {}'.format(entry_command_path, hook_path), os.symlink, entry_command_path, hook_path)
+        elif hook_name not in active_hooks and linked:
+            change('rm {}'.format(hook_path), os.remove, hook_path)
+            backups = [path for path in hook_backups(git_hooks_path, hook_name)
+                       if not is_entry_link(path, entry_command_path)]
+            if backups:
+                change('mv {} {}'.format(backups[-1], hook_path), os.rename, backups[-1], hook_path)
+    return changes
+
+
+def run_chained_hook(git_hooks_path, hook_name, argv, entry_command_path=None):
+    """
+    Run the latest backup of the hook, which was there before the entry was linked.
+    For hooks reading stdin, stdin is kept in a temporary file, which becomes stdin of the process again.
+
+    :type git_hooks_path: str
+    :type hook_name: str
+    :param argv: arguments of the hook, without the command
+    :type argv: list[str]
+    :param entry_command_path: the running entry, whose links are not chained
+    :type entry_command_path: str | None
+    :return: the exit code of the chained hook, or None if there's none
+    :rtype: int | None
+    """
+    backups = [path for path in hook_backups(git_hooks_path, hook_name)
+               if os.access(path, os.X_OK) and not is_entry_link(path, entry_command_path)]
+    if not backups:
+        return None
+    if hook_name not in stdin_hook_names:
+        return subprocess.call([backups[-1]] + list(argv))
+
+    stdin_copy = tempfile.TemporaryFile()
+    while True:
+        chunk = os.read(sys.stdin.fileno(), 65536)
+        if not chunk:
+            break
+        stdin_copy.write(chunk)
+    stdin_copy.flush()
+    stdin_copy.seek(0)
+    exit_code = subprocess.call([backups[-1]] + list(argv), stdin=stdin_copy)
+    stdin_copy.seek(0)
+    os.dup2(stdin_copy.fileno(), sys.stdin.fileno())
+    stdin_copy.close()
+    return exit_code
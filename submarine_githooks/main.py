@@ -15,27 +15,31 @@
 #
 
 from __future__ import unicode_literals, division, absolute_import, print_function
-from importlib import import_module
 import os
-import datetime
-from taskr import task, console
+import json
+import subprocess
+import sys
+import time
+from taskr import Console, task, console
 from taskr.contrib.system import run as taskr_run
 from taskr.contrib.validators import validate_boolean
-from submarine_githooks.checker import Checker
-from submarine_githooks.constants import hook_names
+from submarine_githooks import audit as audit_module
+from submarine_githooks.cache import ResultCache
+from submarine_githooks.constants import entry_command_name, hook_names, state_dir_name
+from submarine_githooks import daemon as hook_daemon
+from submarine_githooks.installer import is_linked, sync_hooks
+from submarine_githooks.registry import CheckerRegistry
 
 source_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+batch_module_suffix = '_batch'
 
 
 @task
-def install(dry_run=False, verbose=False):
+def install(dry_run=False, verbose=False, all_hooks=False):
     git_path = '.git'
-    git_hooks_path = os.path.join(git_path, 'hooks')
     script_home = '.githooks'
     checkers_home = script_home
-    entry_command_path, _ = taskr_run('which submarine-githooks-entry')
 
-    assert entry_command_path, 'Cannot find the location of `submarine-githooks-entry`'
     assert os.path.exists(git_path), 'Cannot find `.git` folder at current working directory.'
 
     def run(command):
@@ -44,29 +48,51 @@ def install(dry_run=False, verbose=False):
         else:
             taskr_run(command, print_command=verbose, capture_output=False)
 
-    # Create hooks
-    hook_link_commands = []
-    for hook_name in hook_names:
-        target_hook_path = '{git_hooks_path}/{hook_name}'.format(**locals())
-        if os.path.abspath(os.path.realpath(target_hook_path)) != os.path.abspath(entry_command_path):
-            if os.path.exists(target_hook_path):
-                hook_link_commands.append('mv {target_hook_path} {target_hook_path}-{timestamp}'.format(
-                    timestamp=datetime.datetime.now().strftime('%Y%m%d-%H%M%S'),
-                    **locals())
-                )
-            hook_link_commands.append('ln -s {entry_command_path} {git_hooks_path}/{hook_name}'.format(**locals()))
-
-    if hook_link_commands:
-        run('mkdir -p {git_hooks_path}'.format(**locals()))
-        for hook_link_command in hook_link_commands:
-            run(hook_link_command)
-
     # Create checkers room
     if not os.path.exists(checkers_home):
         run('mkdir -p {checkers_home}'.format(**locals()))
     if not os.path.exists('{checkers_home}/__init__.py'.format(**locals())):
         run('touch {checkers_home}/__init__.py'.format(**locals()))
 
+    # Create hooks
+    _sync_hook_links(dry_run, verbose, all_hooks)
+
+
+@task
+def sync(dry_run=False, verbose=False, all_hooks=False):
+    """
+    Link hooks which checkers under `.githooks` are active for and ones in `sync_hook_names`, and unlink others.
+    """
+    assert os.path.exists('.git'), 'Cannot find `.git` folder at current working directory.'
+    _sync_hook_links(dry_run, verbose, all_hooks)
+
+
+def _sync_hook_links(dry_run, verbose, all_hooks):
+    """
+    :type dry_run: bool
+    :type verbose: bool
+    :param all_hooks: link all hooks, even if no checker is active for them
+    :type all_hooks: bool
+    """
+    git_hooks_path = os.path.join('.git', 'hooks')
+    entry_command_path, _ = taskr_run('which {}'.format(entry_command_name))
+    assert entry_command_path, 'Cannot find the location of `{}`'.format(entry_command_name)
+
+    active_hooks = None
+    if not all_hooks:
+        checkers_dir = os.path.abspath('.githooks')
+        if checkers_dir not in sys.path:
+            sys.path.append(checkers_dir)
+        active_hooks = CheckerRegistry.for_source_root(os.getcwd()).active_hooks()
+    changes = sync_hooks(git_hooks_path, entry_command_path, active_hooks, dry_run=dry_run,
+                         log=print if dry_run or verbose else None)
+    if not dry_run:
+        linked_hooks = [hook_name for hook_name in hook_names
+                        if is_linked(os.path.join(git_hooks_path, hook_name), entry_command_path)]
+        console.info('Linked hooks: {}'.format(', '.join(linked_hooks) if linked_hooks else 'none'))
+        if not changes and verbose:
+            console.info('Hooks are up-to-date')
+
 
 @task
 def setup_script(dest_path='.', script_name='setup-githooks'):
@@ -85,34 +111,161 @@ submarine-githooks install
 
 
 @task
-def vendored_checkers():
-    checker_modules = []
+def clear_cache():
+    git_path = '.git'
+    assert os.path.exists(git_path), 'Cannot find `.git` folder at current working directory.'
+    ResultCache(os.path.join(git_path, state_dir_name, 'results.json')).clear()
+
+
+@task
+def daemon(action, idle_timeout=hook_daemon.default_idle_timeout):
+    """
+    Start, stop or show status of the daemon, which runs hooks of the repo without starting Python every time.
+    """
+    git_path = '.git'
+    assert os.path.exists(git_path), 'Cannot find `.git` folder at current working directory.'
+    assert action in ('start', 'stop', 'status'), 'Invalid action. got "{}" Choices={{start,stop,status}}'.format(action)
+    working_dir = os.getcwd()
+
+    response = hook_daemon.send_command(working_dir, 'ping')
+    if action == 'status':
+        if response:
+            console.info('Daemon is running ({})'.format(response))
+        else:
+            console.info('Daemon is not running')
+    elif action == 'stop':
+        if response:
+            hook_daemon.send_command(working_dir, 'stop')
+            console.success('Daemon stopped')
+    elif response:
+        console.info('Daemon is running ({})'.format(response))
+    elif not hook_daemon.is_supported():
+        console.error('The daemon needs Python 3 on a platform with Unix domain sockets.')
+    else:
+        log_path = os.path.join(git_path, state_dir_name, 'daemon.log')
+        if not os.path.exists(os.path.dirname(log_path)):
+            os.makedirs(os.path.dirname(log_path))
+        with open(os.devnull, 'r') as stdin, open(log_path, 'a') as log:
+            subprocess.Popen([sys.executable, '-m', 'submarine_githooks.daemon', working_dir, str(idle_timeout)],
+                             stdin=stdin, stdout=log, stderr=log, start_new_session=True)
+        for _ in range(50):
+            response = hook_daemon.send_command(working_dir, 'ping')
+            if response:
+                console.success('Daemon started ({})'.format(response))
+                break
+            time.sleep(0.1)
+        else:
+            console.error('Daemon failed to start. See {}'.format(log_path))
+
+
+@task
+def audit(commits='', shard='1/1', jobs=0, executor='process', fail_fast=False, output=''):
+    """
+    Run pre-commit checkers over all tracked files, or files changed by commits like `A..B` (changes from the merge
+    base of A and B, like `git log A..B`), and fail if any fails.
+    With `--shard i/n`, only the i-th of n shards of files is audited, and reports could be merged by `merge-audit`.
+    """
+    assert os.path.exists('.git'), 'Cannot find `.git` folder at current working directory.'
+
+    def print_failures(results):
+        for result in results:
+            if result.failed:
+                console.show('')
+                console.error('checker: {}\n{}'.format(
+                    result.checker.name, result.content.error_message(result.checker, result.exception)
+                    if result.content is not None else str(result.exception)))
+
+    report = audit_module.run_audit(os.getcwd(), commits, shard, jobs, executor, fail_fast,
+                                    on_results=print_failures)
+    if output:
+        report.write(output)
+    summary = 'Audited {} checks of {} files in shard {}: {} failed'.format(report.checks, report.files, shard,
+                                                                          len(report.failures))
+    if report.failures:
+        console.error(summary)
+        sys.exit(1)
+    console.success(summary)
+
+
+@task
+def merge_audit(*report_paths):
+    """
+    Merge JSON reports of `audit --output` for shards, print the merged report, and fail if any check fails or any
+    shard is missing.
+    """
+    report = audit_module.AuditReport.merge(list(report_paths))
+    print(json.dumps(report.as_dict(), indent=2, ensure_ascii=False))
+    stderr_console = Console(sys.stderr)
+    summary = 'Merged {} shards: {} checks of {} files, {} failed'.format(len(report.shards), report.checks,
+                                                                        report.files, len(report.failures))
+    if report.failures:
+        stderr_console.error(summary)
+    else:
+        stderr_console.success(summary)
+    if not report.complete:
+        stderr_console.error('Some shards are missing. got {}'.format(', '.join(report.as_dict()['shards'])))
+    if report.failures or not report.complete:
+        sys.exit(1)
+
+
+def _checker_module_path(checker_module_str):
+    """
+    :type checker_module_str: str
+    :rtype: str
+    """
+    return os.path.join(source_root, *checker_module_str.split('.')) + '.py'
+
+
+def _checker_module_variant(checker_module_str, per_file=False):
+    """
+    Vendored checker modules may have a batched variant, named with `batch_module_suffix`, which checks all files in
+    one invocation. It's preferred unless `per_file` is True.
+
+    :type checker_module_str: str
+    :type per_file: bool
+    :rtype: str
+    """
+    if checker_module_str.endswith(batch_module_suffix):
+        per_file_module_str = checker_module_str[:-len(batch_module_suffix)]
+        batch_module_str = checker_module_str
+    else:
+        per_file_module_str = checker_module_str
+        batch_module_str = checker_module_str + batch_module_suffix
+    preferred_module_str = per_file_module_str if per_file else batch_module_str
+    return preferred_module_str if os.path.exists(_checker_module_path(preferred_module_str)) else checker_module_str
+
+
+@task
+def vendored_checkers(per_file=False):
     checkers_package = 'submarine_githooks.contrib.checkers'
     checkers_package_path = os.path.join(source_root, 'submarine_githooks', 'contrib', 'checkers')
-    for module_file in os.listdir(checkers_package_path):
-        if os.path.splitext(module_file)[-1] == '.py' and module_file != '__init__.py':
-            checker_module_str = '{}.{}'.format(checkers_package, os.path.splitext(module_file)[0])
-            checker_module = import_module(checker_module_str)
-            for attr in dir(checker_module):
-                if isinstance(getattr(checker_module, attr), Checker):
-                    checker_modules.append(checker_module_str)
-
-    for checker_module in checker_modules:
-        print(checker_module)
+    registry = CheckerRegistry(checkers_package_path, package=checkers_package)
+    for checker_module, module_info in registry.modules.items():
+        if module_info['checkers'] and _checker_module_variant(checker_module, per_file) == checker_module:
+            print(checker_module)
 
 
 @task
-def install_checker(checker_module_str):
+def install_checker(checker_module_str, per_file=False):
     dest_checkers_path = '.githooks'
     if not os.path.exists(dest_checkers_path):
         raise IOError('No such directory: {}'.format(dest_checkers_path))
 
-    src_checker_module_path = os.path.join(source_root, *checker_module_str.split('.')) + '.py'
+    variant_module_str = _checker_module_variant(checker_module_str, per_file)
+    if variant_module_str != checker_module_str:
+        console.info('Install {} instead of {}'.format(variant_module_str, checker_module_str))
+    src_checker_module_path = _checker_module_path(variant_module_str)
     dest_checker_module_path = os.path.join(dest_checkers_path, os.path.split(src_checker_module_path)[-1])
     if (not os.path.exists(dest_checker_module_path) or
             console.input('File exists. Overwrite?', default='N', hint='y/n', validators=[validate_boolean])):
         taskr_run('cp {} {}'.format(src_checker_module_path, dest_checker_module_path))
 
+    # Both variants check the same files
+    other_module_str = _checker_module_variant(variant_module_str, not per_file)
+    other_module_path = os.path.join(dest_checkers_path, other_module_str.split('.')[-1] + '.py')
+    if other_module_str != variant_module_str and os.path.exists(other_module_path):
+        console.warn('{} is also installed. Remove it, or files are checked twice.'.format(other_module_path))
+
 
 if __name__ == '__main__':
     task.dispatch()
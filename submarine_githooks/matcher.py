@@ -0,0 +1,102 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import defaultdict
+import os
+import re
+
+
+class FileMatcher(object):
+    """
+    Index of file filters of checkers, which finds all checkers active for a file path in one lookup.
+    """
+
+    def __init__(self, checkers):
+        """
+        :type checkers: list[submarine_githooks.checker.Checker]
+        """
+        self.checkers = list(checkers)
+        self._unfiltered = set()
+        """:type: set[submarine_githooks.checker.Checker]"""
+        self._required_kinds = {}
+        """:type: dict[submarine_githooks.checker.Checker, frozenset[str]]"""
+        self._extensions = defaultdict(set)
+        self._names = defaultdict(set)
+        self._paths = defaultdict(set)
+        self._patterns = []
+        """:type: list[(re.__Regex, submarine_githooks.checker.Checker)]"""
+        self._validators = []
+        """:type: list[((str) -> bool, submarine_githooks.checker.Checker)]"""
+
+        for checker in self.checkers:
+            file_filter_items = checker.file_filter_items
+            if not file_filter_items:
+                self._unfiltered.add(checker)
+                continue
+            self._required_kinds[checker] = frozenset(kind for kind, _ in file_filter_items)
+            for kind, values in file_filter_items:
+                if kind == 'extension':
+                    for value in values:
+                        self._extensions[value].add(checker)
+                elif kind == 'name':
+                    for value in values:
+                        self._names[value].add(checker)
+                elif kind == 'path':
+                    for value in values:
+                        self._paths[value].add(checker)
+                elif kind == 'pattern':
+                    self._patterns.extend((regex, checker) for regex in values)
+                elif kind == 'validate':
+                    self._validators.extend((validate, checker) for validate in values)
+
+        # Files matching none of the patterns are rejected by one search.
+        # Patterns with groups are not combined, since numbered references would point to groups of other patterns.
+        self._combined_pattern = None
+        if (self._patterns and all(regex.flags == self._patterns[0][0].flags and not regex.groups
+                                   for regex, _ in self._patterns)):
+            try:
+                self._combined_pattern = re.compile('|'.join('(?:{})'.format(regex.pattern)
+                                                             for regex, _ in self._patterns),
+                                                    self._patterns[0][0].flags)
+            except re.error:
+                self._combined_pattern = None
+
+    def match(self, path):
+        """
+        :type path: str
+        :rtype: set[submarine_githooks.checker.Checker]
+        """
+        satisfied_kinds = defaultdict(set)
+        directory, name = os.path.split(path)
+        for checker in self._extensions.get(os.path.splitext(name)[-1], ()):
+            satisfied_kinds[checker].add('extension')
+        for checker in self._names.get(name, ()):
+            satisfied_kinds[checker].add('name')
+        for checker in self._paths.get(path, ()):
+            satisfied_kinds[checker].add('path')
+        if self._patterns and (self._combined_pattern is None or self._combined_pattern.search(path)):
+            for regex, checker in self._patterns:
+                if 'pattern' not in satisfied_kinds[checker] and regex.search(path) is not None:
+                    satisfied_kinds[checker].add('pattern')
+        for validate, checker in self._validators:
+            if 'validate' not in satisfied_kinds[checker] and validate(path):
+                satisfied_kinds[checker].add('validate')
+
+        matched = set(self._unfiltered)
+        matched.update(checker for checker, kinds in satisfied_kinds.items()
+                       if kinds == self._required_kinds[checker])
+        return matched
@@ -0,0 +1,213 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
+from importlib import import_module
+import json
+import os
+from submarine_githooks.constants import state_dir_name
+
+
+class CheckerRegistry(object):
+    """
+    Find checkers from Python modules under a folder.
+    Only the standard library is used before a checker module is imported, so the fast path of the hook entry is cheap.
+
+    Which checkers a module defines, and which hooks they are active for, are kept in a manifest file.
+    A module is imported again only when it is modified, or when one of its checkers is needed by the hook.
+    """
+
+    manifest_version = 1
+
+    def __init__(self, checkers_dir, manifest_path=None, package=None):
+        """
+        :param checkers_dir: the folder holding checker modules, which should be importable
+        :type checkers_dir: str
+        :param manifest_path: where to persist the manifest. Not persisted if None.
+        :type manifest_path: str | None
+        :param package: the package of checker modules, if they are not top-level modules
+        :type package: str | None
+        """
+        self.checkers_dir = checkers_dir
+        self.manifest_path = manifest_path
+        self.package = package
+        self._modules = None
+        """:type: OrderedDict[str, dict]"""
+        # Whether the manifest has been scanned again, since modules are modified, added or removed
+        self.refreshed = False
+
+    @classmethod
+    def for_source_root(cls, source_root):
+        """
+        The registry of `.githooks` of a repo, whose manifest is kept under `.git`.
+
+        :type source_root: str
+        :rtype: CheckerRegistry
+        """
+        git_dir = os.path.join(source_root, '.git')
+        return cls(os.path.join(source_root, '.githooks'),
+                   os.path.join(git_dir, state_dir_name, 'registry.json') if os.path.isdir(git_dir) else None)
+
+    def module_name(self, file_name):
+        """
+        :type file_name: str
+        :rtype: str
+        """
+        module_name = os.path.splitext(file_name)[0]
+        return '{}.{}'.format(self.package, module_name) if self.package else module_name
+
+    @property
+    def module_files(self):
+        """
+        :return: module name => (mtime, size) of its file
+        :rtype: OrderedDict[str, (float, int)]
+        """
+        module_files = OrderedDict()
+        if not os.path.isdir(self.checkers_dir):
+            return module_files
+        for file_name in sorted(os.listdir(self.checkers_dir)):
+            if file_name.endswith('.py') and file_name != '__init__.py':
+                stat = os.stat(os.path.join(self.checkers_dir, file_name))
+                module_files[self.module_name(file_name)] = (stat.st_mtime, stat.st_size)
+        return module_files
+
+    def may_have_checkers(self, hook_name):
+        """
+        Tell whether there're checkers for the hook without importing any module.
+        Only returns False when the manifest is up-to-date and none of checkers is active for the hook.
+
+        :type hook_name: str
+        :rtype: bool
+        """
+        manifest = self._load_manifest()
+        module_files = self.module_files
+        if set(manifest) != set(module_files):
+            return True
+        for module_name, (mtime, size) in module_files.items():
+            module_info = manifest[module_name]
+            if module_info['mtime'] != mtime or module_info['size'] != size:
+                return True
+            for checker_info in module_info['checkers']:
+                if not checker_info['hooks'] or hook_name in checker_info['hooks']:
+                    return True
+        return False
+
+    @property
+    def modules(self):
+        """
+        :return: module name => {'mtime': float, 'size': int, 'checkers': [{'attr': str, 'hooks': [str]}]}
+        :rtype: OrderedDict[str, dict]
+        """
+        if self._modules is None:
+            manifest = self._load_manifest()
+            modules = OrderedDict()
+            modified = False
+            for module_name, (mtime, size) in self.module_files.items():
+                module_info = manifest.get(module_name)
+                if not module_info or module_info['mtime'] != mtime or module_info['size'] != size:
+                    module_info = {'mtime': mtime, 'size': size, 'checkers': self._scan_module(module_name)}
+                    modified = True
+                modules[module_name] = module_info
+            if modified or set(modules) != set(manifest):
+                self._save_manifest(modules)
+                self.refreshed = True
+            self._modules = modules
+        return self._modules
+
+    def checkers(self, hook_name=None):
+        """
+        Import modules having checkers for the hook and get these checkers.
+
+        :param hook_name: get checkers active for this hook. All checkers if None.
+        :type hook_name: str | None
+        :rtype: list[submarine_githooks.checker.Checker]
+        """
+        from submarine_githooks.checker import Checker
+
+        checkers = []
+        for module_name, module_info in self.modules.items():
+            for checker_info in module_info['checkers']:
+                if hook_name and checker_info['hooks'] and hook_name not in checker_info['hooks']:
+                    continue
+                checker = getattr(import_module(module_name), checker_info['attr'], None)
+                if (isinstance(checker, Checker) and checker not in checkers and
+                        (not hook_name or checker.is_active_for_hook(hook_name))):
+                    checkers.append(checker)
+        return checkers
+
+    def active_hooks(self):
+        """
+        :return: hooks which at least one checker is active for. None means all hooks.
+        :rtype: set[str] | None
+        """
+        active_hooks = set()
+        for module_info in self.modules.values():
+            for checker_info in module_info['checkers']:
+                if not checker_info['hooks']:
+                    return None
+                active_hooks.update(checker_info['hooks'])
+        return active_hooks
+
+    @staticmethod
+    def _scan_module(module_name):
+        """
+        :type module_name: str
+        :rtype: list[dict]
+        """
+        from submarine_githooks.checker import Checker
+
+        module = import_module(module_name)
+        checkers_info = []
+        for attr in dir(module):
+            checker = getattr(module, attr)
+            if isinstance(checker, Checker):
+                checkers_info.append({'attr': attr, 'hooks': list(checker.active_hooks)})
+        return checkers_info
+
+    def _load_manifest(self):
+        """
+        :rtype: dict[str, dict]
+        """
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+        # noinspection PyBroadException
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except Exception:
+            return {}
+        if manifest.get('version') != self.manifest_version or manifest.get('checkers_dir') != self.checkers_dir:
+            return {}
+        return manifest.get('modules', {})
+
+    def _save_manifest(self, modules):
+        """
+        :type modules: OrderedDict[str, dict]
+        """
+        if not self.manifest_path:
+            return
+        manifest_dir = os.path.dirname(self.manifest_path)
+        try:
+            if not os.path.exists(manifest_dir):
+                os.makedirs(manifest_dir)
+            temp_path = '{}.{}.tmp'.format(self.manifest_path, os.getpid())
+            with open(temp_path, 'w') as f:
+                json.dump({'version': self.manifest_version, 'checkers_dir': self.checkers_dir, 'modules': modules}, f)
+            os.rename(temp_path, self.manifest_path)
+        except (IOError, OSError):
+            # Just scan again next time
+            pass
@@ -0,0 +1,269 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Report results of checkers after all of them have finished.
+# Results are rendered in the order `run_checkers` returns them, so the report is the same however checkers run.
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
+import io
+import json
+import os
+import sys
+import six
+from six.moves.urllib.parse import quote
+from taskr import Console
+from submarine_githooks.constants import report_formats
+
+# Files listed for a group of failures in human reports
+max_listed_files = 10
+sarif_version = '2.1.0'
+sarif_schema = 'https://json.schemastore.org/sarif-2.1.0.json'
+# File paths in SARIF logs are relative to the root of the repo
+sarif_uri_base_id = '%SRCROOT%'
+
+
+def buffered_console(color=True):
+    """
+    A console writing to memory, like `taskr.console` does to stdout, so many messages are written at once.
+
+    :param color: whether messages are colored by ANSI escape codes
+    :type color: bool
+    :rtype: (taskr.Console, io.StringIO)
+    """
+    buffer_ = io.StringIO()
+    return Console(buffer_, color=color), buffer_
+
+
+def sarif_uri(file_path):
+    """
+    A relative URI reference of the file, where spaces, `#`, `%` and non-ASCII characters are percent-encoded.
+
+    :type file_path: str
+    :rtype: str
+    """
+    return six.text_type(quote(file_path.replace(os.sep, '/').encode('utf-8')))
+
+
+class FailureGroup(object):
+    """
+    Failures of a checker with the same message, like a missing license header in many files.
+    """
+
+    def __init__(self, checker, message):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :param message: the message of the exception
+        :type message: str
+        """
+        self.checker = checker
+        self.message = message
+        self.results = []
+        """:type: list[submarine_githooks.engine.CheckResult]"""
+
+    @property
+    def file_paths(self):
+        """
+        :rtype: list[str]
+        """
+        return [result.content.file_path for result in self.results
+                if result.content is not None and result.content.file_path]
+
+
+class HookReport(object):
+    """
+    Results of a hook, which are rendered as messages for humans, JSON lines or SARIF.
+    """
+
+    def __init__(self, hook_name, results, debug=False, max_failures=20):
+        """
+        :type hook_name: str
+        :type results: list[submarine_githooks.engine.CheckResult]
+        :param debug: also report inactive and passed checks, for human
+        :type debug: bool
+        :param max_failures: groups of failures shown to human. The rest are counted only. 0 means no limit.
+        :type max_failures: int
+        """
+        self.hook_name = hook_name
+        self.results = results
+        self.debug = debug
+        self.max_failures = max_failures
+        self.skipped_count = 0
+        self.cached_count = 0
+        self.checked_count = 0
+
+        groups = OrderedDict()
+        for result in results:
+            if result.skipped:
+                self.skipped_count += 1
+            elif result.cached:
+                self.cached_count += 1
+            elif result.active and (result.content is not None or result.checker.once):
+                # Invocations of batch checkers are counted by their files
+                self.checked_count += 1
+            if result.failed:
+                message = six.text_type(result.exception)
+                group = groups.get((result.checker, message))
+                if group is None:
+                    group = groups[result.checker, message] = FailureGroup(result.checker, message)
+                group.results.append(result)
+        self.failure_groups = list(groups.values())
+        """:type: list[FailureGroup]"""
+
+    @property
+    def failed(self):
+        return bool(self.failure_groups)
+
+    def render(self, report_format):
+        """
+        :param report_format: one of `report_formats`
+        :type report_format: str
+        :rtype: str
+        """
+        if report_format not in report_formats:
+            raise ValueError('Invalid report format. got "{}" Choices={{{}}}'.format(report_format,
+                                                                                   ','.join(report_formats)))
+        return getattr(self, 'render_{}'.format(report_format))()
+
+    def render_human(self, color=True):
+        """
+        :param color: whether messages are colored, which they aren't in files
+        :type color: bool
+        :rtype: str
+        """
+        console, buffer_ = buffered_console(color)
+        if self.debug:
+            for result in self.results:
+                if result.skipped or result.failed:
+                    continue
+                elif not result.active:
+                    console.success(result.content.inactive_message(result.checker))
+                elif result.content is None:
+                    console.success('{} checker success'.format(result.checker.name))
+                elif result.cached:
+                    console.success('{} (cached)'.format(result.content.success_message(result.checker)))
+                else:
+                    console.success(result.content.success_message(result.checker))
+
+        shown_groups = self.failure_groups
+        if self.max_failures and len(shown_groups) > self.max_failures:
+            shown_groups = shown_groups[:self.max_failures]
+        for group in shown_groups:
+            result = group.results[0]
+            if result.content is None:
+                message = group.message
+            elif len(group.results) == 1:
+                message = result.content.error_message(result.checker, result.exception)
+            else:
+                file_paths = [result.content.rel_file_path for result in group.results[:max_listed_files]]
+                if len(group.results) > max_listed_files:
+                    file_paths.append('and {} more'.format(len(group.results) - max_listed_files))
+                message = 'files ({}): {}\n{}'.format(len(group.results), ', '.join(file_paths), group.message)
+            console.show('')
+            console.error('{} hook fails\nchecker: {}\n{}'.format(self.hook_name, group.checker.name, message))
+        hidden_groups = self.failure_groups[len(shown_groups):]
+        if hidden_groups:
+            console.show('')
+            console.warn('{} more failures are not shown. Set `max_failures` to 0 to show all of them.'.format(
+                sum(len(group.results) for group in hidden_groups)))
+
+        if self.skipped_count:
+            console.show('')
+            console.warn('Stopped at the first failure. {} checks are skipped.'.format(self.skipped_count))
+        return buffer_.getvalue()
+
+    def render_jsonl(self):
+        """
+        A line for each group of failures, then a line of counts.
+
+        :rtype: str
+        """
+        lines = []
+        for group in self.failure_groups:
+            lines.append(OrderedDict((
+                ('type', 'failure'),
+                ('hook', self.hook_name),
+                ('checker', group.checker.name),
+                ('files', group.file_paths),
+                ('message', group.message),
+            )))
+        lines.append(OrderedDict((
+            ('type', 'summary'),
+            ('hook', self.hook_name),
+            ('checked', self.checked_count),
+            ('cached', self.cached_count),
+            ('skipped', self.skipped_count),
+            ('failed', sum(len(group.results) for group in self.failure_groups)),
+        )))
+        return ''.join('{}\n'.format(json.dumps(line, ensure_ascii=False)) for line in lines)
+
+    def render_sarif(self):
+        """
+        A SARIF log, where a group of failures is a result with a location for each file.
+
+        :rtype: str
+        """
+        rules = OrderedDict()
+        sarif_results = []
+        for group in self.failure_groups:
+            rules.setdefault(group.checker.name, OrderedDict((
+                ('id', group.checker.name),
+                ('shortDescription', OrderedDict((('text', (group.checker.__doc__ or group.checker.name).strip()),))),
+            )))
+            sarif_result = OrderedDict((
+                ('ruleId', group.checker.name),
+                ('level', 'error'),
+                ('message', OrderedDict((('text', group.message),))),
+            ))
+            if group.file_paths:
+                sarif_result['locations'] = [
+                    OrderedDict((('physicalLocation', OrderedDict((
+                        ('artifactLocation', OrderedDict((('uri', sarif_uri(file_path)),
+                                                          ('uriBaseId', sarif_uri_base_id)))),
+                    ))),))
+                    for file_path in group.file_paths
+                ]
+            sarif_results.append(sarif_result)
+        log = OrderedDict((
+            ('$schema', sarif_schema),
+            ('version', sarif_version),
+            ('runs', [OrderedDict((
+                ('tool', OrderedDict((('driver', OrderedDict((
+                    ('name', 'submarine-githooks'),
+                    ('rules', list(rules.values())),
+                ))),))),
+                ('automationDetails', OrderedDict((('id', '{}/'.format(self.hook_name)),))),
+                ('results', sarif_results),
+            ))]),
+        ))
+        return json.dumps(log, indent=2, ensure_ascii=False) + '\n'
+
+    def write(self, report_format, path=''):
+        """
+        :type report_format: str
+        :param path: the file to write to. Empty string means stdout.
+        :type path: str
+        """
+        if path and report_format == 'human':
+            rendered = self.render_human(color=False)
+        else:
+            rendered = self.render(report_format)
+        if path:
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(rendered)
+        else:
+            sys.stdout.write(rendered)
+            sys.stdout.flush()
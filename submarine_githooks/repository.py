@@ -0,0 +1,746 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+import codecs
+import io
+import mmap
+import os
+import re
+import subprocess
+import threading
+import six
+from taskr.contrib.git import GitRepo
+from submarine_githooks.content import LineRanges
+
+Blob = namedtuple('Blob', ('sha', 'type', 'size', 'data'))
+"""`data` is None if the content has not been loaded into memory."""
+
+null_sha = '0' * 40
+
+empty_tree_sha = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+"""The tree of no files, to diff against when there's no previous commit."""
+
+
+class Change(namedtuple('Change', ('status', 'path', 'old_path', 'mode', 'sha', 'old_mode', 'old_sha'))):
+    """
+    A changed file. `status` is one letter like `M` or `R`, and `old_path` is the source of a rename or copy, else None.
+    `mode` (like `100644`) and `sha` are of the blob after the change, and `old_mode` and `old_sha` are before it.
+    The sha of a side without the file is `null_sha`.
+    """
+
+    __slots__ = ()
+
+    @property
+    def added(self):
+        return self.status == 'A'
+
+    @property
+    def deleted(self):
+        return self.status == 'D'
+
+    @property
+    def modified(self):
+        return self.status in 'MT'
+
+    @property
+    def renamed(self):
+        return self.status == 'R'
+
+    @property
+    def copied(self):
+        return self.status == 'C'
+
+
+class TreeDiff(object):
+    """
+    Changes between two commits, from a single `git diff-tree`. Changes are read lazily, and kept for later lookup.
+    """
+
+    def __init__(self, git_repo, commit, another_commit):
+        """
+        :type git_repo: Repository
+        :param commit: the commit before changes. `null_sha` means no commit.
+        :type commit: str
+        :param another_commit: the commit after changes
+        :type another_commit: str
+        """
+        self.commit = commit
+        self.another_commit = another_commit
+        self._changes = []
+        """:type: list[Change]"""
+        self._changes_by_path = {}
+        """:type: dict[str, Change]"""
+        self.git_repo = git_repo
+        self._iterator = git_repo.iter_raw_changes(['diff-tree', '-r', empty_tree_sha if commit == null_sha else commit,
+                                                    another_commit])
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Sent to worker processes along with contents. The `git diff-tree` process and the lock stay here, and changes
+        # are read again there.
+        return TreeDiff, (self.git_repo, self.commit, self.another_commit)
+
+    def _read_next(self):
+        """
+        :return: False if all changes have been read
+        :rtype: bool
+        """
+        with self._lock:
+            if self._iterator is None:
+                return False
+            change = next(self._iterator, None)
+            if change is None:
+                self._iterator = None
+                return False
+            self._changes.append(change)
+            self._changes_by_path[change.path] = change
+            return True
+
+    def __iter__(self):
+        index = 0
+        while index < len(self._changes) or self._read_next():
+            yield self._changes[index]
+            index += 1
+
+    def get(self, path):
+        """
+        :type path: str
+        :return: the change of the path, or None if it's not changed
+        :rtype: Change | None
+        """
+        while path not in self._changes_by_path and self._read_next():
+            pass
+        return self._changes_by_path.get(path)
+
+object_types = ('blob', 'tree', 'commit', 'tag')
+
+hunk_header_regex = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+def unquote_path(path):
+    """
+    Paths with special characters are quoted by git like C strings, i.e. `"\303\251.txt"`.
+
+    :type path: str
+    :rtype: str
+    """
+    if not path.startswith('"'):
+        return path
+    return codecs.escape_decode(path[1:-1].encode('utf-8'))[0].decode('utf-8')
+
+
+class PushRange(object):
+    """
+    Commits pushed to a remote ref, and files changed by them. Everything is read lazily and only once.
+    """
+
+    def __init__(self, git_repo, local_commit, remote_commit, remote_name=None):
+        """
+        :type git_repo: Repository
+        :param local_commit: the commit to push. `null_sha` if the remote ref is being deleted.
+        :type local_commit: str
+        :param remote_commit: the commit the remote ref is at. `null_sha` if it's a new branch.
+        :type remote_commit: str
+        :param remote_name: commits on remote-tracking branches of this remote are not counted as pushed ones for a new
+                            branch. All remotes if None.
+        :type remote_name: str | None
+        """
+        self.git_repo = git_repo
+        self.local_commit = local_commit
+        self.remote_commit = remote_commit
+        self.remote_name = remote_name
+        self._parents = None
+        """:type: OrderedDict[str, list[str]]"""
+        self._base = None
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Sent to worker processes with pre-push contents. Commits are listed again there when asked.
+        return PushRange, (self.git_repo, self.local_commit, self.remote_commit, self.remote_name)
+
+    @property
+    def deleted(self):
+        return self.local_commit == null_sha
+
+    @property
+    def new_branch(self):
+        return self.remote_commit == null_sha
+
+    def _load(self):
+        with self._lock:
+            if self._parents is not None:
+                return
+            lines = []
+            if self.deleted:
+                self._base = self.local_commit
+            elif not self.new_branch:
+                try:
+                    lines = list(self.git_repo.iter_git_output(
+                        ['rev-list', '--parents', '{}..{}'.format(self.remote_commit, self.local_commit)],
+                        separator=b'\n'))
+                    self._base = self.remote_commit
+                except ValueError:
+                    # The remote commit is not here, like the remote ref has been updated by others.
+                    pass
+            if self._base is None:
+                remotes_option = '--remotes={}'.format(self.remote_name) if self.remote_name else '--remotes'
+                lines = list(self.git_repo.iter_git_output(
+                    ['rev-list', '--parents', self.local_commit, '--not', remotes_option], separator=b'\n'))
+            self._parents = OrderedDict((line.split(' ')[0], line.split(' ')[1:]) for line in lines if line)
+            if self._base is None:
+                # The parent of the oldest pushed commit
+                oldest_parents = self._parents[next(reversed(self._parents))] if self._parents else None
+                if oldest_parents is None:
+                    self._base = self.local_commit
+                else:
+                    self._base = oldest_parents[0] if oldest_parents else null_sha
+
+    @property
+    def commits(self):
+        """
+        :return: pushed commits, newest first, like `git rev-list`
+        :rtype: list[str]
+        """
+        self._load()
+        return list(self._parents)
+
+    def parents(self, commit):
+        """
+        :type commit: str
+        :rtype: list[str]
+        """
+        self._load()
+        return self._parents[commit]
+
+    @property
+    def base(self):
+        """
+        :return: the commit pushed changes are compared with, which is the remote commit if it's known.
+        :rtype: str
+        """
+        self._load()
+        return self._base
+
+    def changes(self):
+        """
+        Files changed by the whole push, from one `git diff-tree`.
+
+        :rtype: TreeDiff | list[Change]
+        """
+        if self.deleted:
+            return []
+        return self.git_repo.diff(self.base, self.local_commit)
+
+    def commit_changes(self, commit):
+        """
+        Files changed by one of pushed commits, compared with its first parent.
+
+        :type commit: str
+        :rtype: TreeDiff
+        """
+        parents = self.parents(commit)
+        return self.git_repo.diff(parents[0] if parents else null_sha, commit)
+
+
+class BlobReader(object):
+    """
+    Read objects through a long-lived `git cat-file --batch` process, so reading N objects costs one fork instead of N.
+    """
+
+    def __init__(self, source_root):
+        """
+        :type source_root: str
+        """
+        self.source_root = source_root
+        self._processes = {}
+        """:type: dict[str, subprocess.Popen]"""
+        self._lock = threading.Lock()
+
+    def _process(self, mode):
+        """
+        :param mode: `--batch` or `--batch-check`
+        :type mode: str
+        :rtype: subprocess.Popen
+        """
+        process = self._processes.get(mode)
+        if process is None or process.poll() is not None:
+            process = self._processes[mode] = subprocess.Popen(['git', 'cat-file', mode], cwd=self.source_root,
+                                                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return process
+
+    def read(self, object_names):
+        """
+        Read objects in one round trip.
+
+        :param object_names: names understood by git, like `<sha>`, `:<path>` (the index) or `<commit>:<path>`
+        :type object_names: collections.Iterable[str]
+        :return: blobs in the order of given names. None for objects which don't exist.
+        :rtype: list[Blob | None]
+        """
+        return self._request('--batch', object_names)
+
+    def info(self, object_names):
+        """
+        Like `read`, but only sha, type and size of objects are returned. `data` of returned blobs is None.
+
+        :type object_names: collections.Iterable[str]
+        :rtype: list[Blob | None]
+        """
+        return self._request('--batch-check', object_names)
+
+    def stream(self, sha):
+        """
+        Read a (large) object chunk by chunk, through a `git cat-file blob` process for this object only.
+
+        :type sha: str
+        :rtype: BlobStream
+        """
+        return BlobStream(subprocess.Popen(['git', 'cat-file', 'blob', sha], cwd=self.source_root,
+                                           stdout=subprocess.PIPE))
+
+    def _request(self, mode, object_names):
+        """
+        :type mode: str
+        :type object_names: collections.Iterable[str]
+        :rtype: list[Blob | None]
+        """
+        object_names = list(object_names)
+        # Names with line breaks cannot be expressed in the batch protocol.
+        requests = [object_name for object_name in object_names if '\n' not in object_name]
+        if not requests:
+            return [None] * len(object_names)
+
+        with self._lock:
+            process = self._process(mode)
+            # Write requests in another thread, or both sides may block on full pipes.
+            writer = threading.Thread(target=self._write_requests, args=(process.stdin, requests))
+            writer.daemon = True
+            writer.start()
+            responses = dict((request, self._read_response(process.stdout, mode == '--batch'))
+                             for request in requests)
+            writer.join()
+        return [responses.get(object_name) for object_name in object_names]
+
+    @staticmethod
+    def _write_requests(stdin, requests):
+        stdin.write(''.join('{}\n'.format(request) for request in requests).encode('utf-8'))
+        stdin.flush()
+
+    @staticmethod
+    def _read_response(stdout, with_data):
+        """
+        :rtype: Blob | None
+        """
+        header = stdout.readline()
+        if not header:
+            raise IOError('git cat-file exits unexpectedly.')
+        fields = header.decode('utf-8').rstrip('\n').split(' ')
+        if len(fields) != 3 or fields[1] not in object_types:
+            # `<name> missing` or `<name> ambiguous`
+            return None
+
+        sha, object_type, size = fields
+        size = int(size)
+        data = None
+        if with_data:
+            data = stdout.read(size)
+            stdout.read(1)  # trailing line feed
+        return Blob(sha, object_type, size, data)
+
+    def close(self):
+        for process in self._processes.values():
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+        self._processes.clear()
+
+
+class BlobStream(object):
+    """
+    A read-only file-like object over the stdout of a `git cat-file blob` process.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, process):
+        """
+        :type process: subprocess.Popen
+        """
+        self._process = process
+
+    def read(self, size=-1):
+        """
+        :type size: int
+        :rtype: bytes
+        """
+        return self._process.stdout.read(size)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._process.stdout.close()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Repository(GitRepo):
+    """
+    A GitRepo which reads file contents through a shared `BlobReader` and keeps what it has read.
+    """
+
+    def __init__(self, source_root=None, max_blob_cache_size=1024 * 1024):
+        """
+        :type source_root: str | None
+        :param max_blob_cache_size: blobs larger than this (in bytes) are never held in memory, but streamed
+        :type max_blob_cache_size: int
+        """
+        super(Repository, self).__init__(source_root)
+        self.max_blob_cache_size = max_blob_cache_size
+        self.blob_reader = BlobReader(self.source_root)
+        self._blobs = {}
+        """:type: dict[str, Blob | None]"""
+        self._diffs = {}
+        """:type: dict[(str, str), TreeDiff]"""
+        self._push_ranges = {}
+        """:type: dict[(str, str, str | None), PushRange]"""
+        self._modified_paths = {}
+        """:type: dict[str, frozenset[str]]"""
+
+    def __reduce__(self):
+        # Sent to worker processes. Reuse one repository (and its `git cat-file` process) per worker.
+        return shared_repository, (self.source_root, self.max_blob_cache_size)
+
+    @staticmethod
+    def object_name(path, commit=''):
+        """
+        :type path: str
+        :type commit: str
+        :rtype: str
+        """
+        return '{}:{}'.format(commit, path)
+
+    def preload(self, paths, commit=''):
+        """
+        Read blobs of paths. Sizes of all blobs are read in one round trip, and then contents of small ones in another.
+        Blobs larger than `max_blob_cache_size` are not loaded into memory, and blobs read before are not read again.
+
+        :type paths: collections.Iterable[str]
+        :param commit: the commit to read from. Empty string means the index.
+        :type commit: str
+        :rtype: list[Blob | None]
+        """
+        object_names = [self.object_name(path, commit) for path in paths]
+        # Blobs which have been read are not read again.
+        unread_object_names = [object_name for object_name in object_names if object_name not in self._blobs]
+        blobs = self.blob_reader.info(unread_object_names)
+        small_object_names = [object_name for object_name, blob in zip(unread_object_names, blobs)
+                              if blob and blob.size <= self.max_blob_cache_size]
+        self._blobs.update(zip(unread_object_names, blobs))
+        self._blobs.update(zip(small_object_names, self.blob_reader.read(small_object_names)))
+        return [self._blobs[object_name] for object_name in object_names]
+
+    def cached_blob(self, path, commit=''):
+        """
+        :type path: str
+        :type commit: str
+        :return: the blob if it has been read, without reading it
+        :rtype: Blob | None
+        """
+        return self._blobs.get(self.object_name(path, commit))
+
+    def blob(self, path, commit=''):
+        """
+        :type path: str
+        :type commit: str
+        :return: the blob, whose data is None if it's larger than `max_blob_cache_size`
+        :rtype: Blob | None
+        """
+        object_name = self.object_name(path, commit)
+        if object_name not in self._blobs:
+            self.preload([path], commit)
+        return self._blobs[object_name]
+
+    def file_content(self, path, commit=''):
+        """
+        :type path: str
+        :type commit: str
+        :rtype: str | bytes
+        """
+        blob = self.blob(path, commit)
+        if blob is None:
+            return super(Repository, self).file_content(path, commit)
+        elif blob.data is None:
+            return self.blob_reader.read([blob.sha])[0].data
+        return blob.data
+
+    def open_file_content(self, path, commit=''):
+        """
+        Open content of a file as a read-only file-like object. Large files are streamed but not loaded into memory.
+
+        :type path: str
+        :type commit: str
+        :rtype: io.BytesIO | BlobStream
+        """
+        blob = self.blob(path, commit)
+        if blob is None:
+            raise IOError('No such file in git: {}'.format(self.object_name(path, commit)))
+        elif blob.data is None:
+            return self.blob_reader.stream(blob.sha)
+        return io.BytesIO(blob.data)
+
+    def iter_file_content(self, path, commit='', chunk_size=BlobStream.chunk_size):
+        """
+        :type path: str
+        :type commit: str
+        :type chunk_size: int
+        :rtype: collections.Iterator[bytes]
+        """
+        f = self.open_file_content(path, commit)
+        try:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    def locally_modified_paths(self, commit=''):
+        """
+        Files in the working tree which differ from the commit, from one `git diff --name-only` kept for the hook.
+        Right after a checkout or a merge, these are files with local changes carried over.
+
+        :param commit: the commit to compare with. Empty string means the index.
+        :type commit: str
+        :rtype: frozenset[str]
+        """
+        if commit not in self._modified_paths:
+            args = ['diff', '--name-only', '--no-renames', '-z'] + ([commit] if commit else []) + ['--']
+            self._modified_paths[commit] = frozenset(path for path in self.iter_git_output(args) if path)
+        return self._modified_paths[commit]
+
+    def _map_working_tree_file(self, path, commit=''):
+        """
+        :type path: str
+        :type commit: str
+        :return: the file in the working tree mapped into memory, or None if it's not the same as the one in git
+        :rtype: mmap.mmap | None
+        """
+        if path in self.locally_modified_paths(commit):
+            return None
+        file_path = os.path.join(self.source_root, path)
+        if os.path.islink(file_path) or not os.path.isfile(file_path):
+            return None
+        size = os.path.getsize(file_path)
+        blob = self.cached_blob(path, commit) or self.blob_reader.info([self.object_name(path, commit)])[0]
+        if size == 0 or blob is None or blob.size != size:
+            # Empty files cannot be mapped. A size not the same as the blob's means the file is converted by filters,
+            # like line endings or Git LFS, which `git diff` doesn't report.
+            return None
+        with io.open(file_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @contextmanager
+    def map_file_content(self, path, commit=''):
+        """
+        Content of a file as a read-only memoryview, which isn't copied. When the file in the working tree is the same
+        as the one in the commit, like after `post-checkout` and `post-merge`, it's mapped into memory without running
+        git. Otherwise the blob is read like `file_content` does.
+        The view should not be used after leaving the `with` block.
+
+        :type path: str
+        :param commit: the commit to read from. Empty string means the index.
+        :type commit: str
+        :rtype: memoryview
+        """
+        mapped = self._map_working_tree_file(path, commit)
+        if mapped is None:
+            view = memoryview(self.file_content(path, commit))
+        else:
+            # Python 2 cannot make a memoryview of mmap, which supports slicing and searching like bytes anyway.
+            view = memoryview(mapped) if six.PY3 else mapped
+        try:
+            yield view
+        finally:
+            if six.PY3:
+                view.release()
+            if mapped is not None:
+                try:
+                    mapped.close()
+                except BufferError:
+                    # Slices of the view are still alive. It's unmapped when they are collected.
+                    pass
+
+    def iter_git_output(self, args, separator=b'\0', errors='strict'):
+        """
+        Run a git command and yield its output piece by piece as it is produced, instead of waiting for it to exit.
+
+        :type args: list[str]
+        :type separator: bytes
+        :param errors: how to handle output which isn't UTF-8, like `bytes.decode`
+        :type errors: str
+        :rtype: collections.Iterator[str]
+        """
+        process = subprocess.Popen(['git'] + args, cwd=self.source_root,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            pending = b''
+            while True:
+                chunk = os.read(process.stdout.fileno(), BlobStream.chunk_size)
+                if not chunk:
+                    break
+                pieces = (pending + chunk).split(separator)
+                pending = pieces.pop()
+                for piece in pieces:
+                    yield piece.decode('utf-8', errors)
+            if pending:
+                yield pending.decode('utf-8', errors)
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise ValueError('Failed to run git command at "{}". stderr={}'.format(
+                    self.source_root, stderr.decode('utf-8', 'replace').strip()))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def iter_raw_changes(self, args):
+        """
+        Run a git diff command with `--raw` output, and yield its changes as they are produced.
+
+        :param args: like `['diff-tree', '-r', 'HEAD^', 'HEAD']`
+        :type args: list[str]
+        :rtype: collections.Iterator[Change]
+        """
+        fields = self.iter_git_output(args + ['--raw', '--no-abbrev', '-z', '--find-renames'])
+        for header in fields:
+            # `:<old mode> <new mode> <old sha> <new sha> <status><score>`
+            old_mode, mode, old_sha, sha, status = header.lstrip(':').split(' ')
+            status = status[:1]  # Drop the similarity score of renames and copies
+            old_path = next(fields) if status in 'RC' else None
+            yield Change(status, next(fields), old_path, mode, sha, old_mode, old_sha)
+
+    def staged_changes(self, diff_filter='ACMRT'):
+        """
+        Changes in the index against HEAD, from `git diff --cached`, which doesn't look into the working tree.
+        Renames are detected, and yield the new path.
+
+        :param diff_filter: statuses of changes to yield, like `--diff-filter`
+        :type diff_filter: str
+        :rtype: collections.Iterator[Change]
+        """
+        return self.iter_raw_changes(['diff', '--cached', '--diff-filter={}'.format(diff_filter)])
+
+    def diff(self, commit, another_commit):
+        """
+        Changes between two commits. Diffs are shared, so checkers could look up changes without running git again.
+
+        :type commit: str
+        :type another_commit: str
+        :rtype: TreeDiff
+        """
+        key = (commit, another_commit)
+        if key not in self._diffs:
+            self._diffs[key] = TreeDiff(self, commit, another_commit)
+        return self._diffs[key]
+
+    def staged_line_ranges(self, diff_filter='ACMRT'):
+        """
+        Lines added or modified in the index against HEAD, from a single `git diff --cached -U0`.
+
+        :type diff_filter: str
+        :return: file path => changed lines. Files without line changes, like binary files or pure renames, are empty.
+        :rtype: dict[str, LineRanges]
+        """
+        ranges = {}
+        """:type: dict[str, list[(int, int)]]"""
+        current_ranges = None
+        # Paths are always quoted, so they survive decoding of file contents which may not be UTF-8.
+        for line in self.iter_git_output(['-c', 'core.quotePath=true', 'diff', '--cached', '-U0', '--no-color',
+                                          '--no-ext-diff', '--no-prefix', '--find-renames',
+                                          '--diff-filter={}'.format(diff_filter)],
+                                         separator=b'\n', errors='replace'):
+            if line.startswith('diff --git '):
+                current_ranges = None
+            elif line.startswith('+++ ') and current_ranges is None:
+                current_ranges = ranges.setdefault(unquote_path(line[4:].rstrip('\t')), [])
+            elif line.startswith('@@ ') and current_ranges is not None:
+                match = hunk_header_regex.match(line)
+                if match:
+                    start, count = match.groups()
+                    current_ranges.append((int(start), 1 if count is None else int(count)))
+        return dict((path, LineRanges(path_ranges)) for path, path_ranges in ranges.items())
+
+    def push_range(self, local_commit, remote_commit, remote_name=None):
+        """
+        Commits and files pushed to a remote ref, shared by all checkers.
+
+        :type local_commit: str
+        :type remote_commit: str
+        :type remote_name: str | None
+        :rtype: PushRange
+        """
+        key = (local_commit, remote_commit, remote_name)
+        if key not in self._push_ranges:
+            self._push_ranges[key] = PushRange(self, local_commit, remote_commit, remote_name)
+        return self._push_ranges[key]
+
+    def reset_after_fork(self):
+        """
+        Forget `git` processes and locks inherited by a forked process, which still belong to the parent.
+        New ones are started when needed. Blobs read are kept.
+        """
+        self.blob_reader = BlobReader(self.source_root)
+        self._diffs = {}
+        self._push_ranges = {}
+
+    def close(self):
+        self.blob_reader.close()
+        self._blobs.clear()
+        self._diffs.clear()
+        self._push_ranges.clear()
+        self._modified_paths.clear()
+
+
+_shared_repositories = {}
+""":type: dict[str, Repository]"""
+
+
+def shared_repository(source_root, max_blob_cache_size=1024 * 1024):
+    """
+    :type source_root: str
+    :type max_blob_cache_size: int
+    :rtype: Repository
+    """
+    if source_root not in _shared_repositories:
+        _shared_repositories[source_root] = Repository(source_root)
+    _shared_repositories[source_root].max_blob_cache_size = max_blob_cache_size
+    return _shared_repositories[source_root]
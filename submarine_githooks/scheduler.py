@@ -0,0 +1,128 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import json
+import os
+from submarine_githooks.constants import schedule_modes
+
+
+class CheckerCosts(object):
+    """
+    Wall time per invocation of checkers, measured by previous runs and smoothed by exponential moving average.
+    """
+
+    def __init__(self, path, smoothing=0.3):
+        """
+        :type path: str
+        :param smoothing: weight of the latest measurement
+        :type smoothing: float
+        """
+        self.path = path
+        self.smoothing = smoothing
+        self._entries = None
+        """:type: dict[str, float]"""
+        self._dirty = False
+
+    @property
+    def entries(self):
+        """
+        :return: checker name => seconds per invocation
+        :rtype: dict[str, float]
+        """
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                # noinspection PyBroadException
+                try:
+                    with open(self.path, 'r') as f:
+                        self._entries = dict(json.load(f))
+                except Exception:
+                    self._entries = {}
+        return self._entries
+
+    def cost(self, checker):
+        """
+        :type checker: submarine_githooks.checker.Checker
+        :return: the declared cost of the checker, or the measured one. None if unknown.
+        :rtype: float | None
+        """
+        if checker.cost is not None:
+            return checker.cost
+        return self.entries.get(checker.name)
+
+    def update(self, results):
+        """
+        :type results: list[submarine_githooks.engine.CheckResult]
+        """
+        totals = {}
+        for result in results:
+            if not result.active or result.cached or result.batched or result.skipped:
+                continue
+            total = totals.setdefault(result.checker.name, [0.0, 0])
+            total[0] += result.wall_time
+            total[1] += 1
+        for name, (wall_time, calls) in totals.items():
+            measured = wall_time / calls
+            previous = self.entries.get(name)
+            self.entries[name] = measured if previous is None else (self.smoothing * measured +
+                                                                    (1 - self.smoothing) * previous)
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        costs_dir = os.path.dirname(self.path)
+        if not os.path.exists(costs_dir):
+            os.makedirs(costs_dir)
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.rename(temp_path, self.path)
+        self._dirty = False
+
+
+def schedule(checkers, mode='cost', costs=None):
+    """
+    Decide the order to invoke checkers. Checkers with higher priority go first, and then cheaper ones.
+    The sort is stable, so invocations of the same checker keep the order of contents.
+
+    :param checkers: the checker of each invocation
+    :type checkers: list[submarine_githooks.checker.Checker]
+    :param mode: `cost` to order by priority and cost, or `declared` to keep the given order
+    :type mode: str
+    :type costs: CheckerCosts | None
+    :return: indexes of invocations in the order to run
+    :rtype: list[int]
+    """
+    if mode not in schedule_modes:
+        raise ValueError('Invalid schedule mode. got "{}" Choices={{{}}}'.format(mode, ','.join(schedule_modes)))
+    indexes = list(range(len(checkers)))
+    if mode == 'declared':
+        return indexes
+
+    checker_costs = dict((checker, costs.cost(checker) if costs is not None else checker.cost)
+                         for checker in set(checkers))
+    # Checkers never measured are assumed to be as costly as others on average, and go after them on ties.
+    known_costs = [cost for cost in checker_costs.values() if cost is not None]
+    default_cost = sum(known_costs) / len(known_costs) if known_costs else 0.0
+
+    def sort_key(index):
+        checker = checkers[index]
+        cost = checker_costs[checker]
+        return -checker.priority, default_cost if cost is None else cost, cost is None
+
+    return sorted(indexes, key=sort_key)
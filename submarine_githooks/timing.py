@@ -0,0 +1,208 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+from collections import OrderedDict
+import csv
+import io
+import json
+import os
+import time
+import six
+
+# CPU time of the current thread if possible, since checkers may run in a thread pool.
+cpu_time = getattr(time, 'thread_time', None) or getattr(time, 'process_time', None) or time.clock
+
+
+class Timer(object):
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self._started_at = None
+
+    def start(self):
+        self._started_at = (time.time(), cpu_time())
+
+    def stop(self):
+        self.wall_time = time.time() - self._started_at[0]
+        self.cpu_time = cpu_time() - self._started_at[1]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def result_status(result):
+    """
+    :type result: submarine_githooks.engine.CheckResult
+    :rtype: str
+    """
+    if not result.active:
+        return 'inactive'
+    elif result.cached:
+        return 'cached'
+    elif result.skipped:
+        return 'skipped'
+    return 'failed' if result.failed else 'passed'
+
+
+def result_content_name(result):
+    """
+    :type result: submarine_githooks.engine.CheckResult
+    :rtype: str
+    """
+    if result.content is None:
+        return '*'
+    return result.content.file_path or ' '.join(map(six.text_type, result.content.arguments))
+
+
+class Timings(object):
+    """
+    Wall and CPU time of phases of a hook, and of each checker invocation.
+    """
+
+    def __init__(self, hook_name):
+        """
+        :type hook_name: str
+        """
+        self.hook_name = hook_name
+        self.phases = OrderedDict()
+        """:type: OrderedDict[str, Timer]"""
+        self.results = []
+        """:type: list[submarine_githooks.engine.CheckResult]"""
+        self._current_phase = None
+        """:type: Timer | None"""
+
+    def start_phase(self, name):
+        """
+        Start timing a phase, and stop the previous one.
+
+        :type name: str
+        """
+        self.stop_phase()
+        self._current_phase = self.phases[name] = Timer()
+        self._current_phase.start()
+
+    def stop_phase(self):
+        if self._current_phase is not None:
+            self._current_phase.stop()
+            self._current_phase = None
+
+    @property
+    def wall_time(self):
+        return sum(timer.wall_time for timer in self.phases.values())
+
+    def checker_totals(self):
+        """
+        :return: checker name => {'calls': int, 'wall_time': float, 'cpu_time': float, 'max_wall_time': float}
+        :rtype: OrderedDict[str, dict]
+        """
+        totals = OrderedDict()
+        for result in self.results:
+            if not result.active or result.cached or result.batched or result.skipped:
+                continue
+            total = totals.setdefault(result.checker.name,
+                                      {'calls': 0, 'wall_time': 0.0, 'cpu_time': 0.0, 'max_wall_time': 0.0})
+            total['calls'] += 1
+            total['wall_time'] += result.wall_time
+            total['cpu_time'] += result.cpu_time
+            total['max_wall_time'] = max(total['max_wall_time'], result.wall_time)
+        return totals
+
+    def content_totals(self):
+        """
+        :return: content name => {'wall_time': float, 'cpu_time': float}
+        :rtype: OrderedDict[str, dict]
+        """
+        totals = OrderedDict()
+        for result in self.results:
+            if (result.content is None or not result.active or result.cached or result.batched or
+                    result.skipped):
+                continue
+            total = totals.setdefault(result_content_name(result), {'wall_time': 0.0, 'cpu_time': 0.0})
+            total['wall_time'] += result.wall_time
+            total['cpu_time'] += result.cpu_time
+        return totals
+
+    def as_dict(self):
+        """
+        :rtype: dict
+        """
+        return OrderedDict((
+            ('hook', self.hook_name),
+            ('wall_time', self.wall_time),
+            ('phases', OrderedDict((name, {'wall_time': timer.wall_time, 'cpu_time': timer.cpu_time})
+                                   for name, timer in self.phases.items())),
+            ('checkers', self.checker_totals()),
+            ('contents', self.content_totals()),
+            ('calls', [OrderedDict((('checker', result.checker.name),
+                                    ('content', result_content_name(result)),
+                                    ('status', result_status(result)),
+                                    ('wall_time', result.wall_time),
+                                    ('cpu_time', result.cpu_time)))
+                       for result in self.results]),
+        ))
+
+    def write(self, path):
+        """
+        Write the report as CSV if the path ends with `.csv`, otherwise JSON.
+
+        :type path: str
+        """
+        report = self.as_dict()
+        if os.path.splitext(path)[-1].lower() == '.csv':
+            output = io.StringIO() if six.PY3 else io.BytesIO()
+            writer = csv.writer(output)
+            writer.writerow(['type', 'name', 'content', 'status', 'calls', 'wall_time', 'cpu_time'])
+            for name, phase in report['phases'].items():
+                writer.writerow(['phase', name, '', '', '', phase['wall_time'], phase['cpu_time']])
+            for name, total in report['checkers'].items():
+                writer.writerow(['checker', name, '', '', total['calls'], total['wall_time'], total['cpu_time']])
+            for call in report['calls']:
+                writer.writerow(['call', call['checker'], call['content'], call['status'], 1,
+                                 call['wall_time'], call['cpu_time']])
+            content = output.getvalue()
+        else:
+            content = json.dumps(report, indent=2)
+
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(content))
+
+    def summary(self, top=10):
+        """
+        :type top: int
+        :rtype: list[str]
+        """
+        lines = ['{} took {:.3f}s ({})'.format(self.hook_name, self.wall_time,
+                                               ', '.join('{} {:.3f}s'.format(name, timer.wall_time)
+                                                         for name, timer in self.phases.items()))]
+        checker_totals = sorted(self.checker_totals().items(), key=lambda item: item[1]['wall_time'], reverse=True)
+        for name, total in checker_totals[:top]:
+            lines.append('  {:8.3f}s wall {:8.3f}s cpu {:6d} calls  {}'.format(total['wall_time'], total['cpu_time'],
+                                                                             total['calls'], name))
+        slowest_calls = sorted((result for result in self.results
+                                if result.active and not result.cached and not result.batched and not result.skipped),
+                               key=lambda result: result.wall_time, reverse=True)
+        if slowest_calls:
+            lines.append('Slowest calls:')
+        for result in slowest_calls[:top]:
+            lines.append('  {:8.3f}s  {} with {}'.format(result.wall_time, result.checker.name,
+                                                       result_content_name(result)))
+        return lines
@@ -0,0 +1,102 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from submarine_githooks.config import ConfigError, HookConfig
+
+
+class HookConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.git_hooks_home = tempfile.mkdtemp(prefix='submarine-test-')
+        self.cache_path = os.path.join(self.git_hooks_home, 'config.pickle')
+
+    def tearDown(self):
+        shutil.rmtree(self.git_hooks_home)
+
+    def hook_config(self, data):
+        with io.open(os.path.join(self.git_hooks_home, 'config.json'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False))
+        return HookConfig(self.git_hooks_home, self.cache_path)
+
+    def test_defaults(self):
+        values, ignored = HookConfig(self.git_hooks_home).values('pre-commit', environ={})
+        self.assertEqual(values['jobs'], 1)
+        self.assertEqual(values['report_format'], 'human')
+        self.assertEqual(ignored, [])
+
+    def test_hook_options(self):
+        hook_config = self.hook_config({'jobs': 2, 'hooks': {'pre-push': {'jobs': 4}}})
+        self.assertEqual(hook_config.values('pre-commit', environ={})[0]['jobs'], 2)
+        self.assertEqual(hook_config.values('pre-push', environ={})[0]['jobs'], 4)
+        values, ignored = hook_config.values('pre-push', environ={'SUBMARINE_GITHOOK_JOBS': '8'})
+        self.assertEqual((values['jobs'], ignored), (8, []))
+
+    def test_unknown_keys(self):
+        # Typos and options of newer versions are ignored with messages, and known keys still apply
+        hook_config = self.hook_config({
+            'jbos': 2,
+            'jobs': 3,
+            'checkers': {'lint': {'timout': 3, 'enabled': False}},
+            'hooks': {'pre-comit': {'jobs': 1}, 'pre-push': {'colour': True, 'jobs': 4}},
+        })
+        values, ignored = hook_config.values('pre-push', environ={})
+        self.assertEqual(values['jobs'], 4)
+        self.assertEqual(len(ignored), 4)
+        for key in ('"jbos"', '"checkers.lint.timout"', '"pre-comit"', '"hooks.pre-push.colour"'):
+            self.assertTrue(any(key in message for message in ignored), key)
+        self.assertEqual(hook_config.checker_settings('lint', 'pre-push'), {'enabled': False})
+
+    def test_unknown_keys_from_cache(self):
+        self.hook_config({'jbos': 2}).values('pre-commit', environ={})
+        self.assertTrue(os.path.exists(self.cache_path))
+        _, ignored = HookConfig(self.git_hooks_home, self.cache_path).values('pre-commit', environ={})
+        self.assertEqual(len(ignored), 1)
+
+    def test_wrong_types(self):
+        for data in ({'jobs': 'many'}, {'jobs': True}, {'executor': 'fiber'}, {'checkers': ['lint']},
+                     {'checkers': {'lint': 'off'}}, {'checkers': {'lint': {'timeout': 'long'}}},
+                     {'hooks': {'pre-push': {'fail_fast': 1}}}, {'hooks': ['pre-push']}, ['jobs']):
+            with self.assertRaises(ConfigError):
+                self.hook_config(data).values('pre-push', environ={})
+
+    def test_invalid_environment_variables(self):
+        values, ignored = self.hook_config({'jobs': 2}).values('pre-commit', environ={'SUBMARINE_GITHOOK_JOBS': 'x'})
+        self.assertEqual(values['jobs'], 2)
+        self.assertEqual(len(ignored), 1)
+
+    def test_checker_patterns(self):
+        hook_config = self.hook_config({
+            'checkers': {'*': {'timeout': 10}, 'lint.*': False, 'lint.pylint': {'enabled': True, 'timeout': 30}},
+            'hooks': {'pre-push': {'checkers': {'lint.pylint': False}}},
+        })
+        self.assertTrue(hook_config.is_checker_enabled('lint.pylint', 'pre-commit', environ={}))
+        self.assertFalse(hook_config.is_checker_enabled('lint.flake8', 'pre-commit', environ={}))
+        self.assertFalse(hook_config.is_checker_enabled('lint.pylint', 'pre-push', environ={}))
+        self.assertEqual(hook_config.checker_settings('lint.pylint', 'pre-commit'), {'enabled': True, 'timeout': 30})
+        self.assertEqual(hook_config.checker_settings('docs.links', 'pre-commit'), {'timeout': 10})
+        self.assertFalse(hook_config.is_checker_enabled('docs.links', 'pre-commit',
+                                                        environ={'SUBMARINE_GITHOOK_SKIP': 'docs.*'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
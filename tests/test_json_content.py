@@ -0,0 +1,69 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import unittest
+from submarine_githooks.contrib.checkers.json_content import validate_json
+
+nested_document = '{"a": [1, -2.5e3, true, null, {"b": "x\\u00e9\\n\\"y"}], "é": {}, "c": [[]]}'.encode('utf-8')
+
+
+def _chunks(data, chunk_size):
+    return [data[index:index + chunk_size] for index in range(0, len(data), chunk_size)] or [b'']
+
+
+class JSONValidatorTest(unittest.TestCase):
+
+    def assert_error(self, data, message, chunk_sizes=(1, 2, 3, 1024)):
+        # The message doesn't depend on where chunks are split
+        for chunk_size in chunk_sizes:
+            with self.assertRaises(ValueError) as context:
+                validate_json(_chunks(data, chunk_size))
+            self.assertEqual(str(context.exception), message, chunk_size)
+
+    def test_nested(self):
+        validate_json([nested_document])
+        validate_json([b'\xef\xbb\xbf', b' [[[{"a": [{}]}]]] \n'])
+
+    def test_chunks(self):
+        # Chunks split every token, escape sequence and UTF-8 character somewhere
+        for chunk_size in range(1, len(nested_document) + 1):
+            validate_json(_chunks(nested_document, chunk_size))
+
+    def test_truncated(self):
+        for end in range(len(nested_document)):
+            for chunk_size in (1, 7, len(nested_document)):
+                with self.assertRaises(ValueError):
+                    validate_json(_chunks(nested_document[:end], chunk_size))
+
+    def test_truncated_messages(self):
+        self.assert_error(b'', 'Expecting value: line 1 column 1 (char 0)')
+        self.assert_error(b'{"a":1', "Expecting ',' delimiter: line 1 column 7 (char 6)")
+        self.assert_error(b'{"a"', "Expecting ':' delimiter: line 1 column 5 (char 4)")
+        self.assert_error(b'[1,\n  "ab', 'Unterminated string starting at: line 2 column 3 (char 6)')
+        self.assert_error(b'{"k": "v", "ke', 'Unterminated string starting at: line 1 column 12 (char 11)')
+
+    def test_invalid(self):
+        self.assert_error(b'[1,]', 'Expecting value: line 1 column 4 (char 3)')
+        self.assert_error(b'{"a" 1}', "Expecting ':' delimiter: line 1 column 6 (char 5)")
+        self.assert_error(b'[1] 2', 'Extra data: line 1 column 5 (char 4)')
+        self.assert_error(b'[tru]', 'Expecting value: line 1 column 2 (char 1)')
+        self.assert_error(b'"\\x"', 'Invalid \\escape: line 1 column 2 (char 1)')
+        self.assert_error(b'[1,\n{"a": [}]', 'Expecting value: line 2 column 8 (char 11)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import re
+import unittest
+from submarine_githooks.checker import Checker
+from submarine_githooks.matcher import FileMatcher
+
+
+def _checker_with_patterns(*patterns):
+    checker = Checker(lambda *args: None)
+    checker.add_file_filter('pattern', *(re.compile(pattern) for pattern in patterns))
+    return checker
+
+
+class FileMatcherTest(unittest.TestCase):
+
+    def assert_same_as_checkers(self, checkers, paths):
+        matcher = FileMatcher(checkers)
+        for path in paths:
+            self.assertEqual(matcher.match(path), set(checker for checker in checkers
+                                                      if checker.is_active_for_file(path)), path)
+
+    def test_patterns(self):
+        self.assert_same_as_checkers([_checker_with_patterns(r'\.py$'), _checker_with_patterns(r'^docs/', r'\.md$')],
+                                     ['a.py', 'docs/a.txt', 'README.md', 'a.txt'])
+
+    def test_patterns_with_backreferences(self):
+        # Combined into one pattern, `\1` of the second pattern would refer to the group of the first one.
+        self.assert_same_as_checkers([_checker_with_patterns(r'(x)\1'), _checker_with_patterns(r'(y)\1')],
+                                     ['xx', 'yy', 'xy'])
+
+    def test_patterns_with_named_groups(self):
+        self.assert_same_as_checkers([_checker_with_patterns(r'(?P<c>a)(?P=c)'), _checker_with_patterns(r'b')],
+                                     ['aa', 'b', 'ab'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import json
+import unittest
+from submarine_githooks.checker import Checker
+from submarine_githooks.content import Content
+from submarine_githooks.engine import CheckResult
+from submarine_githooks.report import HookReport, sarif_uri
+
+
+def _failed_result(checker, file_path, message):
+    result = CheckResult(checker, Content.create_with_hook('pre-commit', file_path))
+    result.exception = ValueError(message)
+    return result
+
+
+class SarifUriTest(unittest.TestCase):
+
+    def test_plain_paths(self):
+        self.assertEqual(sarif_uri('src/main.py'), 'src/main.py')
+        self.assertEqual(sarif_uri('a-b_c.d~e/f.txt'), 'a-b_c.d~e/f.txt')
+
+    def test_percent_encoding(self):
+        self.assertEqual(sarif_uri('docs/read me.md'), 'docs/read%20me.md')
+        self.assertEqual(sarif_uri('issues/#12.md'), 'issues/%2312.md')
+        self.assertEqual(sarif_uri('100%.txt'), '100%25.txt')
+        self.assertEqual(sarif_uri('a?b.txt'), 'a%3Fb.txt')
+
+    def test_non_ascii(self):
+        self.assertEqual(sarif_uri('caf\xe9/文件.txt'), 'caf%C3%A9/%E6%96%87%E4%BB%B6.txt')
+
+
+class SarifReportTest(unittest.TestCase):
+
+    def test_locations(self):
+        checker = Checker(lambda *args: None)
+        results = [_failed_result(checker, 'docs/read me.md', 'missing header'),
+                   _failed_result(checker, 'caf\xe9.txt', 'missing header')]
+        log = json.loads(HookReport('pre-commit', results).render('sarif'))
+        sarif_results = log['runs'][0]['results']
+        self.assertEqual(len(sarif_results), 1)
+        locations = sarif_results[0]['locations']
+        self.assertEqual([location['physicalLocation']['artifactLocation'] for location in locations],
+                         [{'uri': 'docs/read%20me.md', 'uriBaseId': '%SRCROOT%'},
+                          {'uri': 'caf%C3%A9.txt', 'uriBaseId': '%SRCROOT%'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+#
+# Copyright 2015 Tickle Labs, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from __future__ import unicode_literals, division, absolute_import, print_function
+import io
+import os
+import pickle
+import shutil
+import subprocess
+import tempfile
+import unittest
+from submarine_githooks.content import LineRanges
+from submarine_githooks.repository import PushRange, Repository, hunk_header_regex, null_sha
+
+
+class GitRepoTestCase(unittest.TestCase):
+    """
+    A test case with an empty git repo, which tests could commit files to.
+    """
+
+    def setUp(self):
+        self.source_root = tempfile.mkdtemp(prefix='submarine-test-')
+        self.git('init', '-q', '.')
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'test')
+        self.git_repo = Repository(self.source_root)
+
+    def tearDown(self):
+        self.git_repo.close()
+        shutil.rmtree(self.source_root)
+
+    def git(self, *args):
+        return subprocess.check_output(('git',) + args, cwd=self.source_root).decode('utf-8').strip()
+
+    def write(self, path, lines):
+        """
+        :type path: str
+        :type lines: list[str]
+        """
+        with io.open(os.path.join(self.source_root, path), 'w', encoding='utf-8') as f:
+            f.write(''.join('{}\n'.format(line) for line in lines))
+
+    def commit(self, message='commit'):
+        self.git('add', '-A')
+        self.git('commit', '-q', '--no-verify', '-m', message)
+        return self.git('rev-parse', 'HEAD')
+
+
+class HunkHeaderTest(unittest.TestCase):
+
+    def assert_hunk(self, header, start, count):
+        match = hunk_header_regex.match(header)
+        self.assertIsNotNone(match, header)
+        self.assertEqual(match.group(1), start)
+        self.assertEqual(match.group(2), count)
+
+    def test_hunk_headers(self):
+        self.assert_hunk('@@ -3 +3 @@', '3', None)
+        self.assert_hunk('@@ -3,2 +3,4 @@ def main():', '3', '4')
+        self.assert_hunk('@@ -0,0 +1,5 @@', '1', '5')
+        # Deletions add no line
+        self.assert_hunk('@@ -7,2 +6,0 @@', '6', '0')
+        self.assertIsNone(hunk_header_regex.match('@@@ -1 -1 +1 @@@'))
+
+
+class StagedLineRangesTest(GitRepoTestCase):
+
+    def setUp(self):
+        super(StagedLineRangesTest, self).setUp()
+        self.lines = ['line {}'.format(number) for number in range(1, 21)]
+        self.write('a.txt', self.lines)
+        self.write('renamed.txt', self.lines)
+        self.write('moved.txt', self.lines)
+        self.commit('initial')
+
+    def test_added_and_modified_lines(self):
+        lines = list(self.lines)
+        lines[2] = 'modified'
+        lines[9:9] = ['added 1', 'added 2']
+        self.write('a.txt', lines)
+        self.write('new file.txt', ['new', 'file'])
+        self.git('add', '-A')
+        ranges = self.git_repo.staged_line_ranges()
+        self.assertEqual(ranges['a.txt'], LineRanges([(3, 1), (10, 2)]))
+        self.assertEqual(list(ranges['a.txt'].select(lines)), [(3, 'modified'), (10, 'added 1'), (11, 'added 2')])
+        self.assertEqual(ranges['new file.txt'], LineRanges([(1, 2)]))
+
+    def test_deleted_lines(self):
+        self.write('a.txt', self.lines[:5] + self.lines[8:])
+        self.git('add', '-A')
+        ranges = self.git_repo.staged_line_ranges()
+        # `@@ -6,3 +5,0 @@` changes the file without adding any line
+        self.assertEqual(ranges['a.txt'], LineRanges())
+        self.assertNotIn(5, ranges['a.txt'])
+
+    def test_renames(self):
+        self.git('mv', 'renamed.txt', 'renamed-new.txt')
+        self.git('mv', 'moved.txt', 'moved-new.txt')
+        self.write('moved-new.txt', self.lines + ['appended'])
+        self.git('add', '-A')
+        ranges = self.git_repo.staged_line_ranges()
+        # A pure rename changes no line
+        self.assertEqual(ranges.get('renamed-new.txt', LineRanges()), LineRanges())
+        self.assertEqual(ranges['moved-new.txt'], LineRanges([(21, 1)]))
+        self.assertNotIn('moved.txt', ranges)
+
+    def test_quoted_paths(self):
+        self.write('caf\xe9.txt', ['caf\xe9'])
+        self.git('add', '-A')
+        self.assertEqual(self.git_repo.staged_line_ranges()['caf\xe9.txt'], LineRanges([(1, 1)]))
+
+
+class PushRangeTest(GitRepoTestCase):
+
+    def setUp(self):
+        super(PushRangeTest, self).setUp()
+        self.write('a.txt', ['a'])
+        self.root = self.commit('root')
+        self.write('b.txt', ['b'])
+        self.pushed = self.commit('pushed')
+        # Like `git fetch` has seen the root commit on origin
+        self.git('update-ref', 'refs/remotes/origin/master', self.root)
+        self.write('c.txt', ['c'])
+        self.git('rm', '-q', 'a.txt')
+        self.head = self.commit('head')
+
+    def test_existing_branch(self):
+        push_range = PushRange(self.git_repo, self.head, self.pushed)
+        self.assertEqual(push_range.commits, [self.head])
+        self.assertEqual(push_range.base, self.pushed)
+        self.assertEqual(push_range.parents(self.head), [self.pushed])
+        self.assertEqual(sorted((change.status, change.path) for change in push_range.changes()),
+                         [('A', 'c.txt'), ('D', 'a.txt')])
+
+    def test_new_branch(self):
+        # Commits already on the remote are not pushed ones
+        push_range = PushRange(self.git_repo, self.head, null_sha, 'origin')
+        self.assertTrue(push_range.new_branch)
+        self.assertEqual(push_range.commits, [self.head, self.pushed])
+        self.assertEqual(push_range.base, self.root)
+        self.assertEqual(sorted(change.path for change in push_range.changes()), ['a.txt', 'b.txt', 'c.txt'])
+        self.assertEqual([change.path for change in push_range.commit_changes(self.pushed)], ['b.txt'])
+
+    def test_new_branch_of_unknown_remote(self):
+        # Without remote-tracking branches of the remote, the root commit is pushed too
+        push_range = PushRange(self.git_repo, self.head, null_sha, 'upstream')
+        self.assertEqual(push_range.commits, [self.head, self.pushed, self.root])
+        self.assertEqual(push_range.base, null_sha)
+        self.assertEqual([change.path for change in push_range.commit_changes(self.root)], ['a.txt'])
+
+    def test_unknown_remote_commit(self):
+        # The remote ref has been updated by others, so commits not on any remote-tracking branch are pushed
+        push_range = PushRange(self.git_repo, self.head, 'f' * 40, 'origin')
+        self.assertEqual(push_range.commits, [self.head, self.pushed])
+        self.assertEqual(push_range.base, self.root)
+
+    def test_deleted_branch(self):
+        push_range = PushRange(self.git_repo, null_sha, self.head)
+        self.assertTrue(push_range.deleted)
+        self.assertEqual(push_range.commits, [])
+        self.assertEqual(push_range.changes(), [])
+
+    def test_pickle(self):
+        # Sent to worker processes, which list commits again, but not with the lock of this process
+        push_range = PushRange(self.git_repo, self.head, self.pushed, 'origin')
+        push_range.commits
+        unpickled = pickle.loads(pickle.dumps(push_range, 2))
+        self.assertEqual((unpickled.local_commit, unpickled.remote_commit, unpickled.remote_name),
+                         (self.head, self.pushed, 'origin'))
+        self.assertEqual(unpickled.git_repo.source_root, self.git_repo.source_root)
+        self.assertEqual(unpickled.commits, [self.head])
+        tree_diff = push_range.changes()
+        self.assertEqual(list(pickle.loads(pickle.dumps(tree_diff, 2))), list(tree_diff))
+
+
+if __name__ == '__main__':
+    unittest.main()